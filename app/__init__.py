@@ -3,12 +3,25 @@ from dotenv import load_dotenv
 
 def create_app():
     load_dotenv()
-    app = Flask(__name__, static_folder="static", template_folder="templates")
+    # Imported after load_dotenv so TRACE_* and PROFILE_* settings from .env apply
+    from app.rag.profiling import profiler
+    from app.rag.tracing import tracer
 
-    from app.main.routes import main_bp
-    from app.rag.routes import rag_bp
+    # Startup happens once per worker, so it is always recorded
+    root = tracer.start_trace("create_app", sampled=True)
+    with tracer.activate(root):
+        app = Flask(__name__, static_folder="static", template_folder="templates")
+
+        # Importing the blueprints builds the chatbot, caches and session store
+        with tracer.span("create_app.import_blueprints"):
+            from app.main.routes import main_bp
+            from app.monitoring.routes import monitoring_bp
+            from app.rag.routes import rag_bp
+
+        app.register_blueprint(main_bp)
+        app.register_blueprint(monitoring_bp)
+        app.register_blueprint(rag_bp)
+        profiler.install(app)
+    tracer.end(root)
 
-    app.register_blueprint(main_bp)
-    app.register_blueprint(rag_bp)
-    
     return app
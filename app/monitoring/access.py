@@ -0,0 +1,63 @@
+"""
+Access control for operational endpoints (/metrics, /api/chat/stats).
+
+They expose traffic counters and provider, admission and transport
+settings, so they are not public. With MONITORING_TOKEN set, a request
+must send it as "Authorization: Bearer <token>". Without a token, only
+direct loopback requests are served (curl on the host, a sidecar
+scraper); anything that came through a proxy, which sets
+X-Forwarded-For, is refused even when the proxy itself is local.
+"""
+import functools
+import hmac
+import os
+from ipaddress import ip_address
+
+from flask import abort, request
+
+# None serves loopback requests only
+MONITORING_TOKEN = os.getenv("MONITORING_TOKEN") or None
+
+
+def is_loopback(remote_addr):
+    """Whether a peer address is a loopback address."""
+    try:
+        return ip_address(remote_addr or "").is_loopback
+    except ValueError:
+        return False
+
+
+def allowed(authorization, remote_addr, forwarded_for=None, token=None):
+    """
+    Decide whether a request may read operational endpoints.
+
+    Args:
+        authorization (str): Authorization header value
+        remote_addr (str): Peer address of the connection
+        forwarded_for (str): X-Forwarded-For header value
+        token (str): Expected bearer token, or None for loopback-only access
+
+    Returns:
+        bool: True if the request may proceed
+    """
+    if token is not None:
+        scheme, _, credentials = (authorization or "").partition(" ")
+        return scheme.lower() == "bearer" and hmac.compare_digest(
+            credentials.strip().encode("utf-8"), token.encode("utf-8")
+        )
+    return not forwarded_for and is_loopback(remote_addr)
+
+
+def monitoring_only(view):
+    """Serve the view only to callers allowed by allowed(); others get a 404."""
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        if not allowed(
+            request.headers.get("Authorization"), request.remote_addr,
+            request.headers.get("X-Forwarded-For"), MONITORING_TOKEN
+        ):
+            abort(404)
+        return view(*args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,11 @@
+from flask import Blueprint, Response
+from app.monitoring.access import monitoring_only
+from app.rag.metrics import REGISTRY
+
+monitoring_bp = Blueprint("monitoring", __name__)
+
+@monitoring_bp.get("/metrics")
+@monitoring_only
+def metrics():
+    """Expose process metrics in the Prometheus text format."""
+    return Response(REGISTRY.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
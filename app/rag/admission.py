@@ -0,0 +1,376 @@
+"""
+Admission control for /api/chat.
+
+Two checks run before a response is started:
+
+- Token buckets per client IP and per session shed floods early with
+  429. They apply to every chat request, fast paths included, so they
+  only need to be loose enough for a person typing.
+- A global limit on concurrent upstream model streams. A request that
+  needs the model takes a slot; if none is free it waits in a bounded
+  FIFO queue for up to ADMISSION_MAX_WAIT_MS, and is shed with 503 when
+  the queue is full or the wait runs out. Fast-path answers and requests
+  joining a shared single-flight stream never take a slot.
+
+Rejections carry a Retry-After hint in whole seconds.
+"""
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from threading import Event, Lock
+
+from app.rag.metrics import ADMISSION_DECISIONS, ADMISSION_WAIT
+
+
+class Rejected(Exception):
+    """A request refused by admission control."""
+
+    def __init__(self, status, reason, message, retry_after):
+        """
+        Args:
+            status (int): HTTP status, 429 or 503
+            reason (str): Decision label, e.g. "rate_limited_ip"
+            message (str): Visitor-facing error message
+            retry_after (int): Seconds before retrying makes sense
+        """
+        super().__init__(message)
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+
+    @property
+    def headers(self):
+        return {"Retry-After": str(self.retry_after)}
+
+
+class TokenBuckets:
+    """
+    One token bucket per key, refilled continuously. The least recently
+    used keys are dropped past max_keys, which only ever makes a client
+    look less busy than it is.
+    """
+
+    def __init__(self, rate, burst, max_keys=100_000):
+        """
+        Initialize the buckets.
+
+        Args:
+            rate (float): Tokens added per second
+            burst (float): Bucket capacity
+            max_keys (int): Buckets kept before evicting the oldest
+        """
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self.buckets = OrderedDict()
+        self.lock = Lock()
+
+    def take(self, key, now=None):
+        """
+        Take one token for key.
+
+        Args:
+            key (str): Bucket key
+            now (float): Monotonic time, for tests
+
+        Returns:
+            float: 0 if a token was taken, else seconds until one is available
+        """
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            tokens, updated = self.buckets.pop(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / self.rate
+            self.buckets[key] = (tokens, now)
+            if len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+            return wait
+
+    def __len__(self):
+        return len(self.buckets)
+
+
+class Slot:
+    """
+    Permission to run one upstream stream. Released exactly once, either
+    explicitly or when the stream wrapped by hold()/ahold() ends.
+    """
+
+    def __init__(self, limiter=None):
+        self.limiter = limiter
+        self.released = limiter is None
+        self.lock = Lock()
+
+    def release(self):
+        with self.lock:
+            if self.released:
+                return
+            self.released = True
+        self.limiter.release()
+
+    def hold(self, chunks):
+        """Pass chunks through, releasing the slot when the stream ends or is closed."""
+        try:
+            yield from chunks
+        finally:
+            self.release()
+
+    async def ahold(self, chunks):
+        """Async counterpart of hold()."""
+        try:
+            async for chunk in chunks:
+                yield chunk
+        finally:
+            await chunks.aclose()
+            self.release()
+
+
+class _Waiter:
+    """A request queued for a slot, woken either as a thread or on an event loop."""
+
+    def __init__(self, loop=None):
+        self.granted = False
+        self.loop = loop
+        self.event = asyncio.Event() if loop is not None else Event()
+
+    def wake(self):
+        # Called with the limiter lock held
+        self.granted = True
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.event.set)
+        else:
+            self.event.set()
+
+
+class UpstreamLimiter:
+    """Caps concurrent upstream streams, with a bounded FIFO wait queue."""
+
+    def __init__(self, limit, max_queue=64, max_wait=5.0):
+        """
+        Initialize the limiter.
+
+        Args:
+            limit (int): Concurrent streams allowed
+            max_queue (int): Requests allowed to wait for a slot
+            max_wait (float): Longest a request waits, in seconds
+        """
+        self.limit = limit
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.active = 0
+        self.queue = deque()
+        self.lock = Lock()
+
+    def _enter(self, loop=None):
+        """Take a free slot (returns None) or join the queue (returns the waiter)."""
+        with self.lock:
+            # Queued requests go first, so arrivals cannot jump the line
+            if self.active < self.limit and not self.queue:
+                self.active += 1
+                return None
+            if len(self.queue) >= self.max_queue:
+                ADMISSION_DECISIONS.inc(labels=("queue_full",))
+                raise self._busy("queue_full")
+            waiter = _Waiter(loop)
+            self.queue.append(waiter)
+            return waiter
+
+    def _give_up(self, waiter):
+        """Leave the queue; returns True if a slot was granted in the meantime."""
+        with self.lock:
+            if waiter.granted:
+                return True
+            self.queue.remove(waiter)
+            return False
+
+    def _busy(self, reason):
+        return Rejected(503, reason, "The assistant is busy right now. Please try again shortly.",
+                        max(1, math.ceil(self.max_wait)))
+
+    def _admitted(self, started, waited):
+        ADMISSION_DECISIONS.inc(labels=("queued" if waited else "admitted",))
+        ADMISSION_WAIT.observe(time.perf_counter() - started)
+        return Slot(self)
+
+    def acquire(self):
+        """
+        Take a slot, waiting on this thread if needed.
+
+        Returns:
+            Slot: Slot to release when the stream ends
+
+        Raises:
+            Rejected: The queue is full or the wait ran out
+        """
+        started = time.perf_counter()
+        waiter = self._enter()
+        if waiter is None:
+            return self._admitted(started, False)
+        if not waiter.event.wait(self.max_wait) and not self._give_up(waiter):
+            ADMISSION_DECISIONS.inc(labels=("queue_timeout",))
+            ADMISSION_WAIT.observe(time.perf_counter() - started)
+            raise self._busy("queue_timeout")
+        return self._admitted(started, True)
+
+    async def aacquire(self):
+        """Async counterpart of acquire(); waits without blocking the event loop."""
+        started = time.perf_counter()
+        waiter = self._enter(asyncio.get_running_loop())
+        if waiter is None:
+            return self._admitted(started, False)
+        try:
+            await asyncio.wait_for(waiter.event.wait(), self.max_wait)
+        except asyncio.TimeoutError:
+            if not self._give_up(waiter):
+                ADMISSION_DECISIONS.inc(labels=("queue_timeout",))
+                ADMISSION_WAIT.observe(time.perf_counter() - started)
+                raise self._busy("queue_timeout")
+        except BaseException:
+            # Cancelled while queued: hand back a slot granted meanwhile
+            if self._give_up(waiter):
+                self.release()
+            raise
+        return self._admitted(started, True)
+
+    def release(self):
+        """Free a slot, handing it straight to the longest waiter if any."""
+        with self.lock:
+            if self.queue:
+                self.queue.popleft().wake()
+            else:
+                self.active -= 1
+
+    def stats(self):
+        with self.lock:
+            return {"limit": self.limit, "active": self.active, "queued": len(self.queue)}
+
+
+class AdmissionController:
+    """Rate limits per client and per session, plus the upstream stream limit."""
+
+    def __init__(self, upstream=None, per_ip=None, per_session=None):
+        """
+        Initialize the controller; any check left as None is off.
+
+        Args:
+            upstream (UpstreamLimiter): Concurrent upstream stream limit
+            per_ip (TokenBuckets): Request rate per client IP
+            per_session (TokenBuckets): Request rate per session
+        """
+        self.upstream = upstream
+        self.per_ip = per_ip
+        self.per_session = per_session
+
+    @classmethod
+    def from_env(cls):
+        """
+        Build a controller from ADMISSION_MAX_UPSTREAM, ADMISSION_MAX_QUEUE,
+        ADMISSION_MAX_WAIT_MS, ADMISSION_IP_RATE / _BURST and
+        ADMISSION_SESSION_RATE / _BURST. A limit or rate of 0 turns that check off.
+
+        The per-IP buckets are off unless ADMISSION_IP_RATE is set: behind a
+        proxy every visitor shares the proxy's address until
+        ADMISSION_TRUSTED_PROXIES says how many X-Forwarded-For hops to trust.
+        """
+        limit = int(os.getenv("ADMISSION_MAX_UPSTREAM", "32"))
+        ip_rate = float(os.getenv("ADMISSION_IP_RATE", "0"))
+        session_rate = float(os.getenv("ADMISSION_SESSION_RATE", "0.5"))
+        return cls(
+            upstream=UpstreamLimiter(
+                limit,
+                max_queue=int(os.getenv("ADMISSION_MAX_QUEUE", "64")),
+                max_wait=float(os.getenv("ADMISSION_MAX_WAIT_MS", "5000")) / 1000,
+            ) if limit else None,
+            per_ip=TokenBuckets(ip_rate, float(os.getenv("ADMISSION_IP_BURST", "10"))) if ip_rate else None,
+            per_session=TokenBuckets(
+                session_rate, float(os.getenv("ADMISSION_SESSION_BURST", "5"))
+            ) if session_rate else None,
+        )
+
+    def check_rate(self, client_ip, session_id=None):
+        """
+        Charge one request to the client's and the session's buckets.
+
+        Args:
+            client_ip (str): Client address
+            session_id (str): Session ID, if the request continues one
+
+        Raises:
+            Rejected: 429 when either bucket is empty
+        """
+        checks = ((self.per_ip, client_ip, "rate_limited_ip"), (self.per_session, session_id, "rate_limited_session"))
+        for buckets, key, reason in checks:
+            if buckets is None or not key:
+                continue
+            wait = buckets.take(key)
+            if wait:
+                ADMISSION_DECISIONS.inc(labels=(reason,))
+                raise Rejected(429, reason, "You're sending messages too quickly. Please wait a moment.",
+                               max(1, math.ceil(wait)))
+
+    def acquire(self):
+        """
+        Take an upstream slot, blocking this thread while queued.
+
+        Returns:
+            Slot: Release it (or let Slot.hold() do so) when the stream ends
+
+        Raises:
+            Rejected: 503 when no slot frees up in time
+        """
+        if self.upstream is None:
+            return Slot()
+        return self.upstream.acquire()
+
+    async def aacquire(self):
+        """Async counterpart of acquire()."""
+        if self.upstream is None:
+            return Slot()
+        return await self.upstream.aacquire()
+
+    def active_streams(self):
+        """Upstream slots currently held."""
+        return self.upstream.active if self.upstream else 0
+
+    def queue_depth(self):
+        """Requests waiting for an upstream slot."""
+        return len(self.upstream.queue) if self.upstream else 0
+
+    def stats(self):
+        """
+        Get admission state.
+
+        Returns:
+            dict: Upstream slots in use and queued, and tracked rate-limit keys
+        """
+        return {
+            "upstream": self.upstream.stats() if self.upstream else None,
+            "ip_buckets": len(self.per_ip) if self.per_ip else None,
+            "session_buckets": len(self.per_session) if self.per_session else None,
+        }
+
+
+def client_ip(remote_addr, forwarded_for=None, trusted_proxies=0):
+    """
+    Pick the client address, trusting X-Forwarded-For only as far as
+    the number of proxies known to sit in front of the app.
+
+    Args:
+        remote_addr (str): Peer address of the connection
+        forwarded_for (str): X-Forwarded-For header value
+        trusted_proxies (int): Proxies in front of the app (ADMISSION_TRUSTED_PROXIES)
+
+    Returns:
+        str: Client address
+    """
+    if trusted_proxies and forwarded_for:
+        hops = [hop.strip() for hop in forwarded_for.split(",") if hop.strip()]
+        if len(hops) >= trusted_proxies:
+            return hops[-trusted_proxies]
+    return remote_addr or "unknown"
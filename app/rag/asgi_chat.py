@@ -0,0 +1,304 @@
+"""
+Asyncio implementation of POST /api/chat for ASGI servers.
+
+The Flask view holds a worker thread for the whole generation. Here each
+stream is a coroutine awaiting AsyncOpenAI, so one process can keep
+hundreds of streams in flight. The request handling, fast paths and
+SSE frames are shared with app/rag/routes.py, so clients cannot tell
+the two paths apart.
+"""
+import asyncio
+import json
+
+from app.rag.metrics import IN_FLIGHT, SSE_FRAMES
+from app.rag.profiling import PROFILE_HEADER, PROFILE_ID_HEADER, profiler
+from app.rag.admission import Rejected, client_ip
+from app.rag.routes import (
+    GONE_MESSAGE, LAST_EVENT_ID_HEADER, SSE_HEADERS, TRUSTED_PROXIES, ChatTurn, admission, chatbot,
+    parse_chat_request, replay_buffer
+)
+from app.rag.sse import FrameCoalescer, sse_frame
+from app.rag.tracing import TRACE_HEADER, tracer
+
+
+async def _read_body(receive):
+    """Read the full request body from an ASGI receive channel."""
+    body = b""
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return None
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+
+async def _wait_for_disconnect(receive):
+    """Return once the client has disconnected."""
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+async def _with_ticks(chunks, frames):
+    """
+    Pass through an async chunk iterator, yielding None whenever buffered
+    text in the coalescer falls due before the next chunk arrives.
+    """
+    iterator = chunks.__aiter__()
+    pending = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(iterator.__anext__())
+            done, _ = await asyncio.wait((pending,), timeout=frames.time_left())
+            if not done:
+                yield None
+                continue
+            task, pending = pending, None
+            try:
+                chunk = task.result()
+            except StopAsyncIteration:
+                return
+            yield chunk
+    finally:
+        if pending is not None:
+            pending.cancel()
+            # Let the source unwind before anyone closes it
+            await asyncio.wait((pending,))
+
+
+def _headers(pairs):
+    return [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in pairs]
+
+
+def _request_header(scope, name):
+    name = name.lower().encode("latin-1")
+    for key, value in scope.get("headers", ()):
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+async def _send_json(send, status, payload, extra_headers=()):
+    body = json.dumps(payload).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": _headers([
+            ("Content-Type", "application/json"), ("Content-Length", str(len(body))), *extra_headers
+        ]),
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def chat_endpoint(scope, receive, send):
+    """
+    ASGI handler for POST /api/chat.
+    Expected JSON: {"message": "user question", "session_id": "optional_session_id"}
+    """
+    profile = profiler.start(_request_header(scope, PROFILE_HEADER), "asgi-chat")
+    if profile is None:
+        await _chat(scope, receive, send)
+        return
+    try:
+        await _chat(scope, receive, send, ((PROFILE_ID_HEADER, profile.name),))
+    finally:
+        # On the loop thread: cProfile has to be stopped where it started
+        profile.stop()
+
+
+async def _chat(scope, receive, send, extra_headers=()):
+    body = await _read_body(receive)
+    if body is None:
+        return
+
+    # Every response carries the trace id, recorded or not, for bug reports
+    trace_id = tracer.new_trace_id(_request_header(scope, TRACE_HEADER))
+    trace_headers = ((TRACE_HEADER, trace_id), *extra_headers)
+    root = tracer.start_trace("chat.request", trace_id, server="asgi")
+    # Each request runs in its own task; asyncio.to_thread copies the span along
+    tracer.set_current(root)
+
+    try:
+        data = json.loads(body or b"null")
+    except ValueError:
+        data = None
+
+    peer = (scope.get("client") or (None,))[0]
+    ip = client_ip(peer, _request_header(scope, "X-Forwarded-For"), TRUSTED_PROXIES)
+    last_event_id = _request_header(scope, LAST_EVENT_ID_HEADER)
+    if last_event_id:
+        await _resume(receive, send, data if isinstance(data, dict) else {}, last_event_id, ip, root, trace_headers)
+        return
+
+    try:
+        try:
+            user_message, session_id = parse_chat_request(data)
+        except ValueError as e:
+            tracer.end(root, e)
+            await _send_json(send, 400, {"error": str(e)}, trace_headers)
+            return
+
+        # Admission is decided before the response starts, so a shed
+        # request gets a real status code instead of an SSE error
+        admission.check_rate(ip, session_id)
+        # Session store and retrieval are synchronous; keep them off the event loop
+        turn = await asyncio.to_thread(ChatTurn, user_message, session_id, asyncio.get_running_loop())
+        if turn.needs_upstream:
+            # Queued requests wait on the loop, not on a thread
+            with tracer.span("admission.wait"):
+                slot = await admission.aacquire()
+            turn.open_upstream(slot)
+    except Rejected as e:
+        root.set(rejected=e.reason)
+        tracer.end(root)
+        await _send_json(send, e.status, {"error": str(e)}, (*trace_headers, *e.headers.items()))
+        return
+    except Exception as e:
+        tracer.end(root, e)
+        await _send_json(send, 500, {"error": str(e)}, trace_headers)
+        return
+
+    root.set(answer_source=turn.answer_source)
+    frames = FrameCoalescer.from_env(turn.open_replay())
+    source = turn.astream() if turn.needs_model else None
+    await _stream_turn(receive, send, turn, root, source, frames, trace_headers)
+
+
+async def _resume(receive, send, data, last_event_id, ip, root, trace_headers):
+    """Continue a dropped answer stream from its Last-Event-ID (see routes.resume_chat)."""
+    try:
+        # Reconnects cost no model call, so only the per-IP limit applies
+        admission.check_rate(ip)
+    except Rejected as e:
+        root.set(rejected=e.reason)
+        tracer.end(root)
+        await _send_json(send, e.status, {"error": str(e)}, (*trace_headers, *e.headers.items()))
+        return
+
+    resumption = replay_buffer.resume(data.get("session_id"), last_event_id)
+    root.set(resumed=resumption is not None)
+    if resumption is None:
+        tracer.end(root)
+        await _send_json(send, 410, {"error": GONE_MESSAGE}, trace_headers)
+        return
+
+    turn = resumption.turn
+    root.set(answer_source=turn.answer_source, offset=resumption.offset)
+    frames = FrameCoalescer.from_env(resumption.entry.turn_id, resumption.offset)
+    await _stream_turn(
+        receive, send, turn, root, resumption.astream(), frames, trace_headers,
+        chunks=resumption.prefix, owner=resumption.owner
+    )
+
+
+async def _stream_turn(receive, send, turn, root, source, frames, trace_headers, chunks=None, owner=True):
+    """
+    Write one answer as an SSE response.
+
+    Args:
+        receive (callable): ASGI receive channel, watched for a disconnect
+        send (callable): ASGI send channel
+        turn (ChatTurn): The turn being answered
+        root (Span): The request's root span
+        source (async iterator): Answer chunks, or None to send turn.ready_chunks
+        frames (FrameCoalescer): Frame builder, carrying the event ids
+        trace_headers (tuple): Headers every response carries
+        chunks (list): Chunks the client already has, when resuming
+        owner (bool): Whether this connection records the turn
+    """
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": _headers([
+            ("Content-Type", "text/event-stream; charset=utf-8"), *SSE_HEADERS.items(), *trace_headers
+        ]),
+    })
+
+    async def write(frame):
+        await send({"type": "http.response.body", "body": frame.encode("utf-8"), "more_body": True})
+
+    chunks = chunks if chunks is not None else []
+    writing = tracer.start_span("sse.write_loop")
+
+    async def stream():
+        failed = False
+        try:
+            # The session ID goes out once, ahead of the answer
+            await write(sse_frame({"session_id": turn.session_id}, frames.event_id()))
+
+            try:
+                if source is not None:
+                    # Deltas are coalesced; a timer flushes text that is due
+                    async for chunk in _with_ticks(source, frames):
+                        if chunk is None:
+                            frame = frames.flush()
+                        else:
+                            chunks.append(chunk)
+                            turn.mark_chunk()
+                            frame = frames.push(chunk)
+                        if frame is not None:
+                            await write(frame)
+                else:
+                    for chunk in turn.ready_chunks:
+                        chunks.append(chunk)
+                        turn.mark_chunk()
+                        frame = frames.push(chunk)
+                        if frame is not None:
+                            await write(frame)
+            except OSError:
+                raise
+            except Exception as e:
+                failed = True
+                chunk = chatbot.error_reply(e)
+                chunks.append(chunk)
+                turn.mark_chunk()
+                frames.push(chunk)
+
+            frame = frames.flush()
+            if frame is not None:
+                await write(frame)
+
+            if owner:
+                await asyncio.to_thread(turn.record, chunks, failed)
+
+            # Send completion signal
+            await write(sse_frame({"done": True}))
+
+        except OSError:
+            # Servers may raise on writes to a closed connection
+            raise
+        except Exception as e:
+            await write(sse_frame({"error": f"Error generating response: {str(e)}"}))
+
+        await send({"type": "http.response.body", "body": b""})
+
+    # Servers drop writes after a disconnect rather than failing them, so
+    # watch the receive channel and cancel the stream (and with it the
+    # upstream completion) as soon as the client goes away
+    IN_FLIGHT.inc()
+    streaming = asyncio.ensure_future(stream())
+    disconnect = asyncio.ensure_future(_wait_for_disconnect(receive))
+    try:
+        await asyncio.wait((streaming, disconnect), return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        disconnect.cancel()
+        if not streaming.done():
+            streaming.cancel()
+        try:
+            await streaming
+        except (asyncio.CancelledError, OSError):
+            if owner:
+                await asyncio.to_thread(turn.abort, chunks)
+        finally:
+            # Leaves a shared flight; a plain model stream is already closed
+            if hasattr(source, "aclose"):
+                await source.aclose()
+            turn.release()
+            IN_FLIGHT.dec()
+            SSE_FRAMES.inc(frames.frames)
+            writing.set(frames=frames.frames, chunks=len(chunks))
+            tracer.end(writing)
+            tracer.end(root)
@@ -1,19 +1,66 @@
 import os
-from openai import OpenAI
+import time
+from functools import lru_cache
 from app.rag.knowledge_base import PORTFOLIO_KNOWLEDGE
+from app.rag.metrics import (
+    TIER_DURATION, TIER_REQUESTS, TIER_TOKENS, TIER_TTFT, UPSTREAM_ERRORS, UPSTREAM_REQUESTS, UPSTREAM_TTFT
+)
+from app.rag.model_router import ModelRouter
+from app.rag.providers import provider_from_env
+from app.rag.retriever import KnowledgeRetriever
+from app.rag.tokens import count_tokens, message_tokens
+from app.rag.tracing import tracer
+
+
+@lru_cache(maxsize=1024)
+def _summarize_questions(questions):
+    """
+    Fold dropped turns into a short extractive summary.
+    Cached, since every later turn of a long chat drops the same prefix.
+    
+    Args:
+        questions (tuple): Earlier user questions, oldest first
+    
+    Returns:
+        str: Summary text
+    """
+    topics = [q if len(q) <= 120 else q[:117] + "..." for q in questions[-5:]]
+    return "Earlier in this conversation the visitor asked about: " + "; ".join(topics)
+
+
+@lru_cache(maxsize=256)
+def _system_message_tokens(content):
+    """
+    Token cost of a system message. Cached: the prompt is rebuilt every
+    turn, but from a handful of retrieved section combinations.
+    """
+    return message_tokens({"role": "system", "content": content})
+
 
 class PortfolioChatbot:
-    def __init__(self):
-        """Initialize the chatbot with OpenAI API."""
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            raise ValueError("OPENAI_API_KEY environment variable not set")
-        
-        self.client = OpenAI()
-        self.model = "gpt-4o"
+    def __init__(self, provider=None):
+        """
+        Initialize the chatbot.
+        
+        Args:
+            provider (LLMProvider): Completion backend, or None to pick one
+                with LLM_PROVIDER (openai, or local for offline load tests)
+        """
+        self.provider = provider or provider_from_env()
         self.system_prompt = self._build_system_prompt()
+        
+        # Section retrieval; RAG_RETRIEVAL=full sends the whole knowledge base
+        self.use_retrieval = os.getenv("RAG_RETRIEVAL", "sections").lower() != "full"
+        self.retrieval_top_k = int(os.getenv("RAG_TOP_K", "4"))
+        self.retriever = KnowledgeRetriever(PORTFOLIO_KNOWLEDGE)
+        
+        # History is assembled newest-first until this many tokens are used
+        self.history_token_budget = int(os.getenv("RAG_HISTORY_TOKEN_BUDGET", "1200"))
+        
+        # Picks a model tier (model + max_tokens) per turn; RAG_MODEL_TIERS configures it
+        self.router = ModelRouter.from_env()
     
-    def _build_system_prompt(self):
+    def _build_system_prompt(self, knowledge=PORTFOLIO_KNOWLEDGE):
         """Build comprehensive system prompt with portfolio knowledge."""
         return f"""You are MAHI AI, a helpful and knowledgeable AI assistant for Vetrivel Maheswaran's portfolio website.
 
@@ -27,7 +74,7 @@ Your role is to help visitors learn about Vetrivel's background, skills, project
 - When appropriate, encourage visitors to explore the portfolio
 
 ## KNOWLEDGE BASE:
-{PORTFOLIO_KNOWLEDGE}
+{knowledge}
 
 ## CRITICAL INSTRUCTIONS:
 
@@ -98,6 +145,233 @@ He's used Python across multiple professional and academic projects. Want to see
 
 Remember: You represent Vetrivel professionally. Be helpful, accurate, and enthusiastic about his work!"""
 
+    def _system_prompt_for(self, user_message, conversation_history=None):
+        """
+        Build the system prompt for one turn.
+        
+        Only the knowledge sections relevant to the question (plus the
+        identity, navigation and answering-guideline core) are included, unless retrieval
+        is disabled.
+        
+        Args:
+            user_message (str): The user's message
+            conversation_history (list): Previous messages
+        
+        Returns:
+            tuple: (system prompt, retrieval scores best first)
+        """
+        if not self.use_retrieval:
+            return self.system_prompt, []
+        
+        # Include the previous user turn so follow-ups ("tell me more") stay on topic
+        query = user_message
+        for message in reversed(conversation_history or []):
+            if message["role"] == "user":
+                query = f"{message['content']} {user_message}"
+                break
+        
+        hits = self.retriever.search(query, self.retrieval_top_k)
+        knowledge = self.retriever.render_context(hits)
+        return self._build_system_prompt(knowledge), [score for _, score in hits]
+
+    def build_messages(self, user_message, conversation_history=None):
+        """
+        Build the message list sent to the model for one turn.
+        
+        Args:
+            user_message (str): The user's message
+            conversation_history (list): List of previous messages [{"role": "user/assistant", "content": "..."}]
+        
+        Returns:
+            list: Chat messages, system prompt first and user message last
+        """
+        return self._assemble(user_message, conversation_history)[0]
+    
+    def build_request(self, user_message, conversation_history=None):
+        """
+        Build the messages for one turn and route it to a model tier.
+        The router reuses the retrieval scores found for the prompt.
+        
+        Args:
+            user_message (str): The user's message
+            conversation_history (list): List of previous messages
+        
+        Returns:
+            tuple: (messages as from build_messages(), Route)
+        """
+        messages, scores = self._assemble(user_message, conversation_history)
+        history_turns = sum(1 for m in conversation_history or [] if m["role"] == "user")
+        return messages, self.router.route(user_message, history_turns, scores)
+    
+    def _assemble(self, user_message, conversation_history):
+        system_prompt, scores = self._system_prompt_for(user_message, conversation_history)
+        messages = [{"role": "system", "content": system_prompt}]
+        
+        # Add conversation history within the token budget
+        if conversation_history:
+            history, summary = self._budget_history(conversation_history)
+            if summary:
+                messages.append({"role": "system", "content": summary})
+            messages.extend(history)
+        
+        # Add current user message
+        messages.append({"role": "user", "content": user_message})
+        return messages, scores
+    
+    def _budget_history(self, conversation_history):
+        """
+        Keep the newest messages that fit the history token budget.
+        
+        Token counts are read from the stored messages (computed once
+        when they were added), so this is a walk over small integers.
+        Older messages are folded into a short cached summary.
+        
+        Args:
+            conversation_history (list): Stored messages, oldest first
+        
+        Returns:
+            tuple: (kept messages as {"role", "content"}, summary or None)
+        """
+        budget = self.history_token_budget
+        start = len(conversation_history)
+        while start > 0:
+            cost = message_tokens(conversation_history[start - 1])
+            if cost > budget:
+                break
+            budget -= cost
+            start -= 1
+        
+        # Don't open the window on an assistant reply to a dropped question
+        if start < len(conversation_history) and conversation_history[start]["role"] == "assistant":
+            start += 1
+        
+        kept = [
+            {"role": m["role"], "content": m["content"]}
+            for m in conversation_history[start:]
+        ]
+        dropped_questions = tuple(
+            m["content"] for m in conversation_history[:start] if m["role"] == "user"
+        )
+        summary = _summarize_questions(dropped_questions) if dropped_questions else None
+        return kept, summary
+    
+    def stream_messages(self, messages, route=None):
+        """
+        Stream a completion for a prebuilt message list.
+        Upstream errors are raised, not converted into a reply. Closing
+        the generator early closes the upstream response as well.
+        
+        Args:
+            messages (list): Messages from build_messages()
+            route (Route): Tier from build_request(), or None for the provider defaults
+        
+        Returns:
+            iterator: Chunks of the response
+        """
+        # The span is opened here, where the request's trace is current,
+        # rather than in the generator, which may run on another thread
+        return self._stream_messages(messages, route, self._upstream_span(route))
+    
+    def astream_messages(self, messages, route=None):
+        """
+        Async counterpart of stream_messages() for the ASGI chat path.
+        
+        Args:
+            messages (list): Messages from build_messages()
+            route (Route): Tier from build_request(), or None for the provider defaults
+        
+        Returns:
+            async iterator: Chunks of the response
+        """
+        return self._astream_messages(messages, route, self._upstream_span(route))
+    
+    def _upstream_span(self, route):
+        model = route.model if route else None
+        return tracer.start_span(
+            "upstream.stream", provider=self.provider.name, model=model or self.provider.model,
+            tier=route.tier if route else None
+        )
+    
+    def _start_upstream(self, messages, route):
+        """Count a new completion stream; returns (model, max_tokens, tier label)."""
+        tier = route.tier if route else "default"
+        UPSTREAM_REQUESTS.inc(labels=(self.provider.name,))
+        TIER_REQUESTS.inc(labels=(tier,))
+        prompt_tokens = sum(
+            _system_message_tokens(m["content"]) if m["role"] == "system" else message_tokens(m)
+            for m in messages
+        )
+        TIER_TOKENS.inc(prompt_tokens, (tier, "prompt"))
+        if route is None:
+            return None, None, tier
+        return route.model, route.max_tokens, tier
+    
+    def _end_upstream(self, tier, started, pieces):
+        TIER_DURATION.observe(time.perf_counter() - started, (tier,))
+        TIER_TOKENS.inc(count_tokens("".join(pieces)), (tier, "completion"))
+    
+    def _first_delta(self, tier, started, span):
+        ttft = time.perf_counter() - started
+        UPSTREAM_TTFT.observe(ttft, (self.provider.name,))
+        TIER_TTFT.observe(ttft, (tier,))
+        span.event("first_delta")
+    
+    def _stream_messages(self, messages, route, span):
+        model, max_tokens, tier = self._start_upstream(messages, route)
+        started = time.perf_counter()
+        pieces = []
+        chunks = self.provider.stream(messages, model, max_tokens)
+        span.event("request_sent")
+        try:
+            for chunk in chunks:
+                if not pieces:
+                    self._first_delta(tier, started, span)
+                pieces.append(chunk)
+                yield chunk
+            span.event("last_delta")
+        except Exception as e:
+            UPSTREAM_ERRORS.inc(labels=(self.provider.name, type(e).__name__))
+            span.set(error=type(e).__name__)
+            raise
+        except BaseException:
+            span.set(cancelled=True)
+            raise
+        finally:
+            chunks.close()
+            self._end_upstream(tier, started, pieces)
+            span.set(chunks=len(pieces))
+            tracer.end(span)
+    
+    async def _astream_messages(self, messages, route, span):
+        model, max_tokens, tier = self._start_upstream(messages, route)
+        started = time.perf_counter()
+        pieces = []
+        chunks = self.provider.astream(messages, model, max_tokens)
+        span.event("request_sent")
+        try:
+            async for chunk in chunks:
+                if not pieces:
+                    self._first_delta(tier, started, span)
+                pieces.append(chunk)
+                yield chunk
+            span.event("last_delta")
+        except Exception as e:
+            UPSTREAM_ERRORS.inc(labels=(self.provider.name, type(e).__name__))
+            span.set(error=type(e).__name__)
+            raise
+        except BaseException:
+            span.set(cancelled=True)
+            raise
+        finally:
+            await chunks.aclose()
+            self._end_upstream(tier, started, pieces)
+            span.set(chunks=len(pieces))
+            tracer.end(span)
+    
+    def error_reply(self, error):
+        """Visitor-facing reply for a failed generation."""
+        return f"I apologize, but I encountered an error: {str(error)}. Please try again."
+    
     def chat_stream(self, user_message, conversation_history=None):
         """
         Generate streaming response to user message.
@@ -110,31 +384,11 @@ Remember: You represent Vetrivel professionally. Be helpful, accurate, and enthu
             str: Chunks of the response
         """
         try:
-            # Build messages for API
-            messages = [{"role": "system", "content": self.system_prompt}]
-            
-            # Add conversation history
-            if conversation_history:
-                messages.extend(conversation_history[-10:])
-            
-            # Add current user message
-            messages.append({"role": "user", "content": user_message})
-            
-            # Stream response from OpenAI
-            stream = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                temperature=0.7,
-                max_tokens=500,
-                stream=True
-            )
-            
-            for chunk in stream:
-                if chunk.choices[0].delta.content:
-                    yield chunk.choices[0].delta.content
+            messages, route = self.build_request(user_message, conversation_history)
+            yield from self.stream_messages(messages, route)
         
         except Exception as e:
-            yield f"I apologize, but I encountered an error: {str(e)}. Please try again."
+            yield self.error_reply(e)
     
     def chat(self, user_message, conversation_history=None):
         """
@@ -0,0 +1,158 @@
+import hashlib
+import re
+from threading import Lock
+
+from app.rag.knowledge_base import PORTFOLIO_KNOWLEDGE
+from app.rag.text_utils import strip_rule, tokenize
+
+_EXAMPLE_RE = re.compile(
+    r'\*\*Q: "(?P<question>[^"]+)"\*\*\s*\n\*\*A:\*\*\s*"(?P<answer>.+?)"\s*(?=\n\*\*Q:|\n###|\Z)',
+    re.S,
+)
+# Words that turn a question around ("what has he NOT built?", "his
+# least favourite..."); they barely move the overlap score
+_CONTRARY_RE = re.compile(
+    r"\b(?:not|no|never|neither|nor|none|nothing|without|except|cannot|least|worst)\b|n['\u2019]t\b"
+)
+
+
+def _contrary_words(text):
+    """The words of text that negate or qualify it, e.g. {"not"}."""
+    return frozenset(match.group(0).replace("\u2019", "'") for match in _CONTRARY_RE.finditer(text.lower()))
+
+
+def _section(knowledge, heading, level="## "):
+    """Return the text under a heading, up to the next heading of the same level."""
+    marker = f"\n{level}{heading}"
+    start = knowledge.find(marker)
+    if start < 0:
+        return ""
+    start = knowledge.find("\n", start + 1)
+    end = knowledge.find(f"\n{level}", start)
+    return knowledge[start:end if end >= 0 else len(knowledge)]
+
+
+def parse_faq(knowledge):
+    """
+    Extract canonical question/answer pairs from the knowledge base:
+    the FREQUENTLY ASKED QUESTIONS section and the example responses
+    in the CONVERSATION GUIDELINES.
+
+    Args:
+        knowledge (str): Markdown knowledge base text
+
+    Returns:
+        list: (question, answer) tuples
+    """
+    pairs = []
+
+    faq = _section(knowledge, "FREQUENTLY ASKED QUESTIONS")
+    for block in faq.split("\n### ")[1:]:
+        question, _, answer = block.partition("\n")
+        answer = strip_rule(answer)
+        if question.strip() and answer:
+            pairs.append((question.strip(), answer))
+
+    examples = _section(knowledge, "Example Good Responses:", level="### ")
+    for match in _EXAMPLE_RE.finditer(examples):
+        pairs.append((match.group("question"), match.group("answer").strip()))
+
+    return pairs
+
+
+class FaqIndex:
+    """
+    Token-overlap index over the knowledge base's canonical Q/A pairs.
+    Confident matches are answered directly, without calling the model.
+    A question with a negation or qualifier the FAQ question lacks never
+    matches it, however high the overlap.
+    """
+
+    def __init__(self, knowledge=PORTFOLIO_KNOWLEDGE, threshold=0.6):
+        """
+        Build the index.
+
+        Args:
+            knowledge (str): Markdown knowledge base text
+            threshold (float): Minimum Jaccard similarity for a match
+        """
+        self.threshold = threshold
+        self.lock = Lock()
+        self.fingerprint = None
+        self.entries = []
+        self.postings = {}
+        self.hits = 0
+        self.misses = 0
+        self.refresh(knowledge)
+
+    def refresh(self, knowledge):
+        """
+        Rebuild the index if the knowledge base text changed.
+
+        Args:
+            knowledge (str): Markdown knowledge base text
+
+        Returns:
+            bool: True if the index was rebuilt
+        """
+        fingerprint = hashlib.sha256(knowledge.encode("utf-8")).hexdigest()
+        if fingerprint == self.fingerprint:
+            return False
+
+        entries = []
+        postings = {}  # {token: [entry_index, ...]}
+        for question, answer in parse_faq(knowledge):
+            tokens = frozenset(tokenize(question))
+            if not tokens:
+                continue
+            for token in tokens:
+                postings.setdefault(token, []).append(len(entries))
+            entries.append((question, tokens, answer, _contrary_words(question)))
+
+        with self.lock:
+            self.entries = entries
+            self.postings = postings
+            self.fingerprint = fingerprint
+        return True
+
+    def match(self, user_message):
+        """
+        Find the canonical answer for a question.
+
+        Args:
+            user_message (str): The user's message
+
+        Returns:
+            str: Canonical answer, or None if nothing matches confidently
+        """
+        tokens = frozenset(tokenize(user_message))
+        contrary = _contrary_words(user_message)
+
+        best_score, best_answer = 0.0, None
+        if tokens:
+            entries, postings = self.entries, self.postings
+            candidates = {i for token in tokens for i in postings.get(token, ())}
+            for i in candidates:
+                _, faq_tokens, answer, faq_contrary = entries[i]
+                if not contrary <= faq_contrary:
+                    continue
+                score = len(tokens & faq_tokens) / len(tokens | faq_tokens)
+                if score > best_score:
+                    best_score, best_answer = score, answer
+
+        with self.lock:
+            if best_score < self.threshold:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return best_answer
+
+    def stats(self):
+        """
+        Get index counters.
+
+        Returns:
+            dict: Entry count, hits and misses
+        """
+        with self.lock:
+            return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,255 @@
+"""
+Hedged completion requests.
+
+HedgingProvider wraps another provider. If a stream has not produced its
+first chunk within the TTFT budget, a second request for the same
+messages is started (optionally on a smaller, faster model). Whichever
+attempt produces a chunk first is streamed, and the other is cancelled.
+Once a chunk has been sent, nothing is hedged or switched any more.
+
+A hedge costs a second upstream request, so hedges are rationed: each
+request earns max_ratio of a hedge, banked up to `burst`. When upstream
+is slow across the board, hedging then adds at most that fraction of
+extra load instead of doubling it.
+
+The sync path pumps each attempt on its own thread so the two can race.
+A generator cannot be closed from another thread while it waits on the
+network, so a cancelled attempt is stopped through the provider's
+abortable_stream(): the OpenAI provider shuts down the attempt's
+connection, and the blocked read fails at once. The async path cancels
+the losing task outright.
+"""
+import asyncio
+import os
+import time
+from queue import Empty, Queue
+from threading import Event, Lock, Thread
+
+from app.rag.metrics import UPSTREAM_HEDGES
+from app.rag.providers import LLMProvider
+
+PRIMARY, HEDGE = 0, 1
+
+
+class _Attempt:
+    """One upstream stream pumped into a shared queue from a thread."""
+
+    def __init__(self, index, stream, results):
+        """
+        Args:
+            index (int): PRIMARY or HEDGE
+            stream (tuple): (chunks, abort) as from LLMProvider.abortable_stream()
+            results (Queue): Receives (index, kind, value) tuples
+        """
+        self.index = index
+        self.chunks, self.abort = stream
+        self.results = results
+        self.cancelled = Event()
+        Thread(target=self._pump, name="hedge-attempt", daemon=True).start()
+
+    def _pump(self):
+        try:
+            for chunk in self.chunks:
+                if self.cancelled.is_set():
+                    return
+                self.results.put((self.index, "chunk", chunk))
+            self.results.put((self.index, "end", None))
+        except Exception as e:
+            self.results.put((self.index, "error", e))
+        finally:
+            self.chunks.close()
+
+    def cancel(self):
+        """Stop the attempt, closing its upstream request without waiting for a chunk."""
+        if self.cancelled.is_set():
+            return
+        self.cancelled.set()
+        self.abort()
+
+
+class HedgingProvider(LLMProvider):
+    """Races a second request against a primary that is slow to start."""
+
+    def __init__(self, inner, ttft_budget, hedge_model=None, max_ratio=0.1, burst=5):
+        """
+        Initialize the hedging wrapper.
+
+        Args:
+            inner (LLMProvider): Provider doing the actual requests
+            ttft_budget (float): Seconds to wait for a first chunk before hedging
+            hedge_model (str): Model for the hedge, or None for the request's own
+            max_ratio (float): Hedges earned per request
+            burst (float): Most hedges that can be banked
+        """
+        super().__init__(inner.model)
+        self.inner = inner
+        self.name = inner.name
+        self.ttft_budget = ttft_budget
+        self.hedge_model = hedge_model
+        self.max_ratio = max_ratio
+        self.burst = burst
+        self.tokens = burst
+
+        self.lock = Lock()
+        self.requests = 0
+        self.counts = {"fired": 0, "suppressed": 0, "primary_won": 0, "hedge_won": 0}
+
+    @classmethod
+    def wrap_from_env(cls, inner):
+        """
+        Wrap inner per HEDGE_TTFT_MS (0 disables), HEDGE_MODEL,
+        HEDGE_MAX_RATIO and HEDGE_BURST.
+
+        Returns:
+            LLMProvider: The hedged provider, or inner unchanged
+        """
+        budget_ms = float(os.getenv("HEDGE_TTFT_MS", "0"))
+        if budget_ms <= 0:
+            return inner
+        return cls(
+            inner,
+            budget_ms / 1000,
+            hedge_model=os.getenv("HEDGE_MODEL") or None,
+            max_ratio=float(os.getenv("HEDGE_MAX_RATIO", "0.1")),
+            burst=float(os.getenv("HEDGE_BURST", "5")),
+        )
+
+    async def aprewarm(self):
+        await self.inner.aprewarm()
+
+    def _count(self, event):
+        with self.lock:
+            self.counts[event] += 1
+        UPSTREAM_HEDGES.inc(labels=(self.name, event))
+
+    def _start_request(self):
+        with self.lock:
+            self.requests += 1
+            self.tokens = min(self.burst, self.tokens + self.max_ratio)
+
+    def _try_hedge(self):
+        """Spend a banked hedge; returns False (and counts it) when none is left."""
+        with self.lock:
+            allowed = self.tokens >= 1
+            if allowed:
+                self.tokens -= 1
+        self._count("fired" if allowed else "suppressed")
+        return allowed
+
+    def _hedge_model(self, model):
+        return self.hedge_model or model
+
+    def stream(self, messages, model=None, max_tokens=None):
+        self._start_request()
+        results = Queue()
+        attempts = [_Attempt(PRIMARY, self.inner.abortable_stream(messages, model, max_tokens), results)]
+        deadline = time.monotonic() + self.ttft_budget
+        may_hedge = True
+        failed = 0
+        try:
+            # Wait for the first chunk from either attempt
+            while True:
+                timeout = max(0.0, deadline - time.monotonic()) if may_hedge else None
+                try:
+                    index, kind, value = results.get(timeout=timeout)
+                except Empty:
+                    may_hedge = False
+                    if self._try_hedge():
+                        stream = self.inner.abortable_stream(messages, self._hedge_model(model), max_tokens)
+                        attempts.append(_Attempt(HEDGE, stream, results))
+                    continue
+                if kind == "error":
+                    failed += 1
+                    # Without a hedge running, fail as an unhedged stream would
+                    if failed == len(attempts):
+                        raise value
+                    continue
+                winner = index
+                break
+
+            if len(attempts) > 1:
+                self._count("hedge_won" if winner == HEDGE else "primary_won")
+            for attempt in attempts:
+                if attempt.index != winner:
+                    attempt.cancel()
+
+            while kind == "chunk":
+                yield value
+                index, kind, value = results.get()
+                while index != winner:
+                    index, kind, value = results.get()
+            if kind == "error":
+                raise value
+        finally:
+            for attempt in attempts:
+                attempt.cancel()
+
+    async def astream(self, messages, model=None, max_tokens=None):
+        self._start_request()
+        results = asyncio.Queue()
+
+        async def pump(index, chunks):
+            try:
+                async for chunk in chunks:
+                    await results.put((index, "chunk", chunk))
+                await results.put((index, "end", None))
+            except Exception as e:
+                await results.put((index, "error", e))
+            finally:
+                await chunks.aclose()
+
+        chunks = self.inner.astream(messages, model, max_tokens)
+        tasks = {PRIMARY: asyncio.ensure_future(pump(PRIMARY, chunks))}
+        deadline = time.monotonic() + self.ttft_budget
+        may_hedge = True
+        failed = 0
+        try:
+            while True:
+                try:
+                    if may_hedge:
+                        item = await asyncio.wait_for(results.get(), max(0.0, deadline - time.monotonic()))
+                    else:
+                        item = await results.get()
+                except asyncio.TimeoutError:
+                    may_hedge = False
+                    if self._try_hedge():
+                        chunks = self.inner.astream(messages, self._hedge_model(model), max_tokens)
+                        tasks[HEDGE] = asyncio.ensure_future(pump(HEDGE, chunks))
+                    continue
+                index, kind, value = item
+                if kind == "error":
+                    failed += 1
+                    if failed == len(tasks):
+                        raise value
+                    continue
+                winner = index
+                break
+
+            if len(tasks) > 1:
+                self._count("hedge_won" if winner == HEDGE else "primary_won")
+            for index, task in tasks.items():
+                if index != winner:
+                    task.cancel()
+
+            while kind == "chunk":
+                yield value
+                index, kind, value = await results.get()
+                while index != winner:
+                    index, kind, value = await results.get()
+            if kind == "error":
+                raise value
+        finally:
+            for task in tasks.values():
+                task.cancel()
+            # Let cancelled attempts close their upstream streams
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+
+    def stats(self):
+        with self.lock:
+            hedging = {
+                "ttft_budget_ms": self.ttft_budget * 1000,
+                "hedge_model": self.hedge_model,
+                "requests": self.requests,
+                **self.counts,
+            }
+        return {**self.inner.stats(), "hedging": hedging}
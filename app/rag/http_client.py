@@ -0,0 +1,249 @@
+import asyncio
+import os
+import random
+import socket
+import time
+from threading import Lock, Thread
+
+import httpx
+import openai
+
+# Failures worth another attempt, as long as nothing has been streamed yet
+RETRYABLE_ERRORS = (
+    openai.APIConnectionError,  # includes APITimeoutError
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+
+def _env_float(name, default):
+    return float(os.getenv(name, str(default)))
+
+
+def abort_response(response):
+    """
+    Tear down a streaming response's connection from any thread.
+
+    Closing the response does not wake a thread blocked reading its
+    body, so the socket is shut down instead: the read fails at once,
+    the upstream sees the connection go away, and the reading thread
+    closes the response as usual.
+
+    Args:
+        response (httpx.Response): Response whose body is being read
+    """
+    network_stream = response.extensions.get("network_stream")
+    sock = network_stream.get_extra_info("socket") if network_stream is not None else None
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+class UpstreamTransport:
+    """
+    Pooled HTTP transport for the OpenAI connection.
+
+    One sync and one async httpx client per process, with a sized
+    keep-alive pool and per-phase timeouts. The SDK's own retries are
+    disabled in favour of retrying_stream(), which retries with jittered
+    backoff only until the first chunk has been streamed.
+    """
+
+    def __init__(self, max_connections=100, max_keepalive=20, keepalive_expiry=30.0,
+                 connect_timeout=5.0, read_timeout=30.0, write_timeout=10.0, pool_timeout=5.0,
+                 max_retries=2, backoff_base=0.25, backoff_max=4.0):
+        """
+        Build the pooled clients.
+
+        Args:
+            max_connections (int): Pool size per client
+            max_keepalive (int): Idle connections kept open
+            keepalive_expiry (float): Seconds an idle connection is kept
+            connect_timeout (float): TCP + TLS connect timeout
+            read_timeout (float): Max seconds between received bytes
+            write_timeout (float): Max seconds to send the request
+            pool_timeout (float): Max seconds to wait for a free connection
+            max_retries (int): Retries before the first streamed chunk
+            backoff_base (float): First retry's backoff ceiling in seconds
+            backoff_max (float): Backoff ceiling in seconds
+        """
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.timeout = httpx.Timeout(
+            connect=connect_timeout, read=read_timeout, write=write_timeout, pool=pool_timeout
+        )
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        self.transport = httpx.HTTPTransport(limits=self.limits)
+        self.async_transport = httpx.AsyncHTTPTransport(limits=self.limits)
+        hooks = {"request": [self._on_request]}
+        self.client = httpx.Client(transport=self.transport, timeout=self.timeout, event_hooks=hooks)
+        self.async_client = httpx.AsyncClient(
+            transport=self.async_transport, timeout=self.timeout,
+            event_hooks={"request": [self._on_async_request]}
+        )
+
+        self.lock = Lock()
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self.prewarmed = 0
+
+    @classmethod
+    def from_env(cls):
+        """Build a transport from OPENAI_POOL_* / OPENAI_*_TIMEOUT settings."""
+        return cls(
+            max_connections=int(os.getenv("OPENAI_POOL_MAX_CONNECTIONS", "100")),
+            max_keepalive=int(os.getenv("OPENAI_POOL_MAX_KEEPALIVE", "20")),
+            keepalive_expiry=_env_float("OPENAI_POOL_KEEPALIVE_EXPIRY", 30),
+            connect_timeout=_env_float("OPENAI_CONNECT_TIMEOUT", 5),
+            read_timeout=_env_float("OPENAI_READ_TIMEOUT", 30),
+            write_timeout=_env_float("OPENAI_WRITE_TIMEOUT", 10),
+            pool_timeout=_env_float("OPENAI_POOL_TIMEOUT", 5),
+            max_retries=int(os.getenv("OPENAI_MAX_RETRIES", "2")),
+        )
+
+    def _on_request(self, request):
+        with self.lock:
+            self.requests += 1
+
+    async def _on_async_request(self, request):
+        self._on_request(request)
+
+    def backoff(self, attempt):
+        """Full-jitter exponential backoff for the given retry number."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+
+    def _should_retry(self, error, attempt, started):
+        """Count a failure and decide whether to retry it."""
+        with self.lock:
+            if started or attempt > self.max_retries or not isinstance(error, RETRYABLE_ERRORS):
+                self.failures += 1
+                return False
+            self.retries += 1
+            return True
+
+    def retrying_stream(self, open_stream):
+        """
+        Stream chunks, retrying failures that happen before the first one.
+
+        Args:
+            open_stream (callable): Returns a fresh chunk iterator per attempt
+
+        Yields:
+            str: Chunks from the first attempt that starts streaming
+        """
+        attempt = 0
+        while True:
+            started = False
+            chunks = open_stream()
+            try:
+                for chunk in chunks:
+                    started = True
+                    yield chunk
+                return
+            except Exception as e:
+                attempt += 1
+                if not self._should_retry(e, attempt, started):
+                    raise
+            finally:
+                # Runs on GeneratorExit too, so an abandoned stream closes upstream at once
+                chunks.close()
+            time.sleep(self.backoff(attempt))
+
+    async def aretrying_stream(self, open_stream):
+        """Async counterpart of retrying_stream(); open_stream returns an async iterator."""
+        attempt = 0
+        while True:
+            started = False
+            chunks = open_stream()
+            try:
+                async for chunk in chunks:
+                    started = True
+                    yield chunk
+                return
+            except Exception as e:
+                attempt += 1
+                if not self._should_retry(e, attempt, started):
+                    raise
+            finally:
+                await chunks.aclose()
+            await asyncio.sleep(self.backoff(attempt))
+
+    def prewarm(self, base_url, connections=2):
+        """
+        Open keep-alive connections to the API host in the background, so
+        the first visitor does not pay for DNS, TCP and TLS setup.
+
+        Args:
+            base_url (str): API base URL
+            connections (int): Connections to open
+        """
+        def warm():
+            try:
+                # Any response will do; it leaves a pooled connection behind
+                self.client.head(str(base_url))
+                with self.lock:
+                    self.prewarmed += 1
+            except httpx.HTTPError:
+                pass
+
+        for _ in range(connections):
+            Thread(target=warm, name="openai-prewarm", daemon=True).start()
+
+    async def aprewarm(self, base_url, connections=2):
+        """
+        Async counterpart of prewarm() for the pool the ASGI path uses.
+        Pooled async connections belong to the event loop that opened
+        them, so this must run on the serving loop (see asgi.py).
+
+        Args:
+            base_url (str): API base URL
+            connections (int): Connections to open
+        """
+        async def warm():
+            try:
+                await self.async_client.head(str(base_url))
+                with self.lock:
+                    self.prewarmed += 1
+            except httpx.HTTPError:
+                pass
+
+        await asyncio.gather(*(warm() for _ in range(connections)))
+
+    @staticmethod
+    def _pool_stats(transport):
+        # httpx has no public pool API; httpcore is pinned in requirements.txt
+        # and tests/test_http_client.py fails if this attribute goes away
+        pool = getattr(transport, "_pool", None)
+        connections = list(getattr(pool, "connections", []))
+        idle = sum(1 for conn in connections if conn.is_idle())
+        return {"open": len(connections), "idle": idle, "active": len(connections) - idle}
+
+    def stats(self):
+        """
+        Get pool occupancy and request counters.
+
+        Returns:
+            dict: Sync/async pool connections, requests, retries, failures
+        """
+        with self.lock:
+            counters = {
+                "requests": self.requests,
+                "retries": self.retries,
+                "failures": self.failures,
+                "prewarmed": self.prewarmed,
+            }
+        return {
+            "pool": self._pool_stats(self.transport),
+            "async_pool": self._pool_stats(self.async_transport),
+            "max_connections": self.limits.max_connections,
+            **counters,
+        }
@@ -0,0 +1,97 @@
+import re
+from threading import Lock
+
+from app.rag.knowledge_base import PORTFOLIO_KNOWLEDGE, PORTFOLIO_DATA
+from app.rag.text_utils import normalize_text
+
+# {page_links key: (page name, phrases that may follow a navigation verb)}.
+# Page names match the phrases chatbot.js auto-links; ambiguous words
+# ("experience") only count with a "page" suffix.
+NAVIGATION_RULES = {
+    "home": ("Home Page", r"home(?: ?page)?|main page|landing page|index(?: page)?|start page"),
+    "about": ("About Page", r"about(?: me| him| page| section)?|bio(?:graphy)?|about (?:vetrivel|mahi)"),
+    "projects": ("Projects Page", r"projects?(?: page| section| list)?|portfolio projects"),
+    "work": ("Work Experience page", r"work(?: experience)?(?: page| section)?|experience (?:page|section)|work history"),
+    "contact": ("Contact Page", r"contact(?: page| section| form| info| details| information)?"),
+}
+
+_VERBS = (
+    r"take me(?: to)?|bring me to|go to|navigate to|head to|open|open up|show me|show|"
+    r"link to|link me to|give me the link to|send me to|let me see|where is|where's|"
+    r"where can i find|i want to see|i want to go to|get me to"
+)
+_PREFIX = r"(?:(?:hey|hi|ok|okay),? )?(?:(?:can|could|would|will) you |please |pls )?"
+_FILLER = r"(?:(?:the|his|your|vetrivel'?s|mahi'?s|a|to)\s+)*"
+_SUFFIX = r"(?: page| section| tab)?(?: please| pls| for me)?"
+
+_ANCHOR_RE = re.compile(r'<a href="([^"]+)">([^<]+)</a>')
+
+
+def _page_anchors(knowledge):
+    """Map each href in the NAVIGATION LINKS section to its anchor tag."""
+    section = knowledge.split("## NAVIGATION LINKS", 1)[-1].split("\n---", 1)[0]
+    return {href: f'<a href="{href}">{label}</a>' for href, label in _ANCHOR_RE.findall(section)}
+
+
+class NavigationRouter:
+    """
+    Answers pure navigation requests ("take me to the contact page")
+    with a fixed link, without calling the model.
+    """
+
+    def __init__(self, page_links=None, knowledge=PORTFOLIO_KNOWLEDGE):
+        """
+        Compile the rule table.
+
+        Args:
+            page_links (dict): {page_key: href}, defaults to PORTFOLIO_DATA["page_links"]
+            knowledge (str): Knowledge base holding the NAVIGATION LINKS section
+        """
+        self.page_links = page_links or PORTFOLIO_DATA["page_links"]
+        anchors = _page_anchors(knowledge)
+
+        self.rules = []
+        for page, (name, phrases) in NAVIGATION_RULES.items():
+            href = self.page_links.get(page)
+            if not href:
+                continue
+            pattern = re.compile(
+                rf"^{_PREFIX}(?:{_VERBS})\s+{_FILLER}(?:{phrases}){_SUFFIX}$"
+            )
+            anchor = anchors.get(href, f'<a href="{href}">{page.title()} Page</a>')
+            self.rules.append((pattern, page, f"Sure! Here's the {name}: {anchor}"))
+
+        self.lock = Lock()
+        self.hits = {page: 0 for page in NAVIGATION_RULES}
+
+    def route(self, user_message):
+        """
+        Match a message against the navigation rules.
+
+        Args:
+            user_message (str): The user's message
+
+        Returns:
+            str: Reply with the page link, or None if it is not a navigation request
+        """
+        text = normalize_text(user_message)
+        if len(text) > 80:
+            return None
+
+        for pattern, page, reply in self.rules:
+            if pattern.match(text):
+                with self.lock:
+                    self.hits[page] += 1
+                return reply
+
+        return None
+
+    def stats(self):
+        """
+        Get per-page hit counters.
+
+        Returns:
+            dict: {page_key: hits}
+        """
+        with self.lock:
+            return dict(self.hits)
@@ -0,0 +1,341 @@
+"""
+In-process metrics with Prometheus text exposition.
+
+Counters, gauges and histograms keep one value cell per thread, so the
+request path only touches memory owned by its own thread and never
+takes a lock; a scrape sums the cells. Cells of threads that have
+exited are folded into a retired cell so totals survive short-lived
+threads without the cell list growing.
+"""
+import math
+import threading
+from bisect import bisect_left
+from threading import Lock
+
+# Request latency buckets in seconds, from cache hits to slow generations
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class _ThreadCells:
+    """Per-thread value cells for one metric, plus a cell for exited threads."""
+
+    def __init__(self, new_cell, merge):
+        self.new_cell = new_cell
+        self.merge = merge
+        self.local = threading.local()
+        self.lock = Lock()
+        self.cells = []
+        self.retired = new_cell()
+
+    def get(self):
+        """This thread's cell; only this thread ever writes to it."""
+        try:
+            return self.local.cell
+        except AttributeError:
+            cell = self.local.cell = self.new_cell()
+            with self.lock:
+                # Retiring here too keeps the list bounded by the live
+                # threads even when nothing scrapes
+                self._retire_locked()
+                self.cells.append((threading.current_thread(), cell))
+            return cell
+
+    def _retire_locked(self):
+        # Called with self.lock held; exited threads never write their cell again
+        live = []
+        for thread, cell in self.cells:
+            if thread.is_alive():
+                live.append((thread, cell))
+            else:
+                self.merge(self.retired, cell)
+        self.cells = live
+
+    def collect(self):
+        """All cells, after folding those of exited threads into the retired cell."""
+        with self.lock:
+            self._retire_locked()
+            return [self.retired] + [cell for _, cell in self.cells]
+
+
+def _merge_values(into, cell):
+    for labels, value in list(cell.items()):
+        into[labels] = into.get(labels, 0) + value
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    """Monotonic counter, optionally labelled."""
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        """
+        Initialize the counter.
+
+        Args:
+            name (str): Metric name
+            documentation (str): HELP text
+            labelnames (tuple): Label names; values are passed positionally
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.cells = _ThreadCells(dict, _merge_values)
+
+    def inc(self, amount=1, labels=()):
+        """
+        Add to the counter.
+
+        Args:
+            amount (float): Non-negative increment
+            labels (tuple): Label values, in labelnames order
+        """
+        cell = self.cells.get()
+        cell[labels] = cell.get(labels, 0) + amount
+
+    def values(self):
+        """
+        Get current totals.
+
+        Returns:
+            dict: Label values tuple -> total
+        """
+        totals = {}
+        for cell in self.cells.collect():
+            _merge_values(totals, cell)
+        return totals
+
+    def value(self, labels=()):
+        """Current total for one label set."""
+        return self.values().get(labels, 0)
+
+    def samples(self):
+        for labels, value in sorted(self.values().items()):
+            yield self.name, labels, value
+
+
+class Gauge(Counter):
+    """
+    Value that can go up and down. Either track it with inc()/dec(),
+    which sum across threads, or give it a function read at scrape time.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), function=None):
+        """
+        Initialize the gauge.
+
+        Args:
+            name (str): Metric name
+            documentation (str): HELP text
+            labelnames (tuple): Label names
+            function (callable): Returns the current value; replaces inc()/dec()
+        """
+        super().__init__(name, documentation, labelnames)
+        self.function = function
+
+    def dec(self, amount=1, labels=()):
+        self.inc(-amount, labels)
+
+    def set_function(self, function):
+        """Read the gauge from function() at scrape time."""
+        self.function = function
+
+    def samples(self):
+        if self.function is not None:
+            yield self.name, (), self.function()
+            return
+        for labels, value in sorted(self.values().items()):
+            yield self.name, labels, value
+
+
+class Histogram:
+    """Cumulative-bucket histogram, optionally labelled."""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        """
+        Initialize the histogram.
+
+        Args:
+            name (str): Metric name
+            documentation (str): HELP text
+            labelnames (tuple): Label names
+            buckets (tuple): Ascending upper bounds; +Inf is added
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self.cells = _ThreadCells(dict, self._merge)
+
+    def _new_series(self):
+        # Per-bucket counts (non-cumulative, last is +Inf), then sum
+        return [0] * (len(self.buckets) + 1) + [0.0]
+
+    def _merge(self, into, cell):
+        for labels, series in list(cell.items()):
+            target = into.setdefault(labels, self._new_series())
+            for i, value in enumerate(series):
+                target[i] += value
+
+    def observe(self, value, labels=()):
+        """
+        Record one observation.
+
+        Args:
+            value (float): Observed value
+            labels (tuple): Label values, in labelnames order
+        """
+        cell = self.cells.get()
+        series = cell.get(labels)
+        if series is None:
+            series = cell[labels] = self._new_series()
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def series(self):
+        """
+        Get merged series.
+
+        Returns:
+            dict: Label values tuple -> (cumulative bucket counts, sum, count)
+        """
+        merged = {}
+        for cell in self.cells.collect():
+            self._merge(merged, cell)
+        result = {}
+        for labels, series in merged.items():
+            cumulative, running = [], 0
+            for count in series[:-1]:
+                running += count
+                cumulative.append(running)
+            result[labels] = (cumulative, series[-1], running)
+        return result
+
+    def samples(self):
+        bounds = self.buckets + (math.inf,)
+        for labels, (cumulative, total, count) in sorted(self.series().items()):
+            for bound, running in zip(bounds, cumulative):
+                yield self.name + "_bucket", labels, running, (("le", _format_value(bound)),)
+            yield self.name + "_sum", labels, total
+            yield self.name + "_count", labels, count
+
+
+class Registry:
+    """Set of metrics rendered together at /metrics."""
+
+    def __init__(self):
+        self.metrics = {}
+        self.lock = Lock()
+
+    def register(self, metric):
+        """Add a metric; registering the same name twice returns the first one."""
+        with self.lock:
+            return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=(), function=None):
+        return self.register(Gauge(name, documentation, labelnames, function))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        """
+        Render every metric in the Prometheus text format (version 0.0.4).
+
+        Returns:
+            str: Exposition text
+        """
+        with self.lock:
+            metrics = list(self.metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for sample in metric.samples():
+                name, labels, value = sample[:3]
+                extra = sample[3] if len(sample) > 3 else ()
+                lines.append(f"{name}{_format_labels(metric.labelnames, labels, extra)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+# Chat path
+ANSWERS = REGISTRY.counter("rag_answers_total", "Chat answers by the path that produced them", ("source",))
+STREAMS = REGISTRY.counter("rag_streams_total", "Chat streams by how they ended", ("outcome",))
+CACHE_LOOKUPS = REGISTRY.counter("rag_cache_lookups_total", "Answer cache lookups", ("cache", "result"))
+STREAM_CHUNKS = REGISTRY.counter("rag_stream_chunks_total", "Answer chunks streamed to clients", ("source",))
+SSE_FRAMES = REGISTRY.counter("rag_sse_frames_total", "SSE frames written to clients")
+TTFT = REGISTRY.histogram(
+    "rag_time_to_first_chunk_seconds", "Request start to first answer chunk", ("source",)
+)
+STREAM_DURATION = REGISTRY.histogram(
+    "rag_stream_duration_seconds", "Request start to end of the answer stream", ("source",)
+)
+IN_FLIGHT = REGISTRY.gauge("rag_streams_in_flight", "Chat streams currently being written")
+REPLAY_RESUMES = REGISTRY.counter(
+    "rag_stream_resumes_total", "Chat stream reconnects (Last-Event-ID) by outcome", ("outcome",)
+)
+REPLAY_ENTRIES = REGISTRY.gauge("rag_replay_entries", "Chat turns kept for reconnects")
+
+# Upstream model
+UPSTREAM_REQUESTS = REGISTRY.counter("rag_upstream_requests_total", "Completion streams opened", ("provider",))
+UPSTREAM_ERRORS = REGISTRY.counter("rag_upstream_errors_total", "Failed completion streams", ("provider", "error"))
+UPSTREAM_TTFT = REGISTRY.histogram(
+    "rag_upstream_time_to_first_token_seconds", "Completion request to first token", ("provider",)
+)
+UPSTREAM_HEDGES = REGISTRY.counter(
+    "rag_upstream_hedges_total", "Hedged completion requests fired, suppressed and won", ("provider", "event")
+)
+
+# Model tiers (app/rag/model_router.py)
+MODEL_ROUTES = REGISTRY.counter("rag_model_routes_total", "Chat turns routed to each model tier", ("tier",))
+TIER_REQUESTS = REGISTRY.counter("rag_tier_requests_total", "Completion streams opened per model tier", ("tier",))
+TIER_TTFT = REGISTRY.histogram(
+    "rag_tier_time_to_first_token_seconds", "Completion request to first token per model tier", ("tier",)
+)
+TIER_DURATION = REGISTRY.histogram(
+    "rag_tier_stream_duration_seconds", "Completion request to last token per model tier", ("tier",)
+)
+TIER_TOKENS = REGISTRY.counter(
+    "rag_tier_tokens_total", "Prompt and completion tokens per model tier", ("tier", "kind")
+)
+
+# Sessions
+SESSIONS_CREATED = REGISTRY.counter("rag_sessions_created_total", "Chat sessions created")
+ACTIVE_SESSIONS = REGISTRY.gauge("rag_active_sessions", "Live chat sessions")
+
+# Admission control
+ADMISSION_DECISIONS = REGISTRY.counter(
+    "rag_admission_decisions_total", "Chat requests admitted, queued then admitted, or shed", ("decision",)
+)
+ADMISSION_WAIT = REGISTRY.histogram(
+    "rag_admission_wait_seconds", "Time spent waiting for an upstream stream slot"
+)
+ADMISSION_QUEUE_DEPTH = REGISTRY.gauge("rag_admission_queue_depth", "Requests waiting for an upstream stream slot")
+UPSTREAM_STREAMS_ACTIVE = REGISTRY.gauge("rag_upstream_streams_active", "Upstream stream slots in use")
@@ -0,0 +1,225 @@
+"""
+Query-complexity routing.
+
+ModelRouter scores each chat turn from signals that are already at hand
+when the prompt is built, so routing adds no model call:
+
+- question length in words
+- intent keywords: synthesis ("compare", "why", "walk me through")
+  versus lookups (email, GitHub, greetings)
+- history depth, since long conversations need more context reasoning
+- how the retrieval scores are spread: one section scoring far above
+  the rest is a lookup, several sections scoring alike need synthesis
+
+The score picks a tier from an ordered table: the first tier whose
+max_score covers it, or the last tier. Each tier names a model and a
+completion token limit (None keeps the provider's own), e.g. a small
+fast model for lookups and the large model for the rest. The default
+table only sends a turn to the small model on a positive lookup signal
+(a lookup keyword), never for merely lacking synthesis signals.
+
+Routing is opt-in: RAG_MODEL_ROUTER=1 turns it on with the default
+table, and RAG_MODEL_TIERS supplies a table of its own.
+"""
+import json
+import os
+import re
+from threading import Lock
+
+from app.rag.metrics import MODEL_ROUTES
+
+SYNTHESIS_RE = re.compile(
+    r"\b(?:compare|comparison|contrast|differen(?:ce|ces|t)|versus|vs\.?|why|explain|"
+    r"how (?:does|did|do|would|could|can)|walk me through|in detail|trade-?offs?|pros and cons|"
+    r"summari[sz]e|overall|evaluate|architecture|design(?:ed)?|approach|strengths?|weakness(?:es)?|"
+    r"recommend|fit for|suited)\b"
+)
+LOOKUP_RE = re.compile(
+    r"^(?:hi|hello|hey|thanks|thank you|ok|okay)\b|"
+    r"\b(?:e-?mail|phone|linkedin|github|resume|cv|location|based|contact|name|title|degree|university)\b"
+)
+
+# Score weights per signal
+SYNTHESIS_WEIGHT = 2             # synthesis keyword
+LOOKUP_WEIGHT = -2               # lookup keyword, when there is no synthesis keyword
+LONG_QUESTION_WORDS = (20, 45)   # +1 past each
+DEEP_HISTORY_TURNS = 3           # +1 at or past this many earlier questions
+FOCUSED_SHARE = 0.6              # top hit's share of the scores; -1 at or above
+DIFFUSE_SHARE = 0.35             # +1 at or below, with 3+ hits
+
+# A lookup keyword alone scores LOOKUP_WEIGHT; a focused retrieval can add
+# -1 more, but cannot reach the lookup tier without the keyword
+DEFAULT_TIERS = [
+    {"name": "lookup", "model": "gpt-4o-mini", "max_tokens": None, "max_score": LOOKUP_WEIGHT},
+    {"name": "synthesis", "model": None, "max_tokens": None},
+]
+
+
+class ModelTier:
+    """One row of the tier table."""
+
+    __slots__ = ("name", "model", "max_tokens", "max_score")
+
+    def __init__(self, name, model=None, max_tokens=None, max_score=None):
+        """
+        Args:
+            name (str): Tier label used in metrics
+            model (str): Model for this tier, or None for the provider default
+            max_tokens (int): Completion token limit, or None for the provider default
+            max_score (int): Highest complexity score routed here; None takes everything
+        """
+        self.name = name
+        self.model = model
+        self.max_tokens = max_tokens
+        self.max_score = max_score
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class Route:
+    """The tier picked for one turn, with the signals behind it."""
+
+    __slots__ = ("tier", "model", "max_tokens", "score", "signals")
+
+    def __init__(self, tier, score=0, signals=None):
+        self.tier = tier.name
+        self.model = tier.model
+        self.max_tokens = tier.max_tokens
+        self.score = score
+        self.signals = signals or {}
+
+
+class ModelRouter:
+    """Maps each turn to a model tier by a cheap complexity score."""
+
+    def __init__(self, tiers):
+        """
+        Initialize the router.
+
+        Args:
+            tiers (list): ModelTier objects, simplest first
+
+        Raises:
+            ValueError: If the table is empty or repeats a tier name
+        """
+        if not tiers:
+            raise ValueError("The model tier table is empty")
+        names = [tier.name for tier in tiers]
+        if len(set(names)) != len(names):
+            raise ValueError(f"Duplicate model tier names in {names}")
+        self.tiers = list(tiers)
+        self.lock = Lock()
+        self.routed = {name: 0 for name in names}
+
+    @classmethod
+    def from_env(cls):
+        """
+        Build a router from RAG_MODEL_ROUTER and RAG_MODEL_TIERS (JSON list
+        of tier objects). Unless RAG_MODEL_ROUTER=1 or RAG_MODEL_TIERS is
+        set, and always with RAG_MODEL_ROUTER=0, every turn goes to one
+        provider-default tier.
+
+        Raises:
+            ValueError: If RAG_MODEL_TIERS is not a valid tier table
+        """
+        switch = os.getenv("RAG_MODEL_ROUTER", "")
+        raw = os.getenv("RAG_MODEL_TIERS")
+        if switch == "0" or not (switch == "1" or raw):
+            return cls([ModelTier("default")])
+        table = DEFAULT_TIERS
+        if raw:
+            try:
+                table = json.loads(raw)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"RAG_MODEL_TIERS is not valid JSON: {e}") from None
+        try:
+            return cls([ModelTier(**entry) for entry in table])
+        except TypeError as e:
+            raise ValueError(f"Invalid RAG_MODEL_TIERS entry: {e}") from None
+
+    def signals(self, user_message, history_turns=0, scores=()):
+        """
+        Measure the routing signals for a turn.
+
+        Args:
+            user_message (str): The user's message
+            history_turns (int): Earlier questions in the conversation
+            scores (list): Retrieval scores, best first
+
+        Returns:
+            dict: Signal name -> value
+        """
+        text = user_message.lower()
+        total = sum(scores)
+        return {
+            "words": len(text.split()),
+            "synthesis": bool(SYNTHESIS_RE.search(text)),
+            "lookup": bool(LOOKUP_RE.search(text)),
+            "history_turns": history_turns,
+            "hits": len(scores),
+            "top_share": round(scores[0] / total, 3) if total else None,
+        }
+
+    def score(self, signals):
+        """
+        Combine signals into a complexity score; higher needs a larger model.
+
+        Args:
+            signals (dict): Output of signals()
+
+        Returns:
+            int: Complexity score
+        """
+        score = sum(1 for limit in LONG_QUESTION_WORDS if signals["words"] > limit)
+        if signals["synthesis"]:
+            score += SYNTHESIS_WEIGHT
+        elif signals["lookup"]:
+            score += LOOKUP_WEIGHT
+        if signals["history_turns"] >= DEEP_HISTORY_TURNS:
+            score += 1
+        share = signals["top_share"]
+        if share is not None:
+            if share >= FOCUSED_SHARE:
+                score -= 1
+            elif share <= DIFFUSE_SHARE and signals["hits"] >= 3:
+                score += 1
+        return score
+
+    def route(self, user_message, history_turns=0, scores=()):
+        """
+        Pick the tier for a turn.
+
+        Args:
+            user_message (str): The user's message
+            history_turns (int): Earlier questions in the conversation
+            scores (list): Retrieval scores, best first
+
+        Returns:
+            Route: Chosen tier with its model and token limit
+        """
+        if len(self.tiers) == 1:
+            route = Route(self.tiers[0])
+        else:
+            signals = self.signals(user_message, history_turns, scores)
+            score = self.score(signals)
+            tier = next(
+                (t for t in self.tiers if t.max_score is not None and score <= t.max_score),
+                self.tiers[-1]
+            )
+            route = Route(tier, score, signals)
+        with self.lock:
+            self.routed[route.tier] += 1
+        MODEL_ROUTES.inc(labels=(route.tier,))
+        return route
+
+    def stats(self):
+        """
+        Get the tier table and how many turns went to each tier.
+
+        Returns:
+            dict: Tier rows and routed counts
+        """
+        with self.lock:
+            routed = dict(self.routed)
+        return {"tiers": [tier.to_dict() for tier in self.tiers], "routed": routed}
@@ -0,0 +1,309 @@
+"""
+Opt-in profiling of single requests.
+
+Set PROFILE_TOKEN and send the same value in an X-Profile header; that
+request, including its streamed body, is profiled and the result is
+written to PROFILE_DIR as collapsed stacks ("frame;frame;frame count"
+per line), ready for flamegraph.pl, speedscope or inferno. The file name
+comes back in an X-Profile-Id response header.
+
+The default sampler walks the request thread's stack every
+PROFILE_INTERVAL_MS from a helper thread, so the request itself runs
+at full speed, and waiting (on the model, on socket writes) shows up as
+the frame that waits. PROFILE_MODE=cprofile uses cProfile instead, for
+interpreters without sys._current_frames(); it also writes a .prof file
+for pstats, and its collapsed output only has caller;callee depth.
+
+Under the ASGI server, chat streams share the event loop thread, so a
+profile of one stream also samples whatever else the loop ran meanwhile.
+
+Retention is bounded: one profile runs at a time, each stops after
+PROFILE_MAX_SECONDS, and only the newest PROFILE_MAX_FILES are kept.
+"""
+import cProfile
+import hmac
+import os
+import pstats
+import sys
+import threading
+import time
+import uuid
+from threading import Lock
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_ID_HEADER = "X-Profile-Id"
+
+
+_labels = {}
+
+
+def _frame_label(code):
+    label = _labels.get(code)
+    if label is None:
+        path = code.co_filename
+        marker = path.rfind("site-packages" + os.sep)
+        if marker != -1:
+            path = path[marker + len("site-packages") + 1:]
+        else:
+            path = os.path.relpath(path) if path.startswith(os.getcwd()) else os.path.basename(path)
+        label = _labels[code] = f"{code.co_name} ({path}:{code.co_firstlineno})"
+    return label
+
+
+class SamplingProfiler:
+    """Samples one thread's stack at a fixed interval from a helper thread."""
+
+    def __init__(self, thread_id, interval, max_seconds):
+        """
+        Initialize the sampler.
+
+        Args:
+            thread_id (int): Thread to sample (threading.get_ident())
+            interval (float): Seconds between samples
+            max_seconds (float): Stop sampling after this long
+        """
+        self.thread_id = thread_id
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.counts = {}
+        self.samples = 0
+        self.stopping = threading.Event()
+        self.sampler = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    def start(self):
+        self.sampler.start()
+
+    def _run(self):
+        deadline = time.monotonic() + self.max_seconds
+        while not self.stopping.wait(self.interval) and time.monotonic() < deadline:
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                return
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            del frame
+            key = ";".join(reversed(stack))
+            self.counts[key] = self.counts.get(key, 0) + 1
+            self.samples += 1
+
+    def stop(self):
+        self.stopping.set()
+        self.sampler.join()
+
+    def collapsed(self):
+        """Collapsed stack lines, root frame first."""
+        return [f"{stack} {count}" for stack, count in sorted(self.counts.items())]
+
+
+class CProfileProfiler:
+    """cProfile on the calling thread; start() and stop() must run on the same thread."""
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+
+    def start(self):
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+
+    def collapsed(self):
+        """Caller;callee lines weighted by the callee's own time in microseconds."""
+        stats = pstats.Stats(self.profile).stats
+        lines = []
+        for (path, line, name), (_, _, tottime, _, callers) in stats.items():
+            callee = f"{name} ({os.path.basename(path)}:{line})"
+            for (caller_path, caller_line, caller_name), caller_stats in callers.items():
+                # Attribute the callee's own time to each caller by call count
+                share = tottime * caller_stats[0] / max(1, sum(c[0] for c in callers.values()))
+                weight = round(share * 1e6)
+                if weight:
+                    caller = f"{caller_name} ({os.path.basename(caller_path)}:{caller_line})"
+                    lines.append(f"{caller};{callee} {weight}")
+            if not callers and round(tottime * 1e6):
+                lines.append(f"{callee} {round(tottime * 1e6)}")
+        return sorted(lines)
+
+
+class Profile:
+    """One running request profile; stop() writes it out."""
+
+    def __init__(self, profiler, label, backend):
+        self.profiler = profiler
+        self.backend = backend
+        safe_label = "".join(c if c.isalnum() else "-" for c in label)
+        self.name = f"{time.strftime('%Y%m%dT%H%M%S')}-{safe_label}-{uuid.uuid4().hex[:8]}"
+        self.started = time.perf_counter()
+        self.stopped = False
+        self.lock = Lock()
+
+    def stop(self):
+        """
+        Stop profiling and write the collapsed stacks; safe to call twice.
+
+        Returns:
+            str: Path of the collapsed-stack file, or None if already stopped
+        """
+        with self.lock:
+            if self.stopped:
+                return None
+            self.stopped = True
+        try:
+            self.backend.stop()
+            return self.profiler.write(self)
+        finally:
+            self.profiler.release()
+
+
+class Profiler:
+    """Starts request profiles for callers presenting the configured token."""
+
+    def __init__(self, token=None, directory="profiles", mode="sampling", interval=0.005,
+                 max_seconds=60.0, max_files=50):
+        """
+        Initialize the profiler.
+
+        Args:
+            token (str): Secret expected in the X-Profile header; None disables profiling
+            directory (str): Where profiles are written
+            mode (str): "sampling" or "cprofile"
+            interval (float): Seconds between stack samples
+            max_seconds (float): Longest a single profile samples
+            max_files (int): Profiles kept on disk, older ones are deleted; 0 keeps all
+        """
+        self.token = token
+        self.directory = directory
+        if mode == "sampling" and not hasattr(sys, "_current_frames"):
+            mode = "cprofile"
+        self.mode = mode
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.max_files = max_files
+        self.lock = Lock()
+        self.active = False
+        self.written = 0
+        self.rejected = 0
+
+    @classmethod
+    def from_env(cls):
+        """Build a profiler from PROFILE_TOKEN, PROFILE_DIR, PROFILE_MODE and the limits."""
+        return cls(
+            token=os.getenv("PROFILE_TOKEN") or None,
+            directory=os.getenv("PROFILE_DIR", "profiles"),
+            mode=os.getenv("PROFILE_MODE", "sampling").lower(),
+            interval=float(os.getenv("PROFILE_INTERVAL_MS", "5")) / 1000,
+            max_seconds=float(os.getenv("PROFILE_MAX_SECONDS", "60")),
+            max_files=int(os.getenv("PROFILE_MAX_FILES", "50")),
+        )
+
+    @property
+    def enabled(self):
+        return self.token is not None
+
+    def start(self, header_value, label="request"):
+        """
+        Start profiling the calling thread if the header carries the token.
+
+        Args:
+            header_value (str): Value of the X-Profile request header, if any
+            label (str): Included in the file name, e.g. the endpoint
+
+        Returns:
+            Profile: The running profile, or None if not authorized or one is already running
+        """
+        if not self.enabled or not header_value:
+            return None
+        if not hmac.compare_digest(header_value.encode("utf-8"), self.token.encode("utf-8")):
+            return None
+        with self.lock:
+            if self.active:
+                self.rejected += 1
+                return None
+            self.active = True
+        if self.mode == "cprofile":
+            backend = CProfileProfiler()
+        else:
+            backend = SamplingProfiler(threading.get_ident(), self.interval, self.max_seconds)
+        backend.start()
+        return Profile(self, label, backend)
+
+    def release(self):
+        with self.lock:
+            self.active = False
+
+    def write(self, profile):
+        """Write a stopped profile and prune old ones; returns the collapsed-stack path."""
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, profile.name + ".collapsed")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("\n".join(profile.backend.collapsed()) + "\n")
+        if isinstance(profile.backend, CProfileProfiler):
+            profile.backend.profile.dump_stats(os.path.join(self.directory, profile.name + ".prof"))
+        with self.lock:
+            self.written += 1
+        self._prune()
+        return path
+
+    def _prune(self):
+        profiles = {}
+        for entry in os.scandir(self.directory):
+            stem, ext = os.path.splitext(entry.name)
+            if ext in (".collapsed", ".prof"):
+                profiles.setdefault(stem, []).append(entry.path)
+        if not self.max_files:
+            return
+        # Names start with a timestamp, so they sort oldest first
+        for stem in sorted(profiles)[:-self.max_files]:
+            for path in profiles[stem]:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def install(self, app):
+        """
+        Profile Flask requests that carry the token, until the response
+        (including a streamed body) is closed.
+
+        Args:
+            app (Flask): Application to hook
+        """
+        if not self.enabled:
+            return
+
+        from flask import g, request
+
+        @app.before_request
+        def start_profile():
+            g.profile = self.start(request.headers.get(PROFILE_HEADER), request.endpoint or "request")
+
+        @app.after_request
+        def attach_profile(response):
+            profile = g.pop("profile", None)
+            if profile is not None:
+                response.headers[PROFILE_ID_HEADER] = profile.name
+                response.call_on_close(profile.stop)
+            return response
+
+        @app.teardown_request
+        def stop_unfinished_profile(error):
+            # Requests that failed before after_request still release the slot
+            profile = g.pop("profile", None)
+            if profile is not None:
+                profile.stop()
+
+    def stats(self):
+        """
+        Get profiler counters.
+
+        Returns:
+            dict: Whether profiling is enabled, its mode, profiles written and rejected
+        """
+        with self.lock:
+            return {"enabled": self.enabled, "mode": self.mode, "active": self.active,
+                    "written": self.written, "rejected": self.rejected}
+
+
+profiler = Profiler.from_env()
@@ -0,0 +1,372 @@
+import asyncio
+import os
+import random
+import time
+import zlib
+from abc import ABC, abstractmethod
+from threading import Event, Lock
+
+from openai import AsyncOpenAI, OpenAI
+from app.rag.http_client import UpstreamTransport, abort_response
+
+
+class LLMProvider(ABC):
+    """
+    Streaming chat-completion backend used by PortfolioChatbot.
+
+    Implementations yield answer text for a prebuilt message list and
+    must close any upstream work when the generator is closed early.
+    """
+
+    name = None
+
+    def __init__(self, model):
+        self.model = model
+
+    @abstractmethod
+    def stream(self, messages, model=None, max_tokens=None):
+        """
+        Stream a completion.
+
+        Args:
+            messages (list): Chat messages
+            model (str): Model override, or None for the provider default
+            max_tokens (int): Completion token limit, or None for the provider default
+
+        Yields:
+            str: Chunks of the response
+        """
+
+    @abstractmethod
+    async def astream(self, messages, model=None, max_tokens=None):
+        """Async counterpart of stream()."""
+
+    async def aprewarm(self):
+        """Open upstream connections for astream() on the running event loop; nothing by default."""
+
+    def abortable_stream(self, messages, model=None, max_tokens=None):
+        """
+        Start a stream() that another thread can stop while it waits.
+
+        Returns:
+            tuple: (chunk iterator as from stream(), abort callable). By
+                default abort does nothing and the stream stops when its
+                reader next closes it.
+        """
+        return self.stream(messages, model, max_tokens), lambda: None
+
+    def stats(self):
+        """Get provider counters for /api/chat/stats."""
+        return {}
+
+
+class OpenAIProvider(LLMProvider):
+    """OpenAI chat completions over the pooled UpstreamTransport."""
+
+    name = "openai"
+
+    def __init__(self, model="gpt-4o", temperature=0.7, max_tokens=500, transport=None, prewarm=True):
+        """
+        Initialize the OpenAI clients.
+
+        Args:
+            model (str): Default model
+            temperature (float): Sampling temperature
+            max_tokens (int): Completion token limit
+            transport (UpstreamTransport): Shared transport, or None to build one from env
+            prewarm (bool): Open pooled connections in the background (the
+                async pool is warmed by aprewarm(), on the serving loop)
+
+        Raises:
+            ValueError: If OPENAI_API_KEY is not set
+        """
+        super().__init__(model)
+        api_key = os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            raise ValueError("OPENAI_API_KEY environment variable not set")
+
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+
+        # Shared pooled transport; retries are handled by transport.retrying_stream()
+        self.transport = transport or UpstreamTransport.from_env()
+        self.client = OpenAI(
+            http_client=self.transport.client,
+            timeout=self.transport.timeout,
+            max_retries=0
+        )
+        # Used by the ASGI chat path (asgi.py); one process multiplexes many streams
+        self.async_client = AsyncOpenAI(
+            http_client=self.transport.async_client,
+            timeout=self.transport.timeout,
+            max_retries=0
+        )
+        self.prewarm = prewarm
+        if prewarm:
+            self.transport.prewarm(self.client.base_url)
+
+    @classmethod
+    def from_env(cls):
+        """Build a provider from OPENAI_MODEL / OPENAI_PREWARM and the transport settings."""
+        return cls(
+            model=os.getenv("OPENAI_MODEL", "gpt-4o"),
+            prewarm=os.getenv("OPENAI_PREWARM", "1") != "0"
+        )
+
+    async def aprewarm(self):
+        if self.prewarm:
+            await self.transport.aprewarm(self.async_client.base_url)
+
+    def stream(self, messages, model=None, max_tokens=None):
+        """
+        Stream a completion. Failures before the first chunk are retried
+        by the transport; closing the generator early closes the upstream
+        response as well.
+        """
+        return self.abortable_stream(messages, model, max_tokens)[0]
+
+    def abortable_stream(self, messages, model=None, max_tokens=None):
+        """
+        stream(), plus an abort callable that shuts down the open upstream
+        response from another thread, so a blocked read fails at once.
+        """
+        aborted = Event()
+        lock = Lock()
+        responses = []
+
+        def open_stream():
+            if aborted.is_set():
+                return
+            stream = self.client.chat.completions.create(
+                model=model or self.model,
+                messages=messages,
+                temperature=self.temperature,
+                max_tokens=max_tokens or self.max_tokens,
+                stream=True
+            )
+            with lock:
+                responses.append(stream.response)
+            try:
+                if aborted.is_set():
+                    return
+                for chunk in stream:
+                    if chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+            except Exception:
+                # The read failed because abort() shut the connection; not an upstream failure
+                if not aborted.is_set():
+                    raise
+            finally:
+                # A finished response goes back to the pool; abort() must not touch it
+                with lock:
+                    responses.remove(stream.response)
+                # Releases the connection and stops generation if we stopped reading
+                stream.close()
+
+        def abort():
+            with lock:
+                aborted.set()
+                for response in responses:
+                    abort_response(response)
+
+        return self.transport.retrying_stream(open_stream), abort
+
+    async def astream(self, messages, model=None, max_tokens=None):
+        """Async counterpart of stream() over the async client."""
+        async def open_stream():
+            stream = await self.async_client.chat.completions.create(
+                model=model or self.model,
+                messages=messages,
+                temperature=self.temperature,
+                max_tokens=max_tokens or self.max_tokens,
+                stream=True
+            )
+            try:
+                async for chunk in stream:
+                    if chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+            finally:
+                await stream.close()
+
+        chunks = self.transport.aretrying_stream(open_stream)
+        try:
+            async for chunk in chunks:
+                yield chunk
+        finally:
+            await chunks.aclose()
+
+    def stats(self):
+        return {"provider": self.name, **self.transport.stats()}
+
+
+class LocalProviderError(RuntimeError):
+    """Injected failure from LocalProvider."""
+
+
+class LocalProvider(LLMProvider):
+    """
+    Offline stand-in for load tests and capacity planning.
+
+    Streams a deterministic answer built from the prompt's own words (the
+    same messages always give the same text, so caching behaves as with
+    a real model) after a configurable time-to-first-token and at a
+    configurable token rate. A fraction of requests can be made to fail
+    before or during the stream, or to wait a much longer time for their
+    first token (a latency tail, as seen from a busy upstream).
+    """
+
+    name = "local"
+
+    def __init__(self, model="local", ttft_ms=400, tokens_per_sec=50, tokens=120, error_rate=0.0,
+                 mid_stream_error_rate=0.0, slow_rate=0.0, slow_ttft_ms=None, seed=None):
+        """
+        Initialize the local provider.
+
+        Args:
+            model (str): Model name reported to callers
+            ttft_ms (float): Delay before the first token
+            tokens_per_sec (float): Streaming rate after the first token
+            tokens (int): Tokens per answer
+            error_rate (float): Fraction of requests failing before the first token
+            mid_stream_error_rate (float): Fraction failing halfway through the answer
+            slow_rate (float): Fraction of requests waiting slow_ttft_ms for the first token
+            slow_ttft_ms (float): First-token delay of slow requests (default 10x ttft_ms)
+            seed (int): Seed for error and latency injection, for repeatable runs
+        """
+        super().__init__(model)
+        self.ttft = ttft_ms / 1000
+        self.interval = 1 / tokens_per_sec if tokens_per_sec > 0 else 0.0
+        self.tokens = tokens
+        self.error_rate = error_rate
+        self.mid_stream_error_rate = mid_stream_error_rate
+        self.slow_rate = slow_rate
+        self.slow_ttft = (slow_ttft_ms if slow_ttft_ms is not None else ttft_ms * 10) / 1000
+        self.random = random.Random(seed)
+
+        self.lock = Lock()
+        self.requests = 0
+        self.completed = 0
+        self.cancelled = 0
+        self.errors = 0
+
+    @classmethod
+    def from_env(cls):
+        """Build a provider from LOCAL_LLM_* settings."""
+        seed = os.getenv("LOCAL_LLM_SEED")
+        slow_ttft_ms = os.getenv("LOCAL_LLM_SLOW_TTFT_MS")
+        return cls(
+            model=os.getenv("LOCAL_LLM_MODEL", "local"),
+            ttft_ms=float(os.getenv("LOCAL_LLM_TTFT_MS", "400")),
+            tokens_per_sec=float(os.getenv("LOCAL_LLM_TOKENS_PER_SEC", "50")),
+            tokens=int(os.getenv("LOCAL_LLM_TOKENS", "120")),
+            error_rate=float(os.getenv("LOCAL_LLM_ERROR_RATE", "0")),
+            mid_stream_error_rate=float(os.getenv("LOCAL_LLM_MID_STREAM_ERROR_RATE", "0")),
+            slow_rate=float(os.getenv("LOCAL_LLM_SLOW_RATE", "0")),
+            slow_ttft_ms=float(slow_ttft_ms) if slow_ttft_ms else None,
+            seed=int(seed) if seed else None
+        )
+
+    def _plan(self, messages, model, max_tokens):
+        """Pick this request's tokens, failure point (None for no failure) and first-token delay."""
+        count = min(self.tokens, max_tokens) if max_tokens else self.tokens
+        question = messages[-1]["content"] if messages else ""
+        vocabulary = " ".join(m["content"] for m in messages if m["role"] == "system").split() or ["token"]
+        offset = zlib.crc32(question.encode("utf-8")) % len(vocabulary)
+        words = [f"({model or self.model})"] + [
+            vocabulary[(offset + i) % len(vocabulary)] for i in range(count - 1)
+        ]
+        tokens = [word if i == 0 else " " + word for i, word in enumerate(words)]
+
+        with self.lock:
+            self.requests += 1
+            roll = self.random.random()
+            slow = self.random.random() < self.slow_rate
+        if roll < self.error_rate:
+            fail_at = 0
+        elif roll < self.error_rate + self.mid_stream_error_rate:
+            fail_at = len(tokens) // 2
+        else:
+            fail_at = None
+        return tokens, fail_at, self.slow_ttft if slow else self.ttft
+
+    def _count(self, outcome):
+        with self.lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+
+    def stream(self, messages, model=None, max_tokens=None):
+        return self._stream(messages, model, max_tokens, Event())
+
+    def abortable_stream(self, messages, model=None, max_tokens=None):
+        aborted = Event()
+        return self._stream(messages, model, max_tokens, aborted), aborted.set
+
+    def _stream(self, messages, model, max_tokens, aborted):
+        tokens, fail_at, ttft = self._plan(messages, model, max_tokens)
+        start = time.monotonic()
+        outcome = "cancelled"
+        try:
+            for i, token in enumerate(tokens):
+                # Absolute schedule, so slow consumers do not stretch the answer
+                delay = start + ttft + i * self.interval - time.monotonic()
+                if aborted.wait(delay) if delay > 0 else aborted.is_set():
+                    return
+                if i == fail_at:
+                    outcome = "errors"
+                    raise LocalProviderError("injected local provider error")
+                yield token
+            outcome = "completed"
+        finally:
+            self._count(outcome)
+
+    async def astream(self, messages, model=None, max_tokens=None):
+        tokens, fail_at, ttft = self._plan(messages, model, max_tokens)
+        start = time.monotonic()
+        outcome = "cancelled"
+        try:
+            for i, token in enumerate(tokens):
+                delay = start + ttft + i * self.interval - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                if i == fail_at:
+                    outcome = "errors"
+                    raise LocalProviderError("injected local provider error")
+                yield token
+            outcome = "completed"
+        finally:
+            self._count(outcome)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "provider": self.name,
+                "requests": self.requests,
+                "completed": self.completed,
+                "cancelled": self.cancelled,
+                "errors": self.errors,
+            }
+
+
+PROVIDERS = {
+    OpenAIProvider.name: OpenAIProvider,
+    LocalProvider.name: LocalProvider,
+}
+
+
+def provider_from_env():
+    """
+    Build the provider named by LLM_PROVIDER (openai or local), hedged
+    if HEDGE_TTFT_MS is set.
+
+    Returns:
+        LLMProvider: Configured provider
+
+    Raises:
+        ValueError: For an unknown provider name
+    """
+    from app.rag.hedging import HedgingProvider
+
+    name = os.getenv("LLM_PROVIDER", "openai").lower()
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown LLM_PROVIDER {name!r}; expected one of {', '.join(PROVIDERS)}")
+    # HEDGE_TTFT_MS > 0 races a second request against slow first tokens
+    return HedgingProvider.wrap_from_env(PROVIDERS[name].from_env())
@@ -0,0 +1,335 @@
+"""
+Replay buffer for resumable chat streams.
+
+Every frame of a chat answer carries an SSE event id, "<turn id>:<offset>".
+The offset counts the answer characters sent so far. A client whose
+connection dropped sends its request again with Last-Event-ID set to the
+last id it received. The answer then continues from that offset instead
+of being generated again:
+
+- while the model is still streaming, the reconnect subscribes to the
+  turn's Flight (app/rag/single_flight.py), whose buffer already holds
+  everything generated so far;
+- once the answer is complete, it is replayed from that buffer.
+
+A model answer is only buffered while it streams when
+REPLAY_LINGER_SECONDS is set: the stream then runs as a Flight on its own
+producer thread (or event loop task) and keeps running for that long
+after its client disconnected, so a reconnect can pick it up. By default
+(0) it streams directly and is closed as soon as the client goes away,
+and it can only be replayed once it has been recorded. Entries are kept
+for REPLAY_TTL_SECONDS, up to REPLAY_MAX_ENTRIES, in process memory. A
+reconnect that lands on another worker gets a 410 and the client asks
+again.
+
+Each turn is recorded to history and the caches exactly once. Normally
+the connection that streams the end of the answer records it. If every
+client is gone when the model finishes, the turn is recorded when the
+flight finishes instead.
+"""
+import os
+import secrets
+import time
+from collections import OrderedDict
+from threading import Lock, Thread
+
+from app.rag.metrics import REPLAY_RESUMES
+from app.rag.single_flight import Subscription
+
+# Who records the turn: a connection streaming it, nobody yet, or done
+ATTACHED, DETACHED, SETTLED = "attached", "detached", "settled"
+
+
+def parse_event_id(value):
+    """
+    Split a Last-Event-ID value.
+
+    Args:
+        value (str): "<turn id>:<offset>"
+
+    Returns:
+        tuple: (turn_id, offset), or None if the value is malformed
+    """
+    turn_id, _, offset = (value or "").strip().rpartition(":")
+    if not turn_id or not offset.isdigit():
+        return None
+    return turn_id, int(offset)
+
+
+def _split(chunks, offset):
+    """
+    Find where offset falls in a chunk list.
+
+    Returns:
+        tuple: (index of the first chunk after the split, prefix chunks,
+            rest of the split chunk), or None if offset is past the end
+    """
+    seen = 0
+    for index, chunk in enumerate(chunks):
+        if seen + len(chunk) > offset:
+            cut = offset - seen
+            return index + 1, list(chunks[:index]) + ([chunk[:cut]] if cut else []), chunk[cut:]
+        seen += len(chunk)
+    if seen == offset:
+        return len(chunks), list(chunks), ""
+    return None
+
+
+class Resumption:
+    """
+    A reconnect positioned at an offset in a buffered answer.
+
+    prefix holds the chunks the client already has (needed to record the
+    whole answer); stream()/astream() yield the rest. owner says whether
+    this connection now records the turn.
+    """
+
+    def __init__(self, entry, owner, prefix, tail, rest, subscription=None):
+        self.entry = entry
+        self.turn = entry.turn
+        self.owner = owner
+        self.offset = sum(len(chunk) for chunk in prefix)
+        self.prefix = prefix
+        self.tail = tail
+        self.rest = rest
+        self.subscription = subscription
+
+    def stream(self):
+        """
+        Get the rest of the answer.
+
+        Yields:
+            str: Chunks from the offset on
+        """
+        try:
+            if self.tail:
+                yield self.tail
+            yield from (self.subscription if self.subscription is not None else self.rest)
+        finally:
+            if self.subscription is not None:
+                self.subscription.close()
+
+    async def astream(self):
+        """Async counterpart of stream()."""
+        try:
+            if self.tail:
+                yield self.tail
+            if self.subscription is not None:
+                async for chunk in self.subscription:
+                    yield chunk
+            else:
+                for chunk in self.rest:
+                    yield chunk
+        finally:
+            if self.subscription is not None:
+                self.subscription.close()
+
+
+class ReplayEntry:
+    """
+    One turn's answer kept for reconnects: a model stream's Flight, or
+    the chunks of a fast-path answer or of a recorded model answer.
+    """
+
+    def __init__(self, turn_id, turn, flight=None, chunks=None, expires_at=None):
+        """
+        Args:
+            turn_id (str): Random id used in the turn's event ids
+            turn (ChatTurn): The turn; must provide session_id and finish_detached()
+            flight (Flight): Flight the model answer streams into
+            chunks (tuple): Complete answer of a fast-path turn; None until
+                settle() provides it for a model answer without a flight
+            expires_at (float): Monotonic expiry time
+        """
+        self.turn_id = turn_id
+        self.turn = turn
+        self.flight = flight
+        self.chunks = chunks
+        self.expires_at = expires_at
+        self.state = ATTACHED
+        self.lock = Lock()
+        if flight is not None:
+            flight.add_done_callback(self._flight_done)
+
+    def detach(self):
+        """
+        Hand the turn over to its flight when the client disconnects.
+
+        Returns:
+            bool: True if the model keeps streaming for a reconnect, in
+                which case the caller must not record or abort the turn
+        """
+        flight = self.flight
+        with self.lock:
+            if self.state != ATTACHED or flight is None or flight.done or flight.cancelled:
+                return False
+            self.state = DETACHED
+            return True
+
+    def settle(self, chunks=None):
+        """
+        Note that the turn has been recorded or aborted.
+
+        Args:
+            chunks (list): The recorded answer; kept for replay when the
+                model answer had no flight to replay it from
+        """
+        with self.lock:
+            self.state = SETTLED
+            if chunks is not None and self.flight is None and self.chunks is None:
+                self.chunks = tuple(chunks)
+
+    def _flight_done(self, flight):
+        with self.lock:
+            if self.state != DETACHED:
+                return
+            self.state = SETTLED
+        # Runs on the producer's thread or event loop; recording touches the session store
+        Thread(target=self.turn.finish_detached, name="replay-settle", daemon=True).start()
+
+    def resume(self, offset):
+        """
+        Position a reconnect at offset.
+
+        Args:
+            offset (int): Answer characters the client already has
+
+        Returns:
+            Resumption: The rest of the answer, or None if the model stream
+                was cancelled or not recorded yet, or offset is past what was sent
+        """
+        flight = self.flight
+        if flight is None:
+            chunks = self.chunks
+            split = _split(chunks, offset) if chunks is not None else None
+            if split is None:
+                return None
+            index, prefix, tail = split
+            return Resumption(self, False, prefix, tail, iter(chunks[index:]))
+
+        if not flight.attach():
+            return None
+        subscription = Subscription(flight, leader=False)
+        with flight.cond:
+            split = _split(flight.chunks, offset)
+            if split is not None:
+                subscription.position = split[0]
+        if split is None:
+            subscription.close()
+            return None
+
+        with self.lock:
+            owner = self.state == DETACHED
+            if owner:
+                self.state = ATTACHED
+        return Resumption(self, owner, split[1], split[2], None, subscription)
+
+
+class ReplayBuffer:
+    """Bounded LRU + TTL map of (session_id, turn_id) -> ReplayEntry."""
+
+    def __init__(self, max_entries=512, ttl_seconds=120, linger_seconds=0):
+        """
+        Initialize the buffer.
+
+        Args:
+            max_entries (int): Turns kept; 0 disables resuming
+            ttl_seconds (float): Seconds a turn can be resumed; 0 disables resuming
+            linger_seconds (float): Seconds a model stream keeps running for a
+                reconnect after its client disconnected; 0 streams model
+                answers directly and closes them with their client
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self.linger = linger_seconds if self.enabled else 0.0
+        self.entries = OrderedDict()
+        self.lock = Lock()
+        self.counts = {"attached": 0, "replayed": 0, "gone": 0}
+
+    @classmethod
+    def from_env(cls):
+        """Build a buffer from REPLAY_MAX_ENTRIES, REPLAY_TTL_SECONDS and REPLAY_LINGER_SECONDS."""
+        return cls(
+            max_entries=int(os.getenv("REPLAY_MAX_ENTRIES", "512")),
+            ttl_seconds=float(os.getenv("REPLAY_TTL_SECONDS", "120")),
+            linger_seconds=float(os.getenv("REPLAY_LINGER_SECONDS", "0")),
+        )
+
+    @property
+    def enabled(self):
+        return bool(self.max_entries and self.ttl)
+
+    def open(self, turn, flight=None, chunks=None):
+        """
+        Keep a turn's answer for reconnects.
+
+        Args:
+            turn (ChatTurn): The turn being streamed
+            flight (Flight): Flight the model answer streams into
+            chunks (tuple): Complete answer of a fast-path turn
+
+        Returns:
+            ReplayEntry: The entry (its turn_id goes into event ids), or None if disabled
+        """
+        if not self.enabled:
+            return None
+        now = time.monotonic()
+        entry = ReplayEntry(secrets.token_urlsafe(9), turn, flight, chunks, now + self.ttl)
+        with self.lock:
+            self.entries[(turn.session_id, entry.turn_id)] = entry
+            while self.entries:
+                key, oldest = next(iter(self.entries.items()))
+                if len(self.entries) <= self.max_entries and oldest.expires_at > now:
+                    break
+                del self.entries[key]
+        return entry
+
+    def resume(self, session_id, last_event_id):
+        """
+        Continue a turn after a reconnect.
+
+        Args:
+            session_id (str): Session the turn belongs to
+            last_event_id (str): Last-Event-ID header value
+
+        Returns:
+            Resumption: The rest of the answer, or None if it cannot be resumed
+        """
+        parsed = parse_event_id(last_event_id)
+        entry = None
+        if parsed is not None and session_id:
+            key = (session_id, parsed[0])
+            now = time.monotonic()
+            with self.lock:
+                entry = self.entries.get(key)
+                if entry is not None and entry.expires_at <= now:
+                    del self.entries[key]
+                    entry = None
+                if entry is not None:
+                    entry.expires_at = now + self.ttl
+                    self.entries.move_to_end(key)
+        resumption = entry.resume(parsed[1]) if entry is not None else None
+
+        if resumption is None:
+            outcome = "gone"
+        elif resumption.subscription is not None and not resumption.subscription.flight.done:
+            outcome = "attached"
+        else:
+            outcome = "replayed"
+        with self.lock:
+            self.counts[outcome] += 1
+        REPLAY_RESUMES.inc(labels=(outcome,))
+        return resumption
+
+    def __len__(self):
+        return len(self.entries)
+
+    def stats(self):
+        """
+        Get replay counters.
+
+        Returns:
+            dict: Kept turns and reconnects by outcome
+        """
+        with self.lock:
+            return {"entries": len(self.entries), "linger_seconds": self.linger, **self.counts}
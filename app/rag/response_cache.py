@@ -0,0 +1,115 @@
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from threading import Lock
+
+from app.rag.text_utils import normalize_text
+
+
+class ResponseCache:
+    """
+    Bounded LRU + TTL cache of complete chat answers.
+
+    Keys cover the normalized user message plus a hash of everything else
+    the model sees (system prompt and trimmed history), so a changed
+    knowledge base or a different conversation never hits a stale answer.
+    """
+
+    def __init__(self, max_entries=512, ttl_seconds=3600):
+        """
+        Initialize the cache.
+
+        Args:
+            max_entries (int): Maximum cached answers; 0 disables the cache
+            ttl_seconds (int): Seconds before an answer expires
+        """
+        self.entries = OrderedDict()  # {key: (expires_at, chunks)}
+        self.lock = Lock()
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(messages, tier=""):
+        """
+        Build a cache key for a message list.
+
+        Args:
+            messages (list): Messages from PortfolioChatbot.build_messages()
+            tier (str): Model tier the answer comes from, so retuned
+                tiers never replay another model's answer
+
+        Returns:
+            str: Hex digest key
+        """
+        context = hashlib.sha256(
+            json.dumps(messages[:-1], sort_keys=True).encode("utf-8")
+        ).hexdigest()
+        question = normalize_text(messages[-1]["content"])
+        return hashlib.sha256(f"{context}\0{tier}\0{question}".encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """
+        Look up a cached answer.
+
+        Args:
+            key (str): Key from make_key()
+
+        Returns:
+            tuple: Cached answer chunks, or None on a miss
+        """
+        if not self.max_entries:
+            return None
+
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self.entries[key]
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, chunks):
+        """
+        Store an answer as the list of chunks it was streamed in.
+
+        Args:
+            key (str): Key from make_key()
+            chunks (list): Streamed answer chunks
+        """
+        if not self.max_entries:
+            return
+
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, tuple(chunks))
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self):
+        """Drop every cached answer, e.g. after the knowledge base changes."""
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        """
+        Get cache counters.
+
+        Returns:
+            dict: Size, hits, misses and evictions
+        """
+        with self.lock:
+            return {
+                "size": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
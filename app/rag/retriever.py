@@ -0,0 +1,172 @@
+import math
+from collections import Counter, defaultdict
+
+from app.rag.text_utils import strip_rule, tokenize
+
+
+class KnowledgeSection:
+    """A single heading-delimited chunk of the knowledge base."""
+
+    __slots__ = ("index", "parent", "title", "body", "tokens")
+
+    def __init__(self, index, parent, title, body):
+        self.index = index
+        self.parent = parent
+        self.title = title
+        self.body = body
+        # Heading words are repeated so they weigh more than body words
+        self.tokens = tokenize(f"{parent} {title} {title} {body}")
+
+    def render(self):
+        """Render the section back to markdown for the system prompt."""
+        if self.title == self.parent:
+            return f"## {self.title}\n{self.body}".rstrip()
+        return f"## {self.parent}\n### {self.title}\n{self.body}".rstrip()
+
+
+def split_sections(knowledge):
+    """
+    Split the knowledge base on its ## / ### headings.
+
+    Args:
+        knowledge (str): Markdown knowledge base text
+
+    Returns:
+        list: KnowledgeSection objects in document order
+    """
+    sections = []
+    parent = None
+    title = None
+    lines = []
+
+    def flush():
+        body = strip_rule("\n".join(lines))
+        if title and body:
+            sections.append(KnowledgeSection(len(sections), parent, title, body))
+
+    for line in knowledge.splitlines():
+        if line.startswith("## "):
+            flush()
+            parent = title = line[3:].strip()
+            lines = []
+        elif line.startswith("### ") and parent:
+            flush()
+            title = line[4:].strip()
+            lines = []
+        elif title:
+            lines.append(line)
+    flush()
+
+    return sections
+
+
+class KnowledgeRetriever:
+    """
+    BM25 retrieval over knowledge base sections.
+    The inverted index is built once; queries only touch the postings
+    of their own terms.
+    """
+
+    # Sent on every turn: who Vetrivel is, where things are, and how to answer
+    CORE_SECTIONS = ("PERSONAL INFORMATION", "NAVIGATION LINKS", "CONVERSATION GUIDELINES FOR AI ASSISTANT")
+    FALLBACK_SECTIONS = ("PROFESSIONAL IDENTITY & EXPERTISE",)
+
+    def __init__(self, knowledge, k1=1.5, b=0.75):
+        """
+        Build the section index.
+
+        Args:
+            knowledge (str): Markdown knowledge base text
+            k1 (float): BM25 term-frequency saturation
+            b (float): BM25 length normalization
+        """
+        self.k1 = k1
+        self.b = b
+        self.sections = split_sections(knowledge)
+        self.core = [s for s in self.sections if s.parent in self.CORE_SECTIONS]
+        self.fallback = [s for s in self.sections if s.parent in self.FALLBACK_SECTIONS]
+
+        self.postings = defaultdict(list)  # {term: [(section_index, tf), ...]}
+        self.doc_lengths = []
+        for section in self.sections:
+            self.doc_lengths.append(len(section.tokens))
+            for term, tf in Counter(section.tokens).items():
+                self.postings[term].append((section.index, tf))
+
+        n_docs = len(self.sections) or 1
+        self.avg_length = (sum(self.doc_lengths) / n_docs) or 1.0
+        self.idf = {
+            term: math.log(1 + (n_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in self.postings.items()
+        }
+
+    def score(self, query):
+        """
+        Score every section that shares a term with the query.
+
+        Args:
+            query (str): Free-text query
+
+        Returns:
+            dict: {section_index: bm25_score}
+        """
+        scores = defaultdict(float)
+        k1, b, avg_length = self.k1, self.b, self.avg_length
+
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for index, tf in self.postings[term]:
+                norm = k1 * (1 - b + b * self.doc_lengths[index] / avg_length)
+                scores[index] += idf * tf * (k1 + 1) / (tf + norm)
+
+        return scores
+
+    def search(self, query, top_k=4):
+        """
+        Get the most relevant non-core sections for a query.
+
+        Args:
+            query (str): Free-text query
+            top_k (int): Maximum number of sections to return
+
+        Returns:
+            list: (KnowledgeSection, score) tuples, best first
+        """
+        core = {s.index for s in self.core}
+        scores = self.score(query)
+        ranked = sorted(
+            ((i, s) for i, s in scores.items() if i not in core),
+            key=lambda item: item[1],
+            reverse=True,
+        )
+        return [(self.sections[i], s) for i, s in ranked[:top_k]]
+
+    def build_context(self, query, top_k=4):
+        """
+        Build the knowledge text for a query: core sections plus the
+        top-k matches, kept in document order.
+
+        Args:
+            query (str): Free-text query
+            top_k (int): Maximum number of retrieved sections
+
+        Returns:
+            str: Markdown knowledge text
+        """
+        return self.render_context(self.search(query, top_k))
+
+    def render_context(self, hits):
+        """
+        Build the knowledge text for hits already found by search().
+
+        Args:
+            hits (list): (KnowledgeSection, score) tuples
+
+        Returns:
+            str: Markdown knowledge text
+        """
+        sections = [section for section, _ in hits]
+        selected = {s.index: s for s in self.core + (sections or self.fallback)}
+        return "\n\n".join(selected[i].render() for i in sorted(selected))
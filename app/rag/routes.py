@@ -1,68 +1,552 @@
 from flask import Blueprint, request, jsonify, Response, stream_with_context
+from app.monitoring.access import monitoring_only
+from app.rag.admission import AdmissionController, Rejected, client_ip
 from app.rag.chatbot import PortfolioChatbot
+from app.rag.faq_index import FaqIndex
+from app.rag.intent_router import NavigationRouter
+from app.rag.metrics import (
+    ACTIVE_SESSIONS, ADMISSION_QUEUE_DEPTH, ANSWERS, CACHE_LOOKUPS, IN_FLIGHT, REPLAY_ENTRIES, SSE_FRAMES,
+    STREAM_CHUNKS, STREAM_DURATION, STREAMS, TTFT, UPSTREAM_STREAMS_ACTIVE
+)
+from app.rag.profiling import profiler
+from app.rag.replay import ReplayBuffer
+from app.rag.response_cache import ResponseCache
+from app.rag.semantic_cache import SemanticCache, context_key
 from app.rag.session_manager import SessionManager
-import json
+from app.rag.session_store import SQLiteSessionStore
+from app.rag.single_flight import SingleFlight, start_flight
+from app.rag.sse import FrameCoalescer, sse_frame
+from app.rag.tracing import TRACE_HEADER, tracer
+import os
+import time
 
 rag_bp = Blueprint("rag", __name__, url_prefix="/api")
 
-# Initialize chatbot and session manager
+# Initialize chatbot, session manager and the answer fast paths
 chatbot = PortfolioChatbot()
-session_manager = SessionManager()
+# Per-session ring buffer and global caps keep memory flat under session floods
+session_limits = {
+    "max_messages": int(os.getenv("SESSION_MAX_MESSAGES", "20")) or None,
+    "max_sessions": int(os.getenv("SESSION_MAX_SESSIONS", "10000")) or None,
+}
 
-@rag_bp.route("/chat", methods=["POST"])
-def chat():
+# SESSION_BACKEND=sqlite shares sessions between all workers on the host
+session_store = None
+if os.getenv("SESSION_BACKEND", "memory").lower() == "sqlite":
+    session_store = SQLiteSessionStore(os.getenv("SESSION_DB_PATH", "sessions.db"), **session_limits)
+session_manager = SessionManager(
+    reaper_interval_seconds=float(os.getenv("SESSION_REAPER_SECONDS", "0")) or None,
+    max_bytes=int(os.getenv("SESSION_MAX_BYTES", str(64 * 1024 * 1024))) or None,
+    store=session_store,
+    **session_limits
+)
+ACTIVE_SESSIONS.set_function(session_manager.get_active_session_count)
+response_cache = ResponseCache(
+    max_entries=int(os.getenv("RAG_CACHE_SIZE", "512")),
+    ttl_seconds=int(os.getenv("RAG_CACHE_TTL_SECONDS", "3600"))
+)
+semantic_cache = SemanticCache(
+    max_entries=int(os.getenv("RAG_SEMANTIC_CACHE_SIZE", "2048")),
+    threshold=float(os.getenv("RAG_SEMANTIC_CACHE_THRESHOLD", "0.9")),
+    ttl_seconds=int(os.getenv("RAG_SEMANTIC_CACHE_TTL_SECONDS", os.getenv("RAG_CACHE_TTL_SECONDS", "3600")))
+)
+navigation_router = NavigationRouter()
+# Recent answers by session and turn, so a dropped stream can be resumed
+replay_buffer = ReplayBuffer.from_env()
+REPLAY_ENTRIES.set_function(lambda: len(replay_buffer))
+# Identical concurrent opening questions share one upstream stream
+single_flight = SingleFlight(replay_buffer.linger) if os.getenv("RAG_SINGLE_FLIGHT", "1") != "0" else None
+faq_index = FaqIndex(threshold=float(os.getenv("RAG_FAQ_THRESHOLD", "0.6")))
+# Per-client rate limits and the cap on concurrent upstream streams
+admission = AdmissionController.from_env()
+UPSTREAM_STREAMS_ACTIVE.set_function(admission.active_streams)
+ADMISSION_QUEUE_DEPTH.set_function(admission.queue_depth)
+# Proxies in front of the app whose X-Forwarded-For entries can be trusted
+TRUSTED_PROXIES = int(os.getenv("ADMISSION_TRUSTED_PROXIES", "0"))
+
+# Answer paths (rag_answers_total); everything but "llm" skipped OpenAI
+ANSWER_SOURCES = ("navigation", "faq", "response_cache", "semantic_cache", "single_flight", "llm")
+
+# How a stream can end (rag_streams_total); "aborted" means the client left mid-answer
+STREAM_OUTCOMES = ("completed", "failed", "aborted")
+
+# What to do with a partial answer when the client disconnects:
+# "discard" drops the turn, "record" saves what was streamed so far
+ABORTED_POLICY = os.getenv("RAG_ABORTED_POLICY", "discard").lower()
+
+
+SSE_HEADERS = {
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no"
+}
+
+# Sent by a client reconnecting to a dropped answer stream
+LAST_EVENT_ID_HEADER = "Last-Event-ID"
+GONE_MESSAGE = "This answer can no longer be resumed"
+
+
+def parse_chat_request(data):
     """
-    Handle chat requests with streaming support.
-    Expected JSON: {"message": "user question", "session_id": "optional_session_id"}
+    Validate a chat request body.
+    
+    Args:
+        data (dict): Parsed JSON body
+    
+    Returns:
+        tuple: (user_message, session_id or None)
+    
+    Raises:
+        ValueError: With the client-facing message if the body is invalid
     """
-    try:
-        data = request.get_json()
-        
-        if not data or "message" not in data:
-            return jsonify({"error": "Message is required"}), 400
+    if not data or "message" not in data:
+        raise ValueError("Message is required")
+    
+    user_message = data["message"].strip()
+    if not user_message:
+        raise ValueError("Message cannot be empty")
+    
+    return user_message, data.get("session_id")
+
+
+class ChatTurn:
+    """
+    Everything decided about one chat request before streaming starts:
+    the session, its history, and whether a fast path already has the
+    answer or the model has to generate it.
+    
+    A turn that needs a new upstream stream (needs_upstream) does not
+    open it: the caller first takes an admission slot, then calls
+    open_upstream().
+    
+    With the replay buffer on, model answers always stream through a
+    Flight, so a disconnected client can reconnect and continue the
+    answer (see app/rag/replay.py).
+    """
+    
+    def __init__(self, user_message, session_id=None, loop=None):
+        """
+        Resolve the session and pick the answer source.
         
-        user_message = data["message"].strip()
-        if not user_message:
-            return jsonify({"error": "Message cannot be empty"}), 400
+        Args:
+            user_message (str): The user's message
+            session_id (str): Existing session ID, or None to create one
+            loop (asyncio.AbstractEventLoop): Event loop a shared upstream
+                stream should run on (ASGI path); None runs it on a thread
+        """
+        self.started = time.perf_counter()
+        self.first_chunk_at = None
         
         # Get or create session
-        session_id = data.get("session_id")
         if not session_id:
             session_id = session_manager.create_session()
         
-        # Get conversation history
-        history = session_manager.get_history(session_id)
+        self.user_message = user_message
+        self.session_id = session_id
+        self.history = session_manager.get_history(session_id)
+        self.first_turn = not self.history
+        self.messages = None
+        self.route = None
+        self.cache_key = None
+        self.semantic_context = None
+        self.ready_chunks = None
+        self.flight = None
+        self.slot = None
+        self.replay = None
+        self.loop = loop
+        self.finished = False
+        
+        with tracer.span("chat.resolve", first_turn=self.first_turn) as span:
+            self.answer_source = self._resolve()
+            span.set(answer_source=self.answer_source)
+        self.needs_upstream = self.answer_source == "llm"
+        # Model answers are counted once admitted, in open_upstream()
+        if not self.needs_upstream:
+            ANSWERS.inc(labels=(self.answer_source,))
+    
+    def _resolve(self):
+        """Try the fast paths in order; returns the answer source name."""
+        # Navigation requests are answered with a fixed link, no model call
+        navigation_reply = navigation_router.route(self.user_message)
+        if navigation_reply is not None:
+            self.ready_chunks = (navigation_reply,)
+            return "navigation"
+        
+        # Opening questions that match a canonical FAQ entry
+        if self.first_turn:
+            faq_answer = faq_index.match(self.user_message)
+            if faq_answer is not None:
+                self.ready_chunks = (faq_answer,)
+                return "faq"
+        
+        # Identical questions in the same context replay a cached answer
+        with tracer.span("prompt.build", history=len(self.history)) as span:
+            self.messages, self.route = chatbot.build_request(self.user_message, self.history)
+            span.set(tier=self.route.tier, complexity=self.route.score)
+        self.cache_key = response_cache.make_key(self.messages, self.route.tier)
+        self.ready_chunks = response_cache.get(self.cache_key)
+        CACHE_LOOKUPS.inc(labels=("response", "miss" if self.ready_chunks is None else "hit"))
+        if self.ready_chunks is not None:
+            return "response_cache"
         
-        # Generate streaming response
-        def generate():
-            full_response = ""
+        # Paraphrased opening questions are served from the semantic cache
+        if self.first_turn:
+            self.semantic_context = context_key(chatbot.system_prompt, self.route.tier)
+            self.ready_chunks = semantic_cache.get(self.user_message, self.semantic_context)
+            CACHE_LOOKUPS.inc(labels=("semantic", "miss" if self.ready_chunks is None else "hit"))
+            if self.ready_chunks is not None:
+                return "semantic_cache"
             
-            try:
-                for chunk in chatbot.chat_stream(user_message, history):
-                    full_response += chunk
-                    # Send SSE format
-                    yield f"data: {json.dumps({'chunk': chunk, 'session_id': session_id})}\n\n"
-                
-                # Save to history after complete
-                session_manager.add_message(session_id, "user", user_message)
-                session_manager.add_message(session_id, "assistant", full_response)
-                
-                # Send completion signal
-                yield f"data: {json.dumps({'done': True, 'session_id': session_id})}\n\n"
-                
-            except Exception as e:
-                error_msg = f"Error generating response: {str(e)}"
-                yield f"data: {json.dumps({'error': error_msg})}\n\n"
-        
-        return Response(
-            stream_with_context(generate()),
-            mimetype="text/event-stream",
-            headers={
-                "Cache-Control": "no-cache",
-                "X-Accel-Buffering": "no"
-            }
-        )
+            # Same opening question already streaming: attach to that stream
+            if single_flight is not None:
+                self.flight = single_flight.join(self.cache_key)
+                if self.flight is not None:
+                    return "single_flight"
+        
+        return "llm"
+    
+    def open_upstream(self, slot):
+        """
+        Start the model stream for this turn once admitted.
+        
+        Args:
+            slot (Slot): Admission slot, released when the stream ends
+        """
+        self.needs_upstream = False
+        open_stream = lambda: slot.hold(chatbot.stream_messages(self.messages, self.route))
+        open_astream = lambda: slot.ahold(chatbot.astream_messages(self.messages, self.route))
+        if self.first_turn and single_flight is not None:
+            # Shared with identical opening questions that arrive meanwhile
+            self.flight = single_flight.subscribe(self.cache_key, open_stream, open_astream, self.loop)
+            if not self.flight.leader:
+                # Someone else started the same stream while we were queued
+                slot.release()
+                self.answer_source = "single_flight"
+        elif replay_buffer.linger > 0:
+            # Buffered, and kept running for a while if the client drops
+            self.flight = start_flight(open_stream, open_astream, self.loop, replay_buffer.linger)
+        else:
+            self.slot = slot
+        ANSWERS.inc(labels=(self.answer_source,))
+    
+    @property
+    def needs_model(self):
+        return self.ready_chunks is None
+    
+    def stream(self):
+        """
+        Get this turn's answer chunks.
+        
+        Returns:
+            iterator: Fast-path chunks, a shared flight, or a new model stream
+        """
+        if not self.needs_model:
+            return iter(self.ready_chunks)
+        if self.flight is not None:
+            return self.flight
+        return self.slot.hold(chatbot.stream_messages(self.messages, self.route))
+    
+    def astream(self):
+        """
+        Async counterpart of stream() for model answers.
+        
+        Returns:
+            async iterator: A shared flight or a new model stream
+        """
+        if self.flight is not None:
+            return self.flight
+        return self.slot.ahold(chatbot.astream_messages(self.messages, self.route))
+    
+    def open_replay(self):
+        """
+        Keep this turn's answer for reconnects.
+        
+        Returns:
+            str: Event id prefix for the turn's frames, or None if resuming is off
+        """
+        flight = self.flight.flight if self.flight is not None else None
+        self.replay = replay_buffer.open(self, flight, self.ready_chunks)
+        return self.replay.turn_id if self.replay is not None else None
+    
+    def release(self):
+        """Give back the admission slot if the stream never got to release it."""
+        if self.slot is not None:
+            self.slot.release()
+    
+    def mark_chunk(self):
+        """Note that a chunk is about to be sent; the first one sets TTFT."""
+        if self.first_chunk_at is None:
+            self.first_chunk_at = time.perf_counter()
+            TTFT.observe(self.first_chunk_at - self.started, (self.answer_source,))
+    
+    def _observe_end(self, outcome, chunks):
+        STREAMS.inc(labels=(outcome,))
+        STREAM_CHUNKS.inc(len(chunks), (self.answer_source,))
+        STREAM_DURATION.observe(time.perf_counter() - self.started, (self.answer_source,))
+    
+    def record(self, chunks, failed=False):
+        """
+        Cache a freshly generated answer and save the exchange to history.
+        
+        Args:
+            chunks (list): Streamed answer chunks
+            failed (bool): Whether generation failed (never cached)
+        """
+        self.finished = True
+        self._observe_end("failed" if failed else "completed", chunks)
+        
+        if self.needs_model and not failed:
+            response_cache.set(self.cache_key, chunks)
+            if self.first_turn:
+                semantic_cache.set(self.user_message, chunks, self.semantic_context)
+        
+        # Save to history after complete
+        self._save(chunks)
+        if self.replay is not None:
+            self.replay.settle(chunks)
+    
+    def abort(self, chunks):
+        """
+        Handle a client that disconnected before the answer finished.
+        The partial answer is never cached; RAG_ABORTED_POLICY decides
+        whether it is saved to history. A model answer that can still be
+        resumed is left to its flight instead (see finish_detached()).
+        
+        Args:
+            chunks (list): Chunks streamed before the disconnect
+        """
+        if self.finished:
+            return
+        if self.replay is not None and self.replay.detach():
+            return
+        self.finished = True
+        self._observe_end("aborted", chunks)
+        if self.replay is not None:
+            self.replay.settle()
+        
+        if ABORTED_POLICY == "record" and chunks:
+            self._save(chunks)
+    
+    def finish_detached(self):
+        """
+        Record a model answer that finished with no client attached:
+        the full answer if the flight completed, else per abort().
+        """
+        flight = self.flight.flight
+        chunks = list(flight.chunks)
+        if flight.cancelled:
+            self.abort(chunks)
+        elif flight.error is not None:
+            self.record(chunks + [chatbot.error_reply(flight.error)], failed=True)
+        else:
+            self.record(chunks)
+    
+    def _save(self, chunks):
+        session_manager.add_messages(self.session_id, [
+            {"role": "user", "content": self.user_message},
+            {"role": "assistant", "content": "".join(chunks)}
+        ])
+
+
+def _generate(turn, root, open_source, frames, chunks=None, owner=True):
+    """
+    Write one answer as SSE frames.
+    
+    Args:
+        turn (ChatTurn): The turn being answered
+        root (Span): The request's root span
+        open_source (callable): Returns the answer chunk iterator
+        frames (FrameCoalescer): Frame builder, carrying the event ids
+        chunks (list): Chunks the client already has, when resuming
+        owner (bool): Whether this connection records the turn
     
+    Yields:
+        str: SSE frames
+    """
+    chunks = chunks if chunks is not None else []
+    failed = False
+    source = None
+    writing = tracer.start_span("sse.write_loop", root)
+    IN_FLIGHT.inc()
+    
+    try:
+        # The session ID goes out once, ahead of the answer
+        yield sse_frame({"session_id": turn.session_id}, frames.event_id())
+        
+        with tracer.activate(root):
+            source = open_source()
+        
+        try:
+            for chunk in source:
+                chunks.append(chunk)
+                turn.mark_chunk()
+                # Deltas are coalesced into fewer, larger SSE frames
+                frame = frames.push(chunk)
+                if frame is not None:
+                    yield frame
+        except Exception as e:
+            failed = True
+            chunk = chatbot.error_reply(e)
+            chunks.append(chunk)
+            turn.mark_chunk()
+            frames.push(chunk)
+        
+        frame = frames.flush()
+        if frame is not None:
+            yield frame
+        
+        if owner:
+            with tracer.activate(root):
+                turn.record(chunks, failed)
+        
+        # Send completion signal
+        yield sse_frame({"done": True})
+        
+    except GeneratorExit:
+        # The server closes the response when a write to the client
+        # fails; stop here instead of draining the rest of the answer
+        if owner:
+            with tracer.activate(root):
+                turn.abort(chunks)
+        raise
+        
+    except Exception as e:
+        error_msg = f"Error generating response: {str(e)}"
+        yield sse_frame({"error": error_msg})
+    
+    finally:
+        # Closes the upstream completion if it is still streaming
+        if hasattr(source, "close"):
+            source.close()
+        turn.release()
+        IN_FLIGHT.dec()
+        SSE_FRAMES.inc(frames.frames)
+        writing.set(frames=frames.frames, chunks=len(chunks), failed=failed)
+        tracer.end(writing)
+        tracer.end(root)
+
+
+def _sse_response(frames, trace_headers):
+    return Response(
+        stream_with_context(frames),
+        mimetype="text/event-stream",
+        headers={**SSE_HEADERS, **trace_headers}
+    )
+
+
+@rag_bp.route("/chat", methods=["POST"])
+def chat():
+    """
+    Handle chat requests with streaming support.
+    Expected JSON: {"message": "user question", "session_id": "optional_session_id"}
+    
+    A request with a Last-Event-ID header and the session_id continues
+    a dropped answer stream from that event instead.
+    """
+    # Every response carries the trace id, recorded or not, for bug reports
+    trace_id = tracer.new_trace_id(request.headers.get(TRACE_HEADER))
+    trace_headers = {TRACE_HEADER: trace_id}
+    root = tracer.start_trace("chat.request", trace_id, server="wsgi")
+    
+    try:
+        ip = client_ip(request.remote_addr, request.headers.get("X-Forwarded-For"), TRUSTED_PROXIES)
+        last_event_id = request.headers.get(LAST_EVENT_ID_HEADER)
+        if last_event_id:
+            return resume_chat(request.get_json(silent=True) or {}, last_event_id, ip, root, trace_headers)
+        
+        try:
+            user_message, session_id = parse_chat_request(request.get_json())
+        except ValueError as e:
+            tracer.end(root, e)
+            return jsonify({"error": str(e)}), 400, trace_headers
+        
+        # Admission is decided before the response starts, so a shed
+        # request gets a real status code instead of an SSE error
+        try:
+            admission.check_rate(ip, session_id)
+            with tracer.activate(root):
+                turn = ChatTurn(user_message, session_id)
+                if turn.needs_upstream:
+                    with tracer.span("admission.wait"):
+                        slot = admission.acquire()
+                    turn.open_upstream(slot)
+        except Rejected as e:
+            root.set(rejected=e.reason)
+            tracer.end(root)
+            return jsonify({"error": str(e)}), e.status, {**trace_headers, **e.headers}
+        root.set(answer_source=turn.answer_source)
+        
+        frames = FrameCoalescer.from_env(turn.open_replay())
+        return _sse_response(_generate(turn, root, turn.stream, frames), trace_headers)
+    
+    except Exception as e:
+        tracer.end(root, e)
+        return jsonify({"error": str(e)}), 500, trace_headers
+
+
+def resume_chat(data, last_event_id, ip, root, trace_headers):
+    """
+    Continue a dropped answer stream from its Last-Event-ID.
+    
+    Args:
+        data (dict): Request body; only session_id is used
+        last_event_id (str): Last-Event-ID header value
+        ip (str): Client address, for the per-IP rate limit
+        root (Span): The request's root span
+        trace_headers (dict): Headers every response carries
+    
+    Returns:
+        Response: The rest of the answer as SSE, or 410 if it is gone
+    """
+    try:
+        # Reconnects cost no model call, so only the per-IP limit applies
+        admission.check_rate(ip)
+    except Rejected as e:
+        root.set(rejected=e.reason)
+        tracer.end(root)
+        return jsonify({"error": str(e)}), e.status, {**trace_headers, **e.headers}
+    
+    resumption = replay_buffer.resume(data.get("session_id"), last_event_id)
+    root.set(resumed=resumption is not None)
+    if resumption is None:
+        tracer.end(root)
+        return jsonify({"error": GONE_MESSAGE}), 410, trace_headers
+    
+    turn = resumption.turn
+    root.set(answer_source=turn.answer_source, offset=resumption.offset)
+    frames = FrameCoalescer.from_env(resumption.entry.turn_id, resumption.offset)
+    return _sse_response(
+        _generate(turn, root, resumption.stream, frames, resumption.prefix, resumption.owner),
+        trace_headers
+    )
+
+
+@rag_bp.route("/chat/stats", methods=["GET"])
+@monitoring_only
+def chat_stats():
+    """Get chat cache and fast-path counters."""
+    try:
+        answers = ANSWERS.values()
+        sources = {source: answers.get((source,), 0) for source in ANSWER_SOURCES}
+        streams = STREAMS.values()
+        outcomes = {outcome: streams.get((outcome,), 0) for outcome in STREAM_OUTCOMES}
+        total = sum(sources.values())
+        return jsonify({
+            "answer_sources": sources,
+            "stream_outcomes": outcomes,
+            "fast_path_ratio": (total - sources["llm"]) / total if total else 0.0,
+            "faq": faq_index.stats(),
+            "single_flight": single_flight.stats() if single_flight is not None else None,
+            "replay": replay_buffer.stats(),
+            "sessions": session_manager.stats(),
+            "upstream": chatbot.provider.stats(),
+            "model_router": chatbot.router.stats(),
+            "admission": admission.stats(),
+            "tracing": tracer.stats(),
+            "profiling": profiler.stats(),
+            "response_cache": response_cache.stats(),
+            "semantic_cache": semantic_cache.stats(),
+            "navigation": navigation_router.stats()
+        })
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -71,7 +555,11 @@ def chat():
 def get_history(session_id):
     """Get conversation history for a session."""
     try:
-        history = session_manager.get_history(session_id)
+        # Stored messages also carry internal fields such as token counts
+        history = [
+            {"role": m["role"], "content": m["content"]}
+            for m in session_manager.get_history(session_id)
+        ]
         return jsonify({"session_id": session_id, "history": history})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
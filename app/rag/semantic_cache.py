@@ -0,0 +1,208 @@
+import hashlib
+import time
+import zlib
+from functools import lru_cache
+from threading import Lock
+
+import numpy as np
+
+from app.rag.text_utils import tokenize
+
+
+class HashingVectorizer:
+    """
+    Dependency-light lexical embedding: content words and their character
+    trigrams hashed into a fixed-size, L2-normalized float32 vector.
+    """
+
+    def __init__(self, dim=512, ngram=3):
+        """
+        Args:
+            dim (int): Embedding size
+            ngram (int): Character n-gram length
+        """
+        self.dim = dim
+        self.ngram = ngram
+
+    def _features(self, text):
+        for token in tokenize(text):
+            # Whole words weigh more than their fragments
+            yield f"w:{token}", 2.0
+            padded = f" {token} "
+            for i in range(len(padded) - self.ngram + 1):
+                yield padded[i:i + self.ngram], 1.0
+
+    def embed(self, text):
+        """
+        Embed a piece of text.
+
+        Args:
+            text (str): Raw text
+
+        Returns:
+            numpy.ndarray: Unit vector, or None if the text has no content words
+        """
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature, weight in self._features(text):
+            vector[zlib.crc32(feature.encode("utf-8")) % self.dim] += weight
+
+        norm = np.linalg.norm(vector)
+        if not norm:
+            return None
+        return vector / norm
+
+
+@lru_cache(maxsize=64)
+def context_key(system_prompt, tier=""):
+    """
+    Fold what else decides an answer into an integer cache context.
+
+    Cached: the system prompt is the same long string on every turn.
+
+    Args:
+        system_prompt (str): Base system prompt (instructions and knowledge base)
+        tier (str): Model tier the answer comes from
+
+    Returns:
+        int: Signed 64-bit context id
+    """
+    digest = hashlib.blake2b(f"{tier}\0{system_prompt}".encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little", signed=True)
+
+
+class SemanticCache:
+    """
+    Near-duplicate answer cache for first-turn questions.
+
+    Question embeddings live in one preallocated matrix, so a lookup is a
+    single matrix-vector product over all entries. Only entries with the
+    same context (system prompt and model tier, see context_key()) that
+    have not expired can match. The least recently used slot is
+    overwritten when the cache is full.
+    """
+
+    def __init__(self, max_entries=2048, threshold=0.9, ttl_seconds=3600, vectorizer=None):
+        """
+        Initialize the cache.
+
+        Args:
+            max_entries (int): Maximum cached answers; 0 disables the cache
+            threshold (float): Minimum cosine similarity for a hit
+            ttl_seconds (int): Seconds before an answer expires
+            vectorizer (HashingVectorizer): Embedding function
+        """
+        self.vectorizer = vectorizer or HashingVectorizer()
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.ttl = ttl_seconds
+        self.lock = Lock()
+
+        self.matrix = np.zeros((max_entries, self.vectorizer.dim), dtype=np.float32)
+        self.last_used = np.zeros(max_entries, dtype=np.int64)
+        self.contexts = np.zeros(max_entries, dtype=np.int64)
+        self.expires_at = np.zeros(max_entries, dtype=np.float64)
+        self.answers = [None] * max_entries
+        self.size = 0
+        self.clock = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _best_match(self, vector, context, now):
+        """Return (slot, similarity) of the closest live entry in context; caller holds the lock."""
+        if not self.size:
+            return None, 0.0
+        live = (self.contexts[:self.size] == context) & (self.expires_at[:self.size] > now)
+        similarities = np.where(live, self.matrix[:self.size] @ vector, -1.0)
+        slot = int(np.argmax(similarities))
+        return slot, float(similarities[slot])
+
+    def get(self, question, context=0):
+        """
+        Look up an answer to a question or a close paraphrase of it.
+
+        Args:
+            question (str): The user's message
+            context (int): Context id from context_key()
+
+        Returns:
+            tuple: Cached answer chunks, or None on a miss
+        """
+        if not self.max_entries:
+            return None
+
+        vector = self.vectorizer.embed(question)
+        if vector is None:
+            return None
+
+        with self.lock:
+            slot, similarity = self._best_match(vector, context, time.monotonic())
+            if slot is None or similarity < self.threshold:
+                self.misses += 1
+                return None
+
+            self.clock += 1
+            self.last_used[slot] = self.clock
+            self.hits += 1
+            return self.answers[slot]
+
+    def set(self, question, chunks, context=0):
+        """
+        Store an answer, replacing a near-duplicate, an expired entry or
+        the LRU entry.
+
+        Args:
+            question (str): The user's message
+            chunks (list): Streamed answer chunks
+            context (int): Context id from context_key()
+        """
+        if not self.max_entries:
+            return
+
+        vector = self.vectorizer.embed(question)
+        if vector is None:
+            return
+
+        with self.lock:
+            now = time.monotonic()
+            slot, similarity = self._best_match(vector, context, now)
+            if slot is None or similarity < self.threshold:
+                if self.size < self.max_entries:
+                    slot = self.size
+                    self.size += 1
+                else:
+                    # Expired entries go first, then the least recently used
+                    slot = int(np.argmin(np.where(self.expires_at > now, self.last_used, -1)))
+                    if self.expires_at[slot] > now:
+                        self.evictions += 1
+
+            self.clock += 1
+            self.matrix[slot] = vector
+            self.last_used[slot] = self.clock
+            self.contexts[slot] = context
+            self.expires_at[slot] = now + self.ttl
+            self.answers[slot] = tuple(chunks)
+
+    def invalidate(self):
+        """Drop every cached answer."""
+        with self.lock:
+            self.answers = [None] * self.max_entries
+            self.last_used[:] = 0
+            self.expires_at[:] = 0
+            self.size = 0
+
+    def stats(self):
+        """
+        Get cache counters.
+
+        Returns:
+            dict: Size, hits, misses and evictions
+        """
+        with self.lock:
+            return {
+                "size": self.size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
@@ -1,156 +1,174 @@
 import uuid
-from datetime import datetime, timedelta
-from threading import Lock
+from threading import Event, Thread
+
+from app.rag.metrics import SESSIONS_CREATED
+from app.rag.session_store import MemorySessionStore
+from app.rag.tracing import tracer
+
 
 class SessionManager:
     """
-    Manages chat sessions with in-memory storage.
+    Manages chat sessions on top of a pluggable SessionStore.
     Sessions automatically expire after 1 hour of inactivity.
+
+    The default store is a sharded in-memory map private to this process;
+    pass a SQLiteSessionStore to share sessions between worker processes.
     """
-    
-    def __init__(self, session_timeout_minutes=60):
+
+    def __init__(self, session_timeout_minutes=60, reaper_interval_seconds=None,
+                 num_shards=16, max_messages=None, max_sessions=None, max_bytes=None,
+                 store=None):
         """
         Initialize session manager.
-        
+
         Args:
             session_timeout_minutes (int): Minutes before session expires
-        """
-        self.sessions = {}  # {session_id: {"history": [], "last_active": datetime}}
-        self.lock = Lock()
-        self.timeout = timedelta(minutes=session_timeout_minutes)
-    
+            reaper_interval_seconds (float): If set, expire sessions from a
+                background thread at this interval as well as on access
+            num_shards (int): Shards for the default in-memory store
+            max_messages (int): Messages kept per session (default store)
+            max_sessions (int): Global session cap, LRU-evicted (default store)
+            max_bytes (int): Global message byte cap, LRU-evicted (default store)
+            store (SessionStore): Storage backend; its own timeout and caps apply
+        """
+        if store is None:
+            store = MemorySessionStore(
+                session_timeout_minutes * 60, num_shards,
+                max_messages=max_messages, max_sessions=max_sessions, max_bytes=max_bytes
+            )
+        self.store = store
+        self.timeout = store.timeout
+
+        self._reaper_stop = Event()
+        self._reaper = None
+        if reaper_interval_seconds:
+            self._reaper = Thread(
+                target=self._reap_forever,
+                args=(reaper_interval_seconds,),
+                name="session-reaper",
+                daemon=True
+            )
+            self._reaper.start()
+
+    @tracer.traced("session.create")
     def create_session(self):
         """
         Create a new session.
-        
+
         Returns:
             str: New session ID
         """
         session_id = str(uuid.uuid4())
-        
-        with self.lock:
-            self.sessions[session_id] = {
-                "history": [],
-                "last_active": datetime.now()
-            }
-        
+        self.store.create(session_id)
+        SESSIONS_CREATED.inc()
         return session_id
-    
+
+    @tracer.traced("session.get_history")
     def get_history(self, session_id):
         """
         Get conversation history for a session.
-        
+
         Args:
             session_id (str): Session ID
-        
+
         Returns:
             list: Conversation history or empty list if session not found
         """
-        with self.lock:
-            # Clean up expired sessions
-            self._cleanup_expired_sessions()
-            
-            if session_id not in self.sessions:
-                return []
-            
-            # Update last active time
-            self.sessions[session_id]["last_active"] = datetime.now()
-            
-            return self.sessions[session_id]["history"].copy()
-    
+        return self.store.get_history(session_id)
+
+    @tracer.traced("session.add_message")
     def add_message(self, session_id, role, content):
         """
         Add a message to session history.
-        
+
         Args:
             session_id (str): Session ID
             role (str): "user" or "assistant"
             content (str): Message content
-        
+
+        Returns:
+            bool: True if successful, False if session not found
+        """
+        return self.store.append(session_id, [{"role": role, "content": content}])
+
+    @tracer.traced("session.add_messages")
+    def add_messages(self, session_id, messages):
+        """
+        Add several messages to session history in one batch.
+
+        Args:
+            session_id (str): Session ID
+            messages (list): [{"role": "user/assistant", "content": "..."}]
+
         Returns:
             bool: True if successful, False if session not found
         """
-        with self.lock:
-            if session_id not in self.sessions:
-                return False
-            
-            self.sessions[session_id]["history"].append({
-                "role": role,
-                "content": content
-            })
-            
-            self.sessions[session_id]["last_active"] = datetime.now()
-            
-            return True
-    
+        return self.store.append(session_id, messages)
+
+    @tracer.traced("session.clear")
     def clear_session(self, session_id):
         """
         Clear conversation history for a session.
-        
+
         Args:
             session_id (str): Session ID
-        
+
         Returns:
             bool: True if successful, False if session not found
         """
-        with self.lock:
-            if session_id not in self.sessions:
-                return False
-            
-            self.sessions[session_id]["history"] = []
-            self.sessions[session_id]["last_active"] = datetime.now()
-            
-            return True
-    
+        return self.store.clear(session_id)
+
+    @tracer.traced("session.delete")
     def delete_session(self, session_id):
         """
         Delete a session entirely.
-        
+
         Args:
             session_id (str): Session ID
-        
+
         Returns:
             bool: True if successful, False if session not found
         """
-        with self.lock:
-            if session_id not in self.sessions:
-                return False
-            
-            del self.sessions[session_id]
-            return True
-    
-    def _cleanup_expired_sessions(self):
-        """Remove sessions that have been inactive for too long."""
-        now = datetime.now()
-        expired = [
-            sid for sid, data in self.sessions.items()
-            if now - data["last_active"] > self.timeout
-        ]
-        
-        for sid in expired:
-            del self.sessions[sid]
-    
+        return self.store.delete(session_id)
+
+    def _reap_forever(self, interval):
+        """Background reaper loop."""
+        while not self._reaper_stop.wait(interval):
+            self.store.cleanup()
+
+    def stop_reaper(self):
+        """Stop the background reaper thread, if running."""
+        self._reaper_stop.set()
+        if self._reaper is not None:
+            self._reaper.join()
+            self._reaper = None
+
     def get_active_session_count(self):
         """
         Get number of active sessions.
-        
+
         Returns:
             int: Number of active sessions
         """
-        with self.lock:
-            self._cleanup_expired_sessions()
-            return len(self.sessions)
-    
+        return self.store.count()
+
     def session_exists(self, session_id):
         """
         Check if a session exists and is active.
-        
+
         Args:
             session_id (str): Session ID
-        
+
         Returns:
             bool: True if session exists and is active
         """
-        with self.lock:
-            self._cleanup_expired_sessions()
-            return session_id in self.sessions
\ No newline at end of file
+        return self.store.exists(session_id)
+
+    def stats(self):
+        """
+        Get storage occupancy and eviction counters.
+
+        Returns:
+            dict: Sessions, stored bytes, evicted sessions and dropped messages
+        """
+        return self.store.stats()
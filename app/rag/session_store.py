@@ -0,0 +1,468 @@
+import math
+import os
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from threading import Lock, local
+
+from app.rag.tokens import count_tokens
+
+
+class SessionStore(ABC):
+    """
+    Storage interface behind SessionManager.
+    Implementations own expiry: an expired session must behave exactly
+    like a missing one.
+    """
+
+    @abstractmethod
+    def create(self, session_id):
+        """Create an empty session."""
+
+    @abstractmethod
+    def get_history(self, session_id):
+        """Return a copy of the history and mark the session active; [] if missing."""
+
+    @abstractmethod
+    def append(self, session_id, messages):
+        """
+        Append [{"role", "content"}, ...] in one batch; False if missing.
+        Stored messages carry a "tokens" count computed once here.
+        """
+
+    @abstractmethod
+    def clear(self, session_id):
+        """Empty a session's history; False if missing."""
+
+    @abstractmethod
+    def delete(self, session_id):
+        """Remove a session; False if missing."""
+
+    @abstractmethod
+    def exists(self, session_id):
+        """Whether the session exists and has not expired."""
+
+    @abstractmethod
+    def count(self):
+        """Number of active sessions."""
+
+    @abstractmethod
+    def cleanup(self):
+        """Remove expired sessions."""
+
+    @abstractmethod
+    def stats(self):
+        """Occupancy and eviction counters."""
+
+
+def _message_size(message):
+    """Approximate memory held by one stored message."""
+    return len(message["content"].encode("utf-8"))
+
+
+class _SessionShard:
+    """
+    One independently locked slice of the in-memory store.
+
+    Sessions are kept in least-recently-active order, so expiry and
+    capacity eviction only ever look at the oldest entries and
+    per-request cost stays constant no matter how many sessions exist.
+    Each history is a ring buffer of the newest max_messages messages.
+    """
+
+    def __init__(self, timeout_seconds, max_messages=None, max_sessions=None, max_bytes=None):
+        # {session_id: {"history": deque, "bytes": int, "last_active": monotonic seconds}},
+        # oldest first
+        self.sessions = OrderedDict()
+        self.lock = Lock()
+        self.timeout = timeout_seconds
+        self.max_messages = max_messages
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.evicted_sessions = 0
+        self.dropped_messages = 0
+
+    def create(self, session_id):
+        with self.lock:
+            self._remove(session_id)
+            self.sessions[session_id] = {
+                "history": deque(maxlen=self.max_messages),
+                "bytes": 0,
+                "last_active": time.monotonic()
+            }
+            self._enforce_capacity()
+
+    def get_history(self, session_id):
+        with self.lock:
+            self._cleanup_expired_sessions()
+
+            if session_id not in self.sessions:
+                return []
+
+            self._touch(session_id)
+            return list(self.sessions[session_id]["history"])
+
+    def append(self, session_id, messages):
+        with self.lock:
+            if session_id not in self.sessions:
+                return False
+
+            session = self.sessions[session_id]
+            history = session["history"]
+            for m in messages:
+                if self.max_messages and len(history) == self.max_messages:
+                    dropped = _message_size(history.popleft())
+                    session["bytes"] -= dropped
+                    self.bytes -= dropped
+                    self.dropped_messages += 1
+
+                size = _message_size(m)
+                history.append(m)
+                session["bytes"] += size
+                self.bytes += size
+
+            self._touch(session_id)
+            self._enforce_capacity()
+            return True
+
+    def clear(self, session_id):
+        with self.lock:
+            if session_id not in self.sessions:
+                return False
+
+            session = self.sessions[session_id]
+            session["history"].clear()
+            self.bytes -= session["bytes"]
+            session["bytes"] = 0
+            self._touch(session_id)
+            return True
+
+    def delete(self, session_id):
+        with self.lock:
+            return self._remove(session_id)
+
+    def exists(self, session_id):
+        with self.lock:
+            self._cleanup_expired_sessions()
+            return session_id in self.sessions
+
+    def count(self):
+        with self.lock:
+            self._cleanup_expired_sessions()
+            return len(self.sessions)
+
+    def cleanup(self):
+        with self.lock:
+            self._cleanup_expired_sessions()
+
+    def stats(self):
+        with self.lock:
+            return len(self.sessions), self.bytes, self.evicted_sessions, self.dropped_messages
+
+    def _touch(self, session_id):
+        """Mark a session as just used; caller holds the lock."""
+        self.sessions[session_id]["last_active"] = time.monotonic()
+        self.sessions.move_to_end(session_id)
+
+    def _remove(self, session_id):
+        """Drop a session and its byte count; caller holds the lock."""
+        session = self.sessions.pop(session_id, None)
+        if session is None:
+            return False
+        self.bytes -= session["bytes"]
+        return True
+
+    def _enforce_capacity(self):
+        """Evict least recently active sessions over the caps; caller holds the lock."""
+        # The most recent session is never evicted, even if it alone is over budget
+        while len(self.sessions) > 1 and (
+            (self.max_sessions and len(self.sessions) > self.max_sessions)
+            or (self.max_bytes and self.bytes > self.max_bytes)
+        ):
+            self._remove(next(iter(self.sessions)))
+            self.evicted_sessions += 1
+
+    def _cleanup_expired_sessions(self):
+        """Remove sessions that have been inactive for too long."""
+        deadline = time.monotonic() - self.timeout
+
+        # Oldest first: stop at the first session that is still active
+        while self.sessions:
+            sid, data = next(iter(self.sessions.items()))
+            if data["last_active"] >= deadline:
+                break
+            self._remove(sid)
+
+
+class MemorySessionStore(SessionStore):
+    """
+    Per-process store. Session ids are hashed across independently locked
+    shards, so threads working on unrelated sessions do not wait on each
+    other and expiry only ever holds one shard's lock.
+
+    Memory is bounded: each history keeps only its newest max_messages,
+    and the session and byte caps are split evenly across shards, each
+    evicting its least recently active sessions first.
+    """
+
+    def __init__(self, timeout_seconds=3600, num_shards=16, max_messages=None,
+                 max_sessions=None, max_bytes=None):
+        """
+        Args:
+            timeout_seconds (float): Inactivity before a session expires
+            num_shards (int): Number of independently locked shards
+            max_messages (int): Messages kept per session; None keeps all
+            max_sessions (int): Global session cap; None is unbounded
+            max_bytes (int): Global cap on stored message bytes; None is unbounded
+        """
+        num_shards = max(1, num_shards)
+
+        def per_shard(cap):
+            return math.ceil(cap / num_shards) if cap else None
+
+        self.timeout = timeout_seconds
+        self.shards = [
+            _SessionShard(timeout_seconds, max_messages, per_shard(max_sessions), per_shard(max_bytes))
+            for _ in range(num_shards)
+        ]
+
+    def _shard(self, session_id):
+        """Get the shard that owns a session id."""
+        return self.shards[hash(session_id) % len(self.shards)]
+
+    def create(self, session_id):
+        self._shard(session_id).create(session_id)
+
+    def get_history(self, session_id):
+        return self._shard(session_id).get_history(session_id)
+
+    def append(self, session_id, messages):
+        # Count tokens before taking the shard lock
+        messages = [
+            {
+                "role": m["role"],
+                "content": m["content"],
+                "tokens": m.get("tokens") or count_tokens(m["content"])
+            }
+            for m in messages
+        ]
+        return self._shard(session_id).append(session_id, messages)
+
+    def clear(self, session_id):
+        return self._shard(session_id).clear(session_id)
+
+    def delete(self, session_id):
+        return self._shard(session_id).delete(session_id)
+
+    def exists(self, session_id):
+        return self._shard(session_id).exists(session_id)
+
+    def count(self):
+        return sum(shard.count() for shard in self.shards)
+
+    def cleanup(self):
+        for shard in self.shards:
+            shard.cleanup()
+
+    def stats(self):
+        totals = [sum(values) for values in zip(*(shard.stats() for shard in self.shards))]
+        return dict(zip(("sessions", "bytes", "evicted_sessions", "dropped_messages"), totals))
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Host-wide store shared by every worker process through one SQLite
+    file in WAL mode (readers never block the single writer).
+
+    Each thread keeps its own connection; statements are constant SQL
+    with bound parameters, so sqlite3's statement cache reuses the
+    compiled plans. Expired sessions are filtered out on read and
+    deleted through the last_active index at most once per
+    cleanup_interval seconds; the same sweep trims the least recently
+    active sessions over max_sessions. Histories are trimmed to
+    max_messages on append.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS sessions (
+        id TEXT PRIMARY KEY,
+        last_active REAL NOT NULL
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS sessions_last_active ON sessions (last_active);
+    CREATE TABLE IF NOT EXISTS messages (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_id TEXT NOT NULL REFERENCES sessions (id) ON DELETE CASCADE,
+        role TEXT NOT NULL,
+        content TEXT NOT NULL,
+        tokens INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE INDEX IF NOT EXISTS messages_session ON messages (session_id, seq);
+    """
+
+    def __init__(self, path="sessions.db", timeout_seconds=3600, cleanup_interval=30,
+                 max_messages=None, max_sessions=None):
+        """
+        Args:
+            path (str): Database file shared by all workers
+            timeout_seconds (float): Inactivity before a session expires
+            cleanup_interval (float): Minimum seconds between expiry sweeps
+            max_messages (int): Messages kept per session; None keeps all
+            max_sessions (int): Session cap enforced by each sweep; None is unbounded
+        """
+        self.path = path
+        self.timeout = timeout_seconds
+        self.cleanup_interval = cleanup_interval
+        self.max_messages = max_messages
+        self.max_sessions = max_sessions
+        # Per-process counters
+        self.evicted_sessions = 0
+        self.dropped_messages = 0
+        self._local = local()
+        self._last_cleanup = 0.0
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = self._conn()
+        conn.executescript(self.SCHEMA)
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(messages)")}
+        if "tokens" not in columns:
+            conn.execute("ALTER TABLE messages ADD COLUMN tokens INTEGER NOT NULL DEFAULT 0")
+
+    def _conn(self):
+        """Get this thread's connection, opening it on first use."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit mode; transactions are opened explicitly
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, cached_statements=64)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self):
+        """Run a block in one write transaction on this thread's connection."""
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _deadline(self):
+        return time.time() - self.timeout
+
+    def _touch(self, conn, session_id):
+        """Refresh last_active if the session is live; returns True if it was."""
+        now = time.time()
+        cursor = conn.execute(
+            "UPDATE sessions SET last_active = ? WHERE id = ? AND last_active >= ?",
+            (now, session_id, now - self.timeout)
+        )
+        return cursor.rowcount > 0
+
+    def create(self, session_id):
+        self._maybe_cleanup()
+        self._conn().execute(
+            "INSERT OR REPLACE INTO sessions (id, last_active) VALUES (?, ?)",
+            (session_id, time.time())
+        )
+
+    def get_history(self, session_id):
+        self._maybe_cleanup()
+        with self._transaction() as conn:
+            if not self._touch(conn, session_id):
+                return []
+            rows = conn.execute(
+                "SELECT role, content, tokens FROM messages WHERE session_id = ? ORDER BY seq",
+                (session_id,)
+            ).fetchall()
+        return [
+            {"role": role, "content": content, "tokens": tokens or count_tokens(content)}
+            for role, content, tokens in rows
+        ]
+
+    def append(self, session_id, messages):
+        with self._transaction() as conn:
+            if not self._touch(conn, session_id):
+                return False
+            conn.executemany(
+                "INSERT INTO messages (session_id, role, content, tokens) VALUES (?, ?, ?, ?)",
+                [
+                    (session_id, m["role"], m["content"], m.get("tokens") or count_tokens(m["content"]))
+                    for m in messages
+                ]
+            )
+            if self.max_messages:
+                cursor = conn.execute(
+                    "DELETE FROM messages WHERE session_id = ? AND seq <= ("
+                    " SELECT seq FROM messages WHERE session_id = ?"
+                    " ORDER BY seq DESC LIMIT 1 OFFSET ?)",
+                    (session_id, session_id, self.max_messages)
+                )
+                self.dropped_messages += max(cursor.rowcount, 0)
+            return True
+
+    def clear(self, session_id):
+        with self._transaction() as conn:
+            if not self._touch(conn, session_id):
+                return False
+            conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            return True
+
+    def delete(self, session_id):
+        cursor = self._conn().execute(
+            "DELETE FROM sessions WHERE id = ? AND last_active >= ?",
+            (session_id, self._deadline())
+        )
+        return cursor.rowcount > 0
+
+    def exists(self, session_id):
+        row = self._conn().execute(
+            "SELECT 1 FROM sessions WHERE id = ? AND last_active >= ?",
+            (session_id, self._deadline())
+        ).fetchone()
+        return row is not None
+
+    def count(self):
+        return self._conn().execute(
+            "SELECT COUNT(*) FROM sessions WHERE last_active >= ?",
+            (self._deadline(),)
+        ).fetchone()[0]
+
+    def cleanup(self):
+        self._last_cleanup = time.monotonic()
+        conn = self._conn()
+        conn.execute("DELETE FROM sessions WHERE last_active < ?", (self._deadline(),))
+
+        if self.max_sessions:
+            cursor = conn.execute(
+                "DELETE FROM sessions WHERE id IN ("
+                " SELECT id FROM sessions ORDER BY last_active DESC LIMIT -1 OFFSET ?)",
+                (self.max_sessions,)
+            )
+            self.evicted_sessions += max(cursor.rowcount, 0)
+
+    def stats(self):
+        stored_bytes = self._conn().execute(
+            "SELECT COALESCE(SUM(LENGTH(CAST(content AS BLOB))), 0) FROM messages"
+            " WHERE session_id IN (SELECT id FROM sessions WHERE last_active >= ?)",
+            (self._deadline(),)
+        ).fetchone()[0]
+        return {
+            "sessions": self.count(),
+            "bytes": stored_bytes,
+            "evicted_sessions": self.evicted_sessions,
+            "dropped_messages": self.dropped_messages,
+        }
+
+    def _maybe_cleanup(self):
+        """Sweep expired sessions if the last sweep is old enough."""
+        if time.monotonic() - self._last_cleanup >= self.cleanup_interval:
+            self.cleanup()
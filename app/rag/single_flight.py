@@ -0,0 +1,346 @@
+import asyncio
+import time
+from threading import Condition, Lock, Thread
+
+# Returned by Subscription._take() once the flight has ended
+_END = object()
+
+
+class Flight:
+    """
+    One upstream stream shared by every request that asked the same
+    question while it was running.
+
+    A producer (a thread, or a task on the ASGI event loop) appends chunks
+    to a shared buffer; each subscriber reads the buffer from the start,
+    so late joiners get the prefix first. Once the last subscriber
+    leaves, the producer stops and closes the upstream stream. With a
+    linger period, a reconnecting client can still subscribe meanwhile and
+    the stream is stopped at the first chunk after it ran out; without
+    one, it is cancelled as soon as the last subscriber leaves.
+    """
+
+    def __init__(self, key, on_finish, linger=0.0):
+        """
+        Initialize an empty flight.
+
+        Args:
+            key (str): Request key the flight is registered under
+            on_finish (callable): Called with the flight once it stops
+            linger (float): Seconds to keep streaming with no subscribers
+        """
+        self.key = key
+        self.on_finish = on_finish
+        self.linger = linger
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.cancelled = False
+        self.subscribers = 0
+        self.idle_since = time.monotonic()
+        self.cond = Condition()
+        # (loop, asyncio.Event) pairs for subscribers waiting on an event loop
+        self.waiters = []
+        self.callbacks = []
+        # Future of aproduce() when producing on an event loop
+        self.task = None
+
+    def _abandoned(self):
+        # Called with self.cond held
+        return self.subscribers == 0 and time.monotonic() - self.idle_since >= self.linger
+
+    def join(self):
+        """Add a subscriber; returns False if the flight already stopped."""
+        with self.cond:
+            if self.done or self.cancelled or self._abandoned():
+                return False
+            self.subscribers += 1
+            return True
+
+    def attach(self):
+        """
+        Add a subscriber that reads the buffer even if the flight has
+        finished; returns False only if the flight was cancelled.
+        """
+        with self.cond:
+            if self.cancelled or (not self.done and self._abandoned()):
+                return False
+            self.subscribers += 1
+            return True
+
+    def leave(self):
+        """Remove a subscriber; the last one out cancels the flight unless it lingers."""
+        with self.cond:
+            self.subscribers -= 1
+            if self.subscribers != 0:
+                return
+            self.idle_since = time.monotonic()
+            if self.done or not self._abandoned():
+                return
+            self.cancelled = True
+            self._wake()
+        # A thread producer stops at its next chunk; a task can be stopped now
+        if self.task is not None:
+            self.task.cancel()
+
+    def add_done_callback(self, callback):
+        """Call callback(flight) once the flight stops, or now if it already has."""
+        with self.cond:
+            if not self.done:
+                self.callbacks.append(callback)
+                return
+        callback(self)
+
+    def _wake(self):
+        # Called with self.cond held
+        self.cond.notify_all()
+        for loop, event in self.waiters:
+            loop.call_soon_threadsafe(event.set)
+        self.waiters = []
+
+    def _publish(self, chunk):
+        """Append a chunk; returns False once nobody is listening."""
+        with self.cond:
+            if self.cancelled or self._abandoned():
+                self.cancelled = True
+                return False
+            self.chunks.append(chunk)
+            self._wake()
+            return True
+
+    def _finish(self, error=None):
+        with self.cond:
+            self.done = True
+            self.error = error
+            self._wake()
+            callbacks, self.callbacks = self.callbacks, []
+        self.on_finish(self)
+        for callback in callbacks:
+            callback(self)
+
+    def start(self, open_stream=None, open_astream=None, loop=None):
+        """
+        Start producing with one subscriber, the caller.
+
+        Args:
+            open_stream (callable): Returns a chunk iterator; run on a thread
+            open_astream (callable): Returns an async chunk iterator; run on loop
+            loop (asyncio.AbstractEventLoop): Loop for open_astream
+
+        Returns:
+            Subscription: The leader's subscription
+        """
+        self.subscribers = 1
+        if loop is not None:
+            self.task = asyncio.run_coroutine_threadsafe(self.aproduce(open_astream()), loop)
+        else:
+            Thread(target=self.produce, args=(open_stream(),), name="single-flight", daemon=True).start()
+        return Subscription(self, leader=True)
+
+    def produce(self, source):
+        """
+        Drain a chunk iterator into the buffer (runs on a thread).
+
+        Args:
+            source (iterator): Upstream chunks
+        """
+        error = None
+        try:
+            for chunk in source:
+                if not self._publish(chunk):
+                    break
+        except Exception as e:
+            error = e
+        finally:
+            # Stops generation upstream if every subscriber left
+            if hasattr(source, "close"):
+                source.close()
+            self._finish(error)
+
+    async def aproduce(self, source):
+        """
+        Async counterpart of produce() for an async chunk iterator.
+
+        Args:
+            source (async iterator): Upstream chunks
+        """
+        error = None
+        try:
+            async for chunk in source:
+                if not self._publish(chunk):
+                    break
+        except Exception as e:
+            error = e
+        finally:
+            if hasattr(source, "aclose"):
+                await source.aclose()
+            self._finish(error)
+
+
+class Subscription:
+    """
+    One request's view of a Flight: iterable from a worker thread or an
+    event loop, starting from the first buffered chunk.
+    """
+
+    def __init__(self, flight, leader):
+        self.flight = flight
+        self.leader = leader
+        self.position = 0
+        self.closed = False
+
+    def _take(self):
+        """Next chunk if buffered; raises when the flight has ended. Call with cond held."""
+        flight = self.flight
+        if self.position < len(flight.chunks):
+            chunk = flight.chunks[self.position]
+            self.position += 1
+            return chunk
+        if flight.done:
+            if flight.error is not None:
+                raise flight.error
+            return _END
+        return None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        with self.flight.cond:
+            while True:
+                chunk = self._take()
+                if chunk is _END:
+                    raise StopIteration
+                if chunk is not None:
+                    return chunk
+                self.flight.cond.wait()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while True:
+            with self.flight.cond:
+                chunk = self._take()
+                if chunk is _END:
+                    raise StopAsyncIteration
+                if chunk is not None:
+                    return chunk
+                event = asyncio.Event()
+                self.flight.waiters.append((asyncio.get_running_loop(), event))
+            await event.wait()
+
+    def close(self):
+        """Leave the flight; the last subscriber out cancels the upstream stream."""
+        if self.closed:
+            return
+        self.closed = True
+        self.flight.leave()
+
+    async def aclose(self):
+        self.close()
+
+
+class SingleFlight:
+    """
+    Deduplicates identical concurrent requests onto one upstream stream.
+    Thread-safe; flights live only while their stream is running.
+    """
+
+    def __init__(self, linger=0.0):
+        """
+        Args:
+            linger (float): Seconds a flight keeps streaming after its last
+                subscriber left (see Flight)
+        """
+        self.linger = linger
+        self.flights = {}
+        self.lock = Lock()
+        self.started = 0
+        self.joined = 0
+        self.cancelled = 0
+
+    def join(self, key):
+        """
+        Join the running flight for key without starting one.
+
+        Args:
+            key (str): Request key (prompt + context hash)
+
+        Returns:
+            Subscription: Follower subscription, or None if nothing is running
+        """
+        with self.lock:
+            return self._join_locked(key)
+
+    def _join_locked(self, key):
+        flight = self.flights.get(key)
+        if flight is not None and flight.join():
+            self.joined += 1
+            return Subscription(flight, leader=False)
+        return None
+
+    def subscribe(self, key, open_stream=None, open_astream=None, loop=None):
+        """
+        Join the running flight for key, or start one.
+
+        Args:
+            key (str): Request key (prompt + context hash)
+            open_stream (callable): Returns a chunk iterator; run on a thread
+            open_astream (callable): Returns an async chunk iterator; run on loop
+            loop (asyncio.AbstractEventLoop): Loop for open_astream
+
+        Returns:
+            Subscription: Iterable over the shared stream's chunks
+        """
+        with self.lock:
+            subscription = self._join_locked(key)
+            if subscription is not None:
+                return subscription
+
+            flight = Flight(key, self._on_finish, self.linger)
+            # Joinable as soon as it is registered
+            flight.subscribers = 1
+            self.flights[key] = flight
+            self.started += 1
+
+        return flight.start(open_stream, open_astream, loop)
+
+    def _on_finish(self, flight):
+        with self.lock:
+            if self.flights.get(flight.key) is flight:
+                del self.flights[flight.key]
+            if flight.cancelled:
+                self.cancelled += 1
+
+    def stats(self):
+        """
+        Get flight counters.
+
+        Returns:
+            dict: Running flights, flights started, requests that joined one, flights cancelled
+        """
+        with self.lock:
+            return {
+                "in_flight": len(self.flights),
+                "started": self.started,
+                "joined": self.joined,
+                "cancelled": self.cancelled,
+            }
+
+
+def start_flight(open_stream=None, open_astream=None, loop=None, linger=0.0):
+    """
+    Run one upstream stream as a private, unshared flight, so that it is
+    buffered and can outlive its first subscriber (see Flight).
+
+    Args:
+        open_stream (callable): Returns a chunk iterator; run on a thread
+        open_astream (callable): Returns an async chunk iterator; run on loop
+        loop (asyncio.AbstractEventLoop): Loop for open_astream
+        linger (float): Seconds to keep streaming with no subscribers
+
+    Returns:
+        Subscription: The caller's subscription
+    """
+    return Flight(None, lambda flight: None, linger).start(open_stream, open_astream, loop)
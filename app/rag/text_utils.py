@@ -0,0 +1,72 @@
+import re
+
+# Words that carry no retrieval signal for portfolio questions.
+STOPWORDS = frozenset("""
+a about all also am an and any are as at be been but by can could did do does
+for from had has have he her him his how i if in into is it its just me more
+my of on or our she so some tell than that the their them then there these
+they this to us was we were what when where which who whom why will with would
+s t you your vetrivel mahi maheswaran please give show know like
+""".split())
+
+_TOKEN_RE = re.compile(r"[a-z0-9][a-z0-9+#.\-]*[a-z0-9+#]|[a-z0-9]")
+_WHITESPACE_RE = re.compile(r"\s+")
+# A closing "---" horizontal rule
+_RULE_RE = re.compile(r"\n?-{3,}\s*$")
+
+
+def normalize_text(text):
+    """
+    Normalize free text for matching: lowercase, collapse whitespace,
+    strip trailing punctuation.
+
+    Args:
+        text (str): Raw text
+
+    Returns:
+        str: Normalized text
+    """
+    text = _WHITESPACE_RE.sub(" ", (text or "").lower()).strip()
+    return text.rstrip("?!. ")
+
+
+def strip_rule(text):
+    """
+    Strip surrounding whitespace and a closing "---" rule from a
+    markdown block, leaving list markers alone.
+
+    Args:
+        text (str): Markdown text
+
+    Returns:
+        str: The text without the rule
+    """
+    return _RULE_RE.sub("", (text or "").strip()).strip()
+
+
+def _stem(token):
+    """Very light suffix stripping so "projects"/"project" match."""
+    if len(token) > 4 and token.endswith("ies"):
+        return token[:-3] + "y"
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        return token[:-1]
+    return token
+
+
+def tokenize(text):
+    """
+    Split text into stemmed, stopword-free tokens.
+
+    Args:
+        text (str): Raw text
+
+    Returns:
+        list: Tokens in order of appearance
+    """
+    tokens = []
+    for token in _TOKEN_RE.findall((text or "").lower()):
+        token = token.rstrip(".")
+        if not token or token in STOPWORDS:
+            continue
+        tokens.append(_stem(token))
+    return tokens
@@ -0,0 +1,44 @@
+import re
+
+_PIECE_RE = re.compile(r"\w+|[^\w\s]")
+
+
+def count_tokens(text):
+    """
+    Estimate the model tokens in a piece of text.
+
+    Each word costs one token plus one per 4 characters beyond the first
+    4, and each punctuation mark costs one. This slightly overestimates
+    English prose, which is the safe direction for a budget, and needs
+    no tokenizer files.
+
+    Args:
+        text (str): Text to measure
+
+    Returns:
+        int: Token count
+    """
+    if not text:
+        return 0
+    tokens = 0
+    for piece in _PIECE_RE.findall(text):
+        tokens += 1 + max(0, len(piece) - 4) // 4
+    return tokens
+
+
+def message_tokens(message):
+    """
+    Tokens a chat message costs, using the count cached on the stored
+    message when present.
+
+    Args:
+        message (dict): {"role", "content", optional "tokens"}
+
+    Returns:
+        int: Token count including per-message overhead
+    """
+    tokens = message.get("tokens")
+    if tokens is None:
+        tokens = count_tokens(message["content"])
+    # Role and separators
+    return tokens + 4
@@ -0,0 +1,394 @@
+"""
+Lightweight request tracing.
+
+A trace is a tree of timed spans sharing a trace id; the current span
+lives in a context variable, so nested `with tracer.span(...)` blocks
+(and asyncio.to_thread calls) attach to it automatically. Spans are
+kept in memory until the root span ends, then the trace is handed to
+the exporter if it was sampled, either up front (TRACE_SAMPLE_RATE) or
+because it turned out slow (TRACE_SLOW_MS). Outside a trace, span() is
+a no-op costing one context-variable lookup.
+
+Streaming generators must not hold the context variable across yields,
+so they take their parent explicitly: start_span(name, parent) and
+tracer.end(span).
+"""
+import atexit
+import functools
+import importlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from contextvars import ContextVar
+from queue import Empty, Full, Queue
+from threading import Lock
+
+TRACE_HEADER = "X-Trace-Id"
+_TRACE_ID = re.compile(r"^[0-9a-f]{32}$")
+
+_current_span = ContextVar("current_span", default=None)
+
+
+class Trace:
+    """Spans collected for one trace id."""
+
+    def __init__(self, trace_id, sampled):
+        self.trace_id = trace_id
+        self.sampled = sampled
+        self.spans = []
+        self.finished = False
+        self.exported = False
+        self.lock = Lock()
+
+
+class NoopSpan:
+    """Stands in for a span when nothing is being recorded."""
+
+    recording = False
+    trace_id = None
+
+    def set(self, **attributes):
+        pass
+
+    def event(self, name, **attributes):
+        pass
+
+
+NOOP_SPAN = NoopSpan()
+
+
+class Span:
+    """One timed operation within a trace."""
+
+    recording = True
+
+    __slots__ = ("trace", "span_id", "parent_id", "name", "start", "started", "duration_ms",
+                 "attributes", "events", "error")
+
+    def __init__(self, trace, name, parent_id=None, attributes=None):
+        self.trace = trace
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.name = name
+        self.start = time.time()
+        self.started = time.perf_counter()
+        self.duration_ms = None
+        self.attributes = attributes or {}
+        self.events = []
+        self.error = None
+
+    @property
+    def trace_id(self):
+        return self.trace.trace_id
+
+    def set(self, **attributes):
+        """Add attributes to the span."""
+        self.attributes.update(attributes)
+
+    def event(self, name, **attributes):
+        """Record a point in time within the span."""
+        offset = round((time.perf_counter() - self.started) * 1000, 3)
+        self.events.append({"name": name, "offset_ms": offset, **attributes})
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration_ms": self.duration_ms,
+            "attributes": self.attributes,
+            "events": self.events,
+            "status": "error" if self.error else "ok",
+            "error": self.error,
+        }
+
+
+class Exporter(ABC):
+    """Receives finished traces as lists of span dicts."""
+
+    @abstractmethod
+    def export(self, spans):
+        """Take one finished trace; must not block the request thread."""
+
+    def shutdown(self):
+        pass
+
+    def stats(self):
+        return {}
+
+
+class JsonlExporter(Exporter):
+    """
+    Appends spans to a JSON Lines file from a background thread, in
+    batches, so request threads never wait on disk. When the queue is
+    full, spans are dropped and counted rather than blocking.
+    """
+
+    def __init__(self, path="traces.jsonl", batch_size=200, flush_interval=1.0, max_queue=10000):
+        """
+        Initialize the exporter and start its writer thread.
+
+        Args:
+            path (str): Output file, appended to
+            batch_size (int): Spans written per batch
+            flush_interval (float): Max seconds a span waits before being written
+            max_queue (int): Spans buffered before new ones are dropped
+        """
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = Queue(maxsize=max_queue)
+        self.dropped = 0
+        self.written = 0
+        self.stopping = threading.Event()
+        self.writer = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+        self.writer.start()
+        atexit.register(self.shutdown)
+
+    def export(self, spans):
+        for span in spans:
+            try:
+                self.queue.put_nowait(span)
+            except Full:
+                self.dropped += 1
+
+    def _drain(self, batch):
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=timeout))
+            except Empty:
+                break
+
+    def _run(self):
+        while not (self.stopping.is_set() and self.queue.empty()):
+            batch = []
+            self._drain(batch)
+            if batch:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write("".join(json.dumps(span, default=str) + "\n" for span in batch))
+                self.written += len(batch)
+
+    def shutdown(self):
+        """Write out queued spans and stop the writer thread."""
+        self.stopping.set()
+        self.writer.join(timeout=self.flush_interval + 5)
+
+    def stats(self):
+        return {"path": self.path, "written": self.written, "dropped": self.dropped, "queued": self.queue.qsize()}
+
+
+class Tracer:
+    """Creates traces and spans and hands finished, sampled traces to an exporter."""
+
+    def __init__(self, exporter=None, sample_rate=1.0, slow_ms=None):
+        """
+        Initialize the tracer.
+
+        Args:
+            exporter (Exporter): Destination for sampled traces; None disables tracing
+            sample_rate (float): Fraction of traces recorded regardless of duration
+            slow_ms (float): Also record traces whose root span takes at least this long
+        """
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self.lock = Lock()
+        self.traces = 0
+        self.exported = 0
+
+    @classmethod
+    def from_env(cls):
+        """
+        Build a tracer from TRACE_EXPORTER (none, jsonl or module:factory),
+        TRACE_FILE, TRACE_SAMPLE_RATE and TRACE_SLOW_MS.
+        """
+        kind = os.getenv("TRACE_EXPORTER", "none")
+        if kind == "none":
+            exporter = None
+        elif kind == "jsonl":
+            exporter = JsonlExporter(os.getenv("TRACE_FILE", "traces.jsonl"))
+        else:
+            module, _, factory = kind.partition(":")
+            exporter = getattr(importlib.import_module(module), factory)()
+        slow_ms = float(os.getenv("TRACE_SLOW_MS", "0")) or None
+        return cls(exporter, float(os.getenv("TRACE_SAMPLE_RATE", "0.1")), slow_ms)
+
+    @property
+    def enabled(self):
+        return self.exporter is not None
+
+    def new_trace_id(self, incoming=None):
+        """Reuse a well-formed incoming trace id, or make a new one."""
+        if incoming and _TRACE_ID.match(incoming):
+            return incoming
+        return os.urandom(16).hex()
+
+    def start_trace(self, name, trace_id=None, sampled=None, **attributes):
+        """
+        Start a root span; finish it with end().
+
+        Args:
+            name (str): Root span name
+            trace_id (str): Trace id to use, or None for a new one
+            sampled (bool): Force the sampling decision; None uses sample_rate
+            **attributes: Span attributes
+
+        Returns:
+            Span: The root span, or NOOP_SPAN when the trace is not recorded
+        """
+        if not self.enabled:
+            return NOOP_SPAN
+        if sampled is None:
+            sampled = random.random() < self.sample_rate
+        with self.lock:
+            self.traces += 1
+        # Unsampled traces are still collected so slow ones can be kept
+        if not sampled and self.slow_ms is None:
+            return NOOP_SPAN
+        return Span(Trace(trace_id or self.new_trace_id(), sampled), name, attributes=attributes)
+
+    @contextmanager
+    def activate(self, span):
+        """Make span the current span for the duration of a with-block."""
+        token = _current_span.set(span)
+        try:
+            yield span
+        finally:
+            _current_span.reset(token)
+
+    def set_current(self, span):
+        """
+        Make span current for the rest of the running context, e.g. an
+        asyncio task that handles a single request. Threads reused across
+        requests should use activate() instead.
+        """
+        _current_span.set(span)
+
+    def start_span(self, name, parent=None, **attributes):
+        """
+        Start a child span without making it current; finish it with end().
+
+        Args:
+            name (str): Span name
+            parent (Span): Parent span; defaults to the current span
+            **attributes: Span attributes
+
+        Returns:
+            Span: The new span, or NOOP_SPAN outside a recorded trace
+        """
+        if parent is None:
+            parent = _current_span.get()
+        if parent is None or not parent.recording:
+            return NOOP_SPAN
+        return Span(parent.trace, name, parent.span_id, attributes)
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """
+        Time a child of the current span as the current span.
+
+        Args:
+            name (str): Span name
+            **attributes: Span attributes
+
+        Yields:
+            Span: The span, or NOOP_SPAN outside a recorded trace
+        """
+        span = self.start_span(name, **attributes)
+        if not span.recording:
+            yield span
+            return
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _current_span.reset(token)
+            self.end(span)
+
+    def traced(self, name):
+        """
+        Decorator timing every call of a function as a span. Calls outside
+        a recorded trace go straight through, so it suits hot paths.
+
+        Args:
+            name (str): Span name
+        """
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                parent = _current_span.get()
+                if parent is None or not parent.recording:
+                    return function(*args, **kwargs)
+                with self.span(name):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def current(self):
+        """The current span, or None outside a trace."""
+        return _current_span.get()
+
+    def end(self, span, error=None):
+        """
+        Finish a span. Ending the root span completes the trace and
+        exports it if sampled or slow.
+
+        Args:
+            span (Span): Span to finish; NOOP_SPAN is ignored
+            error (BaseException): Failure to record on the span
+        """
+        if not span.recording or span.duration_ms is not None:
+            return
+        span.duration_ms = round((time.perf_counter() - span.started) * 1000, 3)
+        if error is not None:
+            span.error = f"{type(error).__name__}: {error}"
+        trace = span.trace
+
+        with trace.lock:
+            if trace.finished:
+                # A straggler (e.g. a shared upstream stream outliving its request)
+                if trace.exported:
+                    self.exporter.export([span.to_dict()])
+                return
+            trace.spans.append(span)
+            if span.parent_id is not None:
+                return
+            trace.finished = True
+            trace.exported = trace.sampled or (self.slow_ms is not None and span.duration_ms >= self.slow_ms)
+            spans = trace.spans
+            trace.spans = []
+
+        if trace.exported:
+            with self.lock:
+                self.exported += 1
+            self.exporter.export([s.to_dict() for s in spans])
+
+    def stats(self):
+        """
+        Get tracer counters.
+
+        Returns:
+            dict: Traces started and exported, plus exporter stats
+        """
+        with self.lock:
+            counters = {"enabled": self.enabled, "traces": self.traces, "exported": self.exported}
+        if self.exporter is not None:
+            counters["exporter"] = self.exporter.stats()
+        return counters
+
+
+tracer = Tracer.from_env()
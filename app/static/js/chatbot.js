@@ -17,6 +17,10 @@ class PortfolioChatbot {
     this.isStreaming = false;
     this.conversationHistory = [];
     
+    // Reconnects to a dropped answer stream before giving up
+    this.maxResumes = 3;
+    this.resumeDelayMs = 500;
+    
     // Initialize
     this.init();
   }
@@ -114,20 +118,8 @@ class PortfolioChatbot {
     this.disableInputs();
     
     try {
-      const response = await fetch('/api/chat', {
-        method: 'POST',
-        headers: {
-          'Content-Type': 'application/json',
-        },
-        body: JSON.stringify({
-          message: message,
-          session_id: this.sessionId
-        })
-      });
-      
-      if (!response.ok) {
-        throw new Error('Network response was not ok');
-      }
+      const response = await this.postChat(message);
+      await this.checkResponse(response);
       
       // Remove typing indicator
       typingIndicator.remove();
@@ -136,7 +128,7 @@ class PortfolioChatbot {
       const assistantRow = this.createMessageElement('assistant', '');
       this.chatBody.appendChild(assistantRow);
       const assistantBubble = assistantRow.querySelector('.msg');
-      await this.streamResponse(response, assistantBubble);
+      await this.streamWithResume(message, response, assistantBubble);
 
       
     } catch (error) {
@@ -145,7 +137,7 @@ class PortfolioChatbot {
       
       const errorMsg = this.createMessageElement(
         'assistant',
-        'Sorry, I encountered an error. Please try again.'
+        error.visitorMessage || 'Sorry, I encountered an error. Please try again.'
       );
       this.chatBody.appendChild(errorMsg);
     } finally {
@@ -155,11 +147,87 @@ class PortfolioChatbot {
     }
   }
   
-  async streamResponse(response, messageElement) {
+  postChat(message, lastEventId = null) {
+    const headers = {
+      'Content-Type': 'application/json',
+    };
+    // Asks the server to continue a dropped answer instead of starting a new one
+    if (lastEventId) {
+      headers['Last-Event-ID'] = lastEventId;
+    }
+    return fetch('/api/chat', {
+      method: 'POST',
+      headers: headers,
+      body: JSON.stringify({
+        message: message,
+        session_id: this.sessionId
+      })
+    });
+  }
+  
+  async checkResponse(response) {
+    if (response.ok) return;
+    const data = await response.json().catch(() => ({}));
+    const error = new Error(data.error || 'Network response was not ok');
+    error.status = response.status;
+    // Rate limiting and overload replies carry a message for the visitor
+    if (response.status === 429 || response.status === 503) {
+      error.visitorMessage = data.error;
+    }
+    throw error;
+  }
+  
+  async streamWithResume(message, response, messageElement) {
+    const state = { text: '', lastEventId: null, done: false };
+    
+    for (let attempt = 0; ; attempt++) {
+      try {
+        await this.streamResponse(response, messageElement, state);
+      } catch (error) {
+        // Connection dropped mid-answer; reconnect below
+        console.warn('Stream interrupted:', error);
+      }
+      if (state.done) return;
+      // Without an event id the answer cannot be continued, and asking
+      // again would show and save a second answer after the partial one
+      if (attempt >= this.maxResumes || (!state.lastEventId && state.text)) {
+        throw new Error('The answer stream was interrupted');
+      }
+      
+      await new Promise((resolve) => setTimeout(resolve, this.resumeDelayMs * 2 ** attempt));
+      try {
+        if (!state.lastEventId) {
+          this.resetAnswer(messageElement, state);
+        }
+        response = await this.postChat(message, state.lastEventId);
+        if (response.status === 410 && state.lastEventId) {
+          // The server no longer has this answer: ask again from scratch
+          this.resetAnswer(messageElement, state);
+          response = await this.postChat(message);
+        }
+        await this.checkResponse(response);
+      } catch (error) {
+        if (error.status === 429 || error.status === 503) throw error;
+        // Still offline; the next attempt reads nothing and retries
+        response = null;
+      }
+    }
+  }
+  
+  resetAnswer(messageElement, state) {
+    state.text = '';
+    state.lastEventId = null;
+    messageElement.innerHTML = '';
+  }
+  
+  async streamResponse(response, messageElement, state) {
+    if (!response) return;
     const reader = response.body.getReader();
     const decoder = new TextDecoder();
     let buffer = '';
-    let fullText = '';
+    // The event being read; it takes effect at the blank line that ends it
+    let eventId = null;
+    let eventData = null;
     
     while (true) {
       const { value, done } = await reader.read();
@@ -171,28 +239,43 @@ class PortfolioChatbot {
       buffer = lines.pop(); // Keep incomplete line in buffer
       
       for (const line of lines) {
-        if (line.startsWith('data: ')) {
-          const data = JSON.parse(line.slice(6));
-          
-          if (data.chunk) {
-           fullText += data.chunk;
-            const clean = this.stripEmoji(fullText);
-            messageElement.innerHTML = this.formatMessage(clean);
-
-          }
-          
-          if (data.session_id && !this.sessionId) {
-            this.sessionId = data.session_id;
-          }
-          
-          if (data.error) {
-            console.error('Stream error:', data.error);
-          }
+        if (line.startsWith('id: ')) {
+          eventId = line.slice(4);
+        } else if (line.startsWith('data: ')) {
+          eventData = JSON.parse(line.slice(6));
+        } else if (line === '') {
+          if (eventData) this.applyEvent(eventData, messageElement, state);
+          // Event ids mark how much of the answer has been shown, for
+          // reconnects, so one only counts once its data is applied
+          if (eventId !== null) state.lastEventId = eventId;
+          eventId = null;
+          eventData = null;
         }
       }
     }
   }
   
+  applyEvent(data, messageElement, state) {
+    if (data.chunk) {
+      state.text += data.chunk;
+      const clean = this.stripEmoji(state.text);
+      messageElement.innerHTML = this.formatMessage(clean);
+    }
+    
+    if (data.session_id && !this.sessionId) {
+      this.sessionId = data.session_id;
+    }
+    
+    if (data.done) {
+      state.done = true;
+    }
+    
+    if (data.error) {
+      console.error('Stream error:', data.error);
+      state.done = true;
+    }
+  }
+  
   createMessageElement(role, content) {
     const row = document.createElement('div');
     row.className = `msgRow ${role === 'user' ? 'user' : 'bot'}`;
@@ -0,0 +1,38 @@
+"""
+ASGI entry point: POST /api/chat is served by the asyncio chat path,
+everything else by the Flask app through asgiref's WSGI adapter.
+
+    uvicorn asgi:app --workers 2
+"""
+import asyncio
+
+from asgiref.wsgi import WsgiToAsgi
+
+from app import create_app
+from app.rag.asgi_chat import chat_endpoint
+from app.rag.routes import chatbot
+
+flask_app = create_app()
+wsgi_app = WsgiToAsgi(flask_app)
+# Keeps the startup prewarm task referenced until it finishes
+background_tasks = set()
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                # Async connections belong to this loop, so the async pool is warmed here
+                task = asyncio.ensure_future(chatbot.provider.aprewarm())
+                background_tasks.add(task)
+                task.add_done_callback(background_tasks.discard)
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    if scope["type"] == "http" and scope["path"] == "/api/chat" and scope["method"] == "POST":
+        await chat_endpoint(scope, receive, send)
+    else:
+        await wsgi_app(scope, receive, send)
@@ -0,0 +1,62 @@
+"""
+Concurrent-stream capacity: sync Flask (gunicorn gthread) vs the ASGI
+chat path (uvicorn), one worker each, against the stub upstream.
+
+Each level opens N simultaneous /api/chat streams with unique questions
+(caches disabled) and reports how many finished, TTFT and total time.
+With a 16-thread gthread worker, streams beyond 16 queue behind whole
+generations; the asyncio path keeps them all in flight.
+
+Usage:
+    python -m benchmarks.bench_async_capacity [--levels 16 64 256] [--profiles sync asgi]
+"""
+import argparse
+import asyncio
+import time
+import uuid
+
+from benchmarks.harness import app_server, new_client, percentile, run, stream_chat, stub_upstream
+
+
+async def burst(url, concurrency):
+    async with new_client() as client:
+        return await asyncio.gather(*(
+            stream_chat(client, url, f"capacity probe {uuid.uuid4().hex}")
+            for _ in range(concurrency)
+        ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--levels", type=int, nargs="+", default=[16, 64, 256])
+    parser.add_argument("--profiles", nargs="+", default=["sync", "asgi"])
+    parser.add_argument("--ttft-ms", type=float, default=400)
+    parser.add_argument("--tokens-per-sec", type=float, default=50)
+    parser.add_argument("--tokens", type=int, default=100)
+    args = parser.parse_args()
+
+    print(f"{'profile':>8} {'streams':>8} {'ok':>5} {'ttft p50':>9} {'ttft p95':>9} {'total p95':>10} {'wall s':>7}")
+    with stub_upstream(args.ttft_ms, args.tokens_per_sec, args.tokens) as base_url:
+        for profile in args.profiles:
+            with app_server(profile, base_url) as (url, _):
+                run(burst(url, 2))  # warm up
+                for level in args.levels:
+                    start = time.perf_counter()
+                    results = run(burst(url, level))
+                    wall = time.perf_counter() - start
+                    ok = [r for r in results if r["ok"]]
+                    ttfts = [r["ttft"] for r in ok if r["ttft"] is not None]
+                    totals = [r["total"] for r in ok]
+                    print(
+                        f"{profile:>8} {level:>8} {len(ok):>5} "
+                        f"{_fmt(percentile(ttfts, 50)):>9} {_fmt(percentile(ttfts, 95)):>9} "
+                        f"{_fmt(percentile(totals, 95)):>10} {wall:>7.1f}"
+                    )
+
+
+def _fmt(value):
+    return "-" if value is None else f"{value:.2f}"
+
+
+if __name__ == "__main__":
+    main()
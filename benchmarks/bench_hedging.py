@@ -0,0 +1,107 @@
+"""
+Hedged requests against a latency tail.
+
+In-process, streams answers from LocalProvider with a slow tail (a
+fraction of requests wait --slow-ttft-ms instead of --ttft-ms for their
+first token), first unhedged and then through HedgingProvider, on
+threads (sync path) and on one event loop (async path). Reports TTFT
+percentiles, how many upstream requests were made per answer, and the
+hedge counters.
+
+Usage:
+    python -m benchmarks.bench_hedging [--requests 200] [--concurrency 16]
+        [--slow-rate 0.1] [--budget-ms 600] [--max-ratio 0.2]
+"""
+import argparse
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.rag.hedging import HedgingProvider
+from app.rag.providers import LocalProvider
+from benchmarks.harness import percentile
+
+MESSAGES = [
+    {"role": "system", "content": "Vetrivel built a retrieval pipeline with caching and evaluation."},
+    {"role": "user", "content": "What did you build?"},
+]
+
+
+def time_sync(provider):
+    start = time.perf_counter()
+    chunks = provider.stream(MESSAGES)
+    next(chunks)
+    ttft = time.perf_counter() - start
+    for _ in chunks:
+        pass
+    return ttft
+
+
+async def time_async(provider):
+    start = time.perf_counter()
+    ttft = None
+    async for _ in provider.astream(MESSAGES):
+        if ttft is None:
+            ttft = time.perf_counter() - start
+    return ttft
+
+
+def run_sync(provider, requests, concurrency):
+    with ThreadPoolExecutor(concurrency) as pool:
+        return list(pool.map(lambda _: time_sync(provider), range(requests)))
+
+
+async def run_async(provider, requests, concurrency):
+    remaining = [requests]
+    ttfts = []
+
+    async def user():
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            ttfts.append(await time_async(provider))
+
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    return ttfts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--ttft-ms", type=float, default=300)
+    parser.add_argument("--slow-rate", type=float, default=0.1)
+    parser.add_argument("--slow-ttft-ms", type=float, default=3000)
+    parser.add_argument("--tokens", type=int, default=20)
+    parser.add_argument("--tokens-per-sec", type=float, default=200)
+    parser.add_argument("--budget-ms", type=float, default=600)
+    parser.add_argument("--max-ratio", type=float, default=0.2)
+    parser.add_argument("--hedge-model", default=None)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    print(f"{'path':>5} {'mode':>8} {'ttft p50':>8} {'ttft p95':>8} {'ttft p99':>8} "
+          f"{'upstream/answer':>15} {'fired':>5} {'won':>5} {'suppressed':>10}")
+    for path in ("sync", "async"):
+        for hedged in (False, True):
+            inner = LocalProvider(
+                ttft_ms=args.ttft_ms, tokens_per_sec=args.tokens_per_sec, tokens=args.tokens,
+                slow_rate=args.slow_rate, slow_ttft_ms=args.slow_ttft_ms, seed=args.seed,
+            )
+            provider = inner
+            if hedged:
+                provider = HedgingProvider(inner, args.budget_ms / 1000, args.hedge_model, args.max_ratio)
+            if path == "sync":
+                ttfts = run_sync(provider, args.requests, args.concurrency)
+            else:
+                ttfts = asyncio.run(run_async(provider, args.requests, args.concurrency))
+            hedging = provider.stats().get("hedging", {})
+            print(
+                f"{path:>5} {'hedged' if hedged else 'plain':>8} {percentile(ttfts, 50):>8.3f} "
+                f"{percentile(ttfts, 95):>8.3f} {percentile(ttfts, 99):>8.3f} "
+                f"{inner.stats()['requests'] / args.requests:>15.2f} {hedging.get('fired', 0):>5} "
+                f"{hedging.get('hedge_won', 0):>5} {hedging.get('suppressed', 0):>10}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Model tier routing on a question set.
+
+Routes each question through PortfolioChatbot.build_request() with the
+current RAG_MODEL_TIERS table (or the default table; routing is turned
+on here unless RAG_MODEL_ROUTER=0) and prints the tier, complexity score and
+signals behind it, then the tier mix and how much routing adds to prompt
+assembly. Use it with the rag_tier_* metrics from a live deployment to
+tune the thresholds in app/rag/model_router.py.
+
+Usage:
+    python -m benchmarks.bench_model_router [--questions questions.txt] [--history-turns 0]
+        [--repeat 2000]
+"""
+import argparse
+import os
+import time
+from collections import Counter
+
+from app.rag.chatbot import PortfolioChatbot
+from app.rag.providers import LocalProvider
+
+QUESTIONS = (
+    "hi",
+    "What's his email?",
+    "Which university did he attend?",
+    "What is his GitHub?",
+    "What projects has he built?",
+    "What did he do at his last job?",
+    "Tell me about his experience with Python",
+    "Which tools does he use for deployment?",
+    "How did he evaluate the hybrid RAG system?",
+    "Why would he be a good fit for an ML platform team?",
+    "Compare his RAG system with the agentic workflow project and explain the trade-offs",
+    "Walk me through how he designed the LLM evaluation pipeline and what metrics it tracked",
+)
+
+
+def history_of(turns):
+    history = []
+    for i in range(turns):
+        history.append({"role": "user", "content": f"Earlier question {i} about his projects?"})
+        history.append({"role": "assistant", "content": "He has built several RAG and MLOps projects."})
+    return history
+
+
+def per_call_us(function, questions, repeat):
+    start = time.perf_counter()
+    for i in range(repeat):
+        function(questions[i % len(questions)])
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--questions", help="File with one question per line")
+    parser.add_argument("--history-turns", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    questions = QUESTIONS
+    if args.questions:
+        with open(args.questions, encoding="utf-8") as f:
+            questions = tuple(line.strip() for line in f if line.strip())
+    history = history_of(args.history_turns)
+    # Routing is opt-in in the app; here the point is to see it
+    os.environ.setdefault("RAG_MODEL_ROUTER", "1")
+    chatbot = PortfolioChatbot(provider=LocalProvider())
+
+    tiers = Counter()
+    print(f"{'tier':>10} {'score':>5} {'words':>5} {'syn':>3} {'look':>4} {'hits':>4} {'top':>5}  question")
+    for question in questions:
+        _, route = chatbot.build_request(question, history)
+        tiers[route.tier] += 1
+        signals = route.signals
+        if not signals:
+            print(f"{route.tier:>10} {'-':>5}  {question}")
+            continue
+        top = signals["top_share"]
+        print(
+            f"{route.tier:>10} {route.score:>5} {signals['words']:>5} {signals['synthesis']:>3d} "
+            f"{signals['lookup']:>4d} {signals['hits']:>4} {'-' if top is None else f'{top:.2f}':>5}  "
+            f"{question[:70]}"
+        )
+
+    print()
+    for tier in chatbot.router.tiers:
+        print(f"{tier.name:>10}: {tiers[tier.name]}/{len(questions)} "
+              f"(model={tier.model or 'provider default'}, max_tokens={tier.max_tokens or 'provider default'})")
+
+    plain = per_call_us(lambda q: chatbot.build_messages(q, history), questions, args.repeat)
+    routed = per_call_us(lambda q: chatbot.build_request(q, history), questions, args.repeat)
+    print(f"\nbuild_messages {plain:.1f} us, build_request {routed:.1f} us (routing +{routed - plain:.1f} us)")
+
+
+if __name__ == "__main__":
+    main()
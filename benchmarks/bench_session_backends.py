@@ -0,0 +1,73 @@
+"""
+Throughput comparison of the session storage backends.
+
+Runs the chat request pattern (get_history, then one batched append of
+the user/assistant pair) against MemorySessionStore and
+SQLiteSessionStore, single-threaded and from a thread pool, and
+separately times session creation.
+
+Usage:
+    python -m benchmarks.bench_session_backends [--sessions 1000] [--ops 5000] [--threads 1 8]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from threading import Thread
+
+from app.rag.session_manager import SessionManager
+from app.rag.session_store import SQLiteSessionStore
+
+TURN = [
+    {"role": "user", "content": "What projects has he built?"},
+    {"role": "assistant", "content": "Vetrivel has built 10+ projects. " * 8},
+]
+
+
+def request_loop(manager, ids, ops):
+    rng = random.Random()
+    for _ in range(ops):
+        sid = rng.choice(ids)
+        manager.get_history(sid)
+        manager.add_messages(sid, TURN)
+
+
+def measure(manager, sessions, ops, threads):
+    """Return (creates/sec, chat requests/sec)."""
+    start = time.perf_counter()
+    ids = [manager.create_session() for _ in range(sessions)]
+    create_rate = sessions / (time.perf_counter() - start)
+
+    per_thread = ops // threads
+    pool = [Thread(target=request_loop, args=(manager, ids, per_thread)) for _ in range(threads)]
+    start = time.perf_counter()
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    return create_rate, per_thread * threads / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=1_000)
+    parser.add_argument("--ops", type=int, default=5_000)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 8])
+    args = parser.parse_args()
+
+    print(f"{'backend':>8} {'threads':>8} {'creates/s':>10} {'requests/s':>11}")
+    for threads in args.threads:
+        memory = SessionManager()
+        create_rate, request_rate = measure(memory, args.sessions, args.ops, threads)
+        print(f"{'memory':>8} {threads:>8} {create_rate:>10.0f} {request_rate:>11.0f}")
+
+        with tempfile.TemporaryDirectory() as tmp:
+            store = SQLiteSessionStore(os.path.join(tmp, "sessions.db"))
+            sqlite = SessionManager(store=store)
+            create_rate, request_rate = measure(sqlite, args.sessions, args.ops, threads)
+            print(f"{'sqlite':>8} {threads:>8} {create_rate:>10.0f} {request_rate:>11.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Contention benchmark: many threads hammering get_history/add_message.
+
+Runs the same workload against a single-lock SessionManager
+(num_shards=1) and the sharded default, and reports throughput and
+tail latency per operation.
+
+Usage:
+    python -m benchmarks.bench_session_contention [--threads 1 8 32 64] [--shards 16]
+"""
+import argparse
+import random
+import time
+from threading import Barrier, Thread
+
+from app.rag.session_manager import SessionManager
+
+
+def worker(manager, ids, ops, latencies, barrier):
+    """One request loop: read history, then append a user/assistant pair."""
+    rng = random.Random()
+    samples = []
+    barrier.wait()
+    for _ in range(ops):
+        sid = rng.choice(ids)
+        start = time.perf_counter()
+        manager.get_history(sid)
+        manager.add_message(sid, "user", "question")
+        manager.add_message(sid, "assistant", "answer")
+        samples.append(time.perf_counter() - start)
+    latencies.extend(samples)
+
+
+def run(num_shards, threads, sessions, ops):
+    """Run one configuration and return (ops/sec, p50 us, p99 us)."""
+    manager = SessionManager(num_shards=num_shards)
+    ids = [manager.create_session() for _ in range(sessions)]
+    latencies = []
+    barrier = Barrier(threads + 1)
+    pool = [
+        Thread(target=worker, args=(manager, ids, ops, latencies, barrier))
+        for _ in range(threads)
+    ]
+    for thread in pool:
+        thread.start()
+
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in pool:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1e6
+    p99 = latencies[int(len(latencies) * 0.99)] * 1e6
+    return threads * ops / elapsed, p50, p99
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 8, 32, 64])
+    parser.add_argument("--shards", type=int, default=16)
+    parser.add_argument("--sessions", type=int, default=10_000)
+    parser.add_argument("--ops", type=int, default=2_000, help="request loops per thread")
+    args = parser.parse_args()
+
+    print(f"{'threads':>8} {'shards':>7} {'req/s':>10} {'p50 us':>9} {'p99 us':>9}")
+    for threads in args.threads:
+        for shards in (1, args.shards):
+            rate, p50, p99 = run(shards, threads, args.sessions, args.ops)
+            print(f"{threads:>8} {shards:>7} {rate:>10.0f} {p50:>9.1f} {p99:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Micro-benchmark: per-request cost of SessionManager expiry.
+
+Compares the ordered-expiry SessionManager against the previous
+implementation, which scanned every session on every read.
+
+Usage:
+    python -m benchmarks.bench_session_expiry [--sessions 1000 10000 100000]
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+from threading import Lock
+
+from app.rag.session_manager import SessionManager
+
+
+class FullScanSessionManager:
+    """The original dict + full-scan expiry, kept here for comparison."""
+
+    def __init__(self, session_timeout_minutes=60):
+        self.sessions = {}
+        self.lock = Lock()
+        self.timeout = timedelta(minutes=session_timeout_minutes)
+
+    def create_session(self, session_id):
+        with self.lock:
+            self.sessions[session_id] = {"history": [], "last_active": datetime.now()}
+
+    def get_history(self, session_id):
+        with self.lock:
+            now = datetime.now()
+            expired = [
+                sid for sid, data in self.sessions.items()
+                if now - data["last_active"] > self.timeout
+            ]
+            for sid in expired:
+                del self.sessions[sid]
+
+            if session_id not in self.sessions:
+                return []
+            self.sessions[session_id]["last_active"] = datetime.now()
+            return self.sessions[session_id]["history"].copy()
+
+
+def populate(manager, count):
+    """Fill a manager with sessions and return their ids."""
+    if isinstance(manager, FullScanSessionManager):
+        ids = [f"s{i}" for i in range(count)]
+        for sid in ids:
+            manager.create_session(sid)
+        return ids
+    return [manager.create_session() for _ in range(count)]
+
+
+def time_reads(manager, ids, reads):
+    """Average microseconds per get_history call."""
+    sample = [random.choice(ids) for _ in range(reads)]
+    start = time.perf_counter()
+    for sid in sample:
+        manager.get_history(sid)
+    return (time.perf_counter() - start) / reads * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--reads", type=int, default=2_000)
+    args = parser.parse_args()
+
+    print(f"{'sessions':>10} {'full scan (us)':>16} {'ordered (us)':>14} {'speedup':>9}")
+    for count in args.sessions:
+        legacy = FullScanSessionManager()
+        ordered = SessionManager()
+        # The full scan is O(N) per read; keep its sample small at 100k
+        legacy_reads = max(50, min(args.reads, 2_000_000 // count))
+        legacy_us = time_reads(legacy, populate(legacy, count), legacy_reads)
+        ordered_us = time_reads(ordered, populate(ordered, count), args.reads)
+        print(f"{count:>10} {legacy_us:>16.2f} {ordered_us:>14.2f} {legacy_us / ordered_us:>8.0f}x")
+
+
+if __name__ == "__main__":
+    main()
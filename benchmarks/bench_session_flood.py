@@ -0,0 +1,52 @@
+"""
+Session-creation flood: memory held by SessionManager as a client
+creates a fresh session per request (no session_id), with and without
+the capacity limits.
+
+Usage:
+    python -m benchmarks.bench_session_flood [--requests 100000]
+"""
+import argparse
+import tracemalloc
+
+from app.rag.session_manager import SessionManager
+
+TURN = [
+    {"role": "user", "content": "What projects has he built?"},
+    {"role": "assistant", "content": "Vetrivel has built 10+ projects. " * 10},
+]
+
+
+def flood(manager, requests, checkpoints):
+    """Create one session per request and report traced memory at checkpoints."""
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    for i in range(1, requests + 1):
+        manager.add_messages(manager.create_session(), TURN)
+        if i in checkpoints:
+            used = (tracemalloc.get_traced_memory()[0] - baseline) / 1024 / 1024
+            stats = manager.stats()
+            print(f"{i:>10} {used:>10.1f} {stats['sessions']:>10} {stats['evicted_sessions']:>10}")
+    tracemalloc.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=100_000)
+    parser.add_argument("--max-sessions", type=int, default=10_000)
+    parser.add_argument("--max-bytes", type=int, default=64 * 1024 * 1024)
+    args = parser.parse_args()
+    checkpoints = {args.requests * step // 5 for step in range(1, 6)}
+
+    for label, manager in (
+        ("unbounded", SessionManager()),
+        ("bounded", SessionManager(max_messages=20, max_sessions=args.max_sessions,
+                                   max_bytes=args.max_bytes)),
+    ):
+        print(f"\n{label}")
+        print(f"{'requests':>10} {'MiB':>10} {'sessions':>10} {'evicted':>10}")
+        flood(manager, args.requests, checkpoints)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+SSE framing cost: one frame per OpenAI delta vs coalesced frames.
+
+In-process, replays a synthetic answer through the framing stage and
+counts frames (one write syscall each), JSON encodes and bytes, plus
+CPU per answer. End-to-end, runs the app under each server profile
+against the stub upstream with coalescing off (SSE_FLUSH_BYTES=0,
+SSE_FLUSH_INTERVAL_MS=0) and on (defaults), and reports frames per
+answer, server CPU per answer, TTFT and the longest pause between
+visible updates.
+
+Usage:
+    python -m benchmarks.bench_sse_frames [--answers 100] [--profiles sync asgi]
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from unittest import mock
+
+from app.rag import sse
+from app.rag.sse import FrameCoalescer
+from benchmarks.harness import app_server, new_client, percentile, process_cpu_seconds, run, stream_chat, stub_upstream
+
+MODES = {
+    "per-delta": {"SSE_FLUSH_BYTES": "0", "SSE_FLUSH_INTERVAL_MS": "0"},
+    "coalesced": {},
+}
+
+
+def synthetic_deltas(tokens):
+    words = ("Vetrivel", " built", " a", " retrieval", " pipeline", " with", " caching", ".")
+    return [words[i % len(words)] for i in range(tokens)]
+
+
+def frame_answer(deltas, coalesce, tokens_per_sec):
+    """Frame one answer the old way or through a FrameCoalescer; returns (frames, encodes, bytes)."""
+    encodes = 0
+    real_dumps = json.dumps
+
+    def counting_dumps(payload):
+        nonlocal encodes
+        encodes += 1
+        return real_dumps(payload)
+
+    # Deltas "arrive" at the stub's token rate on a simulated clock
+    now = [0.0]
+    written = []
+    with mock.patch.object(sse.json, "dumps", counting_dumps):
+        written.append(sse.sse_frame({"session_id": "s"}))
+        if coalesce:
+            frames = FrameCoalescer(clock=lambda: now[0])
+            for delta in deltas:
+                now[0] += 1 / tokens_per_sec
+                frame = frames.push(delta)
+                if frame is not None:
+                    written.append(frame)
+            frame = frames.flush()
+            if frame is not None:
+                written.append(frame)
+        else:
+            for delta in deltas:
+                written.append(sse.sse_frame({"chunk": delta, "session_id": "s"}))
+        written.append(sse.sse_frame({"done": True, "session_id": "s"}))
+    return len(written), encodes, sum(len(frame.encode("utf-8")) for frame in written)
+
+
+def in_process(tokens, tokens_per_sec, repeat=2000):
+    deltas = synthetic_deltas(tokens)
+    print(f"in-process, {tokens} deltas at {tokens_per_sec:.0f}/s")
+    print(f"{'mode':>10} {'frames':>7} {'encodes':>8} {'bytes':>7} {'us/answer':>10}")
+    for mode, coalesce in (("per-delta", False), ("coalesced", True)):
+        frames, encodes, size = frame_answer(deltas, coalesce, tokens_per_sec)
+        start = time.process_time()
+        for _ in range(repeat):
+            frame_answer(deltas, coalesce, tokens_per_sec)
+        cpu = (time.process_time() - start) / repeat
+        print(f"{mode:>10} {frames:>7} {encodes:>8} {size:>7} {cpu * 1e6:>10.1f}")
+
+
+async def answers(url, count, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(client):
+        async with semaphore:
+            return await stream_chat(client, url, f"framing probe {uuid.uuid4().hex}")
+
+    async with new_client() as client:
+        return await asyncio.gather(*(one(client) for _ in range(count)))
+
+
+def end_to_end(profiles, count, concurrency, ttft_ms, tokens_per_sec, tokens):
+    print(f"\nend-to-end, {count} answers x {tokens} tokens at {tokens_per_sec:.0f}/s, {concurrency} concurrent")
+    print(f"{'profile':>8} {'mode':>10} {'ok':>5} {'frames/ans':>11} {'cpu ms/ans':>11} {'ttft p50':>9} {'max gap p95':>12}")
+    with stub_upstream(ttft_ms, tokens_per_sec, tokens) as base_url:
+        for profile in profiles:
+            for mode, env in MODES.items():
+                with app_server(profile, base_url, env=env) as (url, proc):
+                    run(answers(url, 4, 4))  # warm up
+                    cpu_before = process_cpu_seconds(proc.pid)
+                    results = run(answers(url, count, concurrency))
+                    cpu = process_cpu_seconds(proc.pid) - cpu_before
+                ok = [r for r in results if r["ok"]]
+                frames = sum(r["frames"] for r in ok) / max(1, len(ok))
+                ttft = percentile([r["ttft"] for r in ok if r["ttft"] is not None], 50)
+                gap = percentile([r["max_gap"] for r in ok], 95)
+                print(
+                    f"{profile:>8} {mode:>10} {len(ok):>5} {frames:>11.1f} {cpu * 1000 / max(1, len(ok)):>11.2f} "
+                    f"{ttft or 0:>9.3f} {gap or 0:>12.3f}"
+                )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--answers", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--profiles", nargs="+", default=["sync", "asgi"])
+    parser.add_argument("--ttft-ms", type=float, default=100)
+    parser.add_argument("--tokens-per-sec", type=float, default=60)
+    parser.add_argument("--tokens", type=int, default=200)
+    parser.add_argument("--skip-e2e", action="store_true")
+    args = parser.parse_args()
+
+    in_process(args.tokens, args.tokens_per_sec)
+    if not args.skip_e2e:
+        end_to_end(args.profiles, args.answers, args.concurrency, args.ttft_ms, args.tokens_per_sec, args.tokens)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Stub OpenAI-compatible streaming endpoint for load tests.
+
+Serves POST /v1/chat/completions with stream=true as chat.completion.chunk
+server-sent events, after a configurable time-to-first-token and at a
+configurable token rate. Point the app at it with
+OPENAI_BASE_URL=http://127.0.0.1:<port>/v1.
+
+    python -m benchmarks.fake_openai --port 8901 --ttft-ms 400 --tokens-per-sec 50 --tokens 120
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import uvicorn
+
+CONFIG = {"ttft_ms": 400.0, "tokens_per_sec": 50.0, "tokens": 120}
+
+
+def _chunk(content, finish_reason=None):
+    return {
+        "id": "chatcmpl-fake",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": "fake",
+        "choices": [{"index": 0, "delta": {"content": content} if content else {}, "finish_reason": finish_reason}],
+    }
+
+
+async def app(scope, receive, send):
+    if scope["type"] != "http":
+        return
+
+    # Drain the request body
+    while True:
+        message = await receive()
+        if message["type"] != "http.request" or not message.get("more_body"):
+            break
+
+    if scope["path"].rstrip("/") != "/v1/chat/completions":
+        await send({"type": "http.response.start", "status": 404, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+        return
+
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [(b"content-type", b"text/event-stream")],
+    })
+
+    await asyncio.sleep(CONFIG["ttft_ms"] / 1000)
+    interval = 1 / CONFIG["tokens_per_sec"]
+    for i in range(CONFIG["tokens"]):
+        frame = f"data: {json.dumps(_chunk(f'token{i} '))}\n\n"
+        await send({"type": "http.response.body", "body": frame.encode(), "more_body": True})
+        await asyncio.sleep(interval)
+
+    tail = f"data: {json.dumps(_chunk(None, 'stop'))}\n\ndata: [DONE]\n\n"
+    await send({"type": "http.response.body", "body": tail.encode()})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub OpenAI streaming endpoint")
+    parser.add_argument("--port", type=int, default=8901)
+    parser.add_argument("--ttft-ms", type=float, default=CONFIG["ttft_ms"])
+    parser.add_argument("--tokens-per-sec", type=float, default=CONFIG["tokens_per_sec"])
+    parser.add_argument("--tokens", type=int, default=CONFIG["tokens"])
+    args = parser.parse_args()
+
+    CONFIG.update(ttft_ms=args.ttft_ms, tokens_per_sec=args.tokens_per_sec, tokens=args.tokens)
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning", backlog=4096)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""
+Shared helpers for the end-to-end benchmarks: start the stub upstream
+and the app under a given server, then drive /api/chat with streaming
+clients.
+"""
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Start of PortfolioChatbot.error_reply(); upstream failures arrive as answer text
+ERROR_REPLY_MARKER = "I apologize, but I encountered an error"
+
+# Server command lines per profile; {port} and {workers} are filled in
+SERVER_PROFILES = {
+    "sync": [
+        sys.executable, "-m", "gunicorn", "-b", "127.0.0.1:{port}", "-w", "{workers}",
+        "-k", "gthread", "--threads", "16", "--timeout", "120", "wsgi:app",
+    ],
+    "asgi": [
+        sys.executable, "-m", "uvicorn", "asgi:app", "--host", "127.0.0.1", "--port", "{port}",
+        "--workers", "{workers}", "--log-level", "warning", "--backlog", "4096",
+    ],
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"nothing listening on port {port} after {timeout}s")
+
+
+@contextmanager
+def running(cmd, port, env=None):
+    """Run a server process for the duration of a with-block."""
+    proc = subprocess.Popen(
+        cmd, cwd=ROOT, env={**os.environ, **(env or {})},
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        wait_for_port(port)
+        yield proc
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+@contextmanager
+def stub_upstream(ttft_ms=400, tokens_per_sec=50, tokens=120):
+    """Start benchmarks.fake_openai and yield its base URL."""
+    port = free_port()
+    cmd = [
+        sys.executable, "-m", "benchmarks.fake_openai", "--port", str(port),
+        "--ttft-ms", str(ttft_ms), "--tokens-per-sec", str(tokens_per_sec), "--tokens", str(tokens),
+    ]
+    with running(cmd, port):
+        yield f"http://127.0.0.1:{port}/v1"
+
+
+@contextmanager
+def app_server(profile, base_url, workers=1, env=None):
+    """Start the app under a server profile against a stub upstream; yields its URL."""
+    port = free_port()
+    cmd = [part.format(port=port, workers=workers) for part in SERVER_PROFILES[profile]]
+    app_env = {
+        "OPENAI_API_KEY": "sk-benchmark",
+        "OPENAI_BASE_URL": base_url,
+        "RAG_CACHE_SIZE": "0",
+        "RAG_SEMANTIC_CACHE_SIZE": "0",
+        # Every virtual user shares one IP; the upstream limit stays on
+        "ADMISSION_IP_RATE": "0",
+        "ADMISSION_SESSION_RATE": "0",
+        **(env or {}),
+    }
+    with running(cmd, port, app_env) as proc:
+        yield f"http://127.0.0.1:{port}", proc
+
+
+async def stream_chat(client, url, message, session_id=None):
+    """
+    Send one chat request and time it.
+
+    Returns:
+        dict: ok, ttft, total, max_gap (seconds between text frames), frames, session_id, error
+    """
+    start = time.perf_counter()
+    last_text = None
+    text = []
+    result = {
+        "ok": False, "ttft": None, "total": None, "max_gap": 0.0,
+        "frames": 0, "session_id": session_id, "error": None,
+    }
+    try:
+        async with client.stream("POST", f"{url}/api/chat",
+                                 json={"message": message, "session_id": session_id}) as response:
+            if response.status_code != 200:
+                result["error"] = f"HTTP {response.status_code}"
+                return result
+            async for line in response.aiter_lines():
+                if not line.startswith("data: "):
+                    continue
+                payload = json.loads(line[6:])
+                result["frames"] += 1
+                if payload.get("session_id"):
+                    result["session_id"] = payload["session_id"]
+                if "chunk" in payload:
+                    text.append(payload["chunk"])
+                    now = time.perf_counter()
+                    if result["ttft"] is None:
+                        result["ttft"] = now - start
+                    else:
+                        result["max_gap"] = max(result["max_gap"], now - last_text)
+                    last_text = now
+                if payload.get("error"):
+                    result["error"] = payload["error"]
+                if payload.get("done"):
+                    result["ok"] = True
+    except Exception as e:
+        result["error"] = type(e).__name__
+    if result["error"] is None and ERROR_REPLY_MARKER in "".join(text):
+        result["error"] = "upstream error reply"
+    result["total"] = time.perf_counter() - start
+    return result
+
+
+def process_tree(pid):
+    """A process and all its descendants, from /proc."""
+    pids = []
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            for task in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{task}/children") as f:
+                    pending.extend(int(child) for child in f.read().split())
+        except (FileNotFoundError, ProcessLookupError):
+            continue
+        pids.append(current)
+    return pids
+
+
+def worker_pids(pid):
+    """Server worker processes: the children of a pre-fork master, or the server itself."""
+    workers = []
+    for child in process_tree(pid)[1:]:
+        try:
+            with open(f"/proc/{child}/cmdline", "rb") as f:
+                cmdline = f.read()
+        except (FileNotFoundError, ProcessLookupError):
+            continue
+        # multiprocessing helpers (uvicorn --workers) are not workers
+        if b"multiprocessing.resource_tracker" not in cmdline:
+            workers.append(child)
+    return workers or [pid]
+
+
+def process_cpu_seconds(pid):
+    """User + system CPU time of a process and all its descendants, from /proc."""
+    total = 0.0
+    for current in process_tree(pid):
+        try:
+            with open(f"/proc/{current}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+        except (FileNotFoundError, ProcessLookupError):
+            continue
+        total += (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    return total
+
+
+def rss_mb(pid):
+    """Resident set size of one process in MiB, or None if it has exited."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except (FileNotFoundError, ProcessLookupError):
+        pass
+    return None
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def new_client(timeout=300):
+    return httpx.AsyncClient(timeout=timeout, limits=httpx.Limits(max_connections=None, max_keepalive_connections=None))
+
+
+def run(coro):
+    return asyncio.run(coro)
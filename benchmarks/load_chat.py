@@ -0,0 +1,293 @@
+"""
+End-to-end load test for /api/chat.
+
+Starts the app (wsgi:app / asgi:app, both built by create_app()) under
+each server profile against a stubbed streaming LLM, then drives
+/api/chat with closed-loop virtual users. Each user sends one request
+at a time and, with probability --reuse, continues its current session
+instead of starting a new one. Questions are drawn from a weighted mix:
+
+    unique      a never-seen question (always reaches the model)
+    popular     one of a few shared opening questions (caches, single flight)
+    faq         a canonical FAQ question from the knowledge base
+    navigation  a "take me to ..." request
+
+Reports TTFT and full-response percentiles, throughput, frames/sec,
+peak RSS per worker and the error rate, and writes everything as JSON
+so runs can be compared across commits (--compare old.json).
+
+Usage:
+    python -m benchmarks.load_chat [--profiles sync asgi] [--concurrency 8 32]
+        [--requests 400] [--reuse 0.3] [--mix unique=0.5,popular=0.2,faq=0.2,navigation=0.1]
+        [--upstream stub|local] [--caches] [--out results.json] [--compare baseline.json]
+"""
+import argparse
+import asyncio
+import json
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from app.rag.faq_index import parse_faq
+from app.rag.knowledge_base import PORTFOLIO_KNOWLEDGE
+from benchmarks.harness import (
+    ROOT, app_server, new_client, percentile, rss_mb, run, stream_chat, stub_upstream, worker_pids,
+)
+
+DEFAULT_MIX = "unique=0.5,popular=0.2,faq=0.2,navigation=0.1"
+
+POPULAR_QUESTIONS = (
+    "How did you evaluate the hybrid RAG system?",
+    "What was the hardest part of your internship?",
+    "Which cloud platforms have you deployed models on?",
+    "How do you reduce hallucinations in LLM apps?",
+)
+
+NAVIGATION_REQUESTS = (
+    "take me to the contact page",
+    "show me your projects",
+    "open the about page",
+    "where can I see your work experience?",
+)
+
+# Metrics compared by --compare; True means higher is better
+COMPARED_METRICS = {
+    "ttft_p50": False, "ttft_p95": False, "total_p95": False,
+    "requests_per_sec": True, "error_rate": False, "rss_mb_max": False,
+}
+
+
+class Workload:
+    """Weighted question mix shared by all virtual users."""
+
+    def __init__(self, mix):
+        self.faq_questions = tuple(question for question, _ in parse_faq(PORTFOLIO_KNOWLEDGE))
+        self.kinds = list(mix)
+        self.weights = [mix[kind] for kind in self.kinds]
+
+    def question(self, rng):
+        kind = rng.choices(self.kinds, self.weights)[0]
+        if kind == "unique":
+            return kind, f"Can you tell me more about topic {uuid.uuid4().hex[:8]} in your work?"
+        if kind == "popular":
+            return kind, rng.choice(POPULAR_QUESTIONS)
+        if kind == "faq":
+            return kind, rng.choice(self.faq_questions)
+        return kind, rng.choice(NAVIGATION_REQUESTS)
+
+
+def parse_mix(text):
+    """Parse "kind=weight,..." into a dict of weights."""
+    mix = {}
+    for part in text.split(","):
+        kind, _, weight = part.partition("=")
+        kind = kind.strip()
+        if kind not in ("unique", "popular", "faq", "navigation"):
+            raise argparse.ArgumentTypeError(f"unknown question kind {kind!r}")
+        mix[kind] = float(weight)
+    if not any(mix.values()):
+        raise argparse.ArgumentTypeError("question mix has no weight")
+    return mix
+
+
+async def drive(url, workload, concurrency, requests, reuse, seed):
+    """Run closed-loop virtual users until `requests` requests have been sent."""
+    remaining = [requests]
+    results = []
+
+    async def user(client, index):
+        rng = random.Random(seed * 1000 + index)
+        session_id = None
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            if session_id is None or rng.random() >= reuse:
+                session_id = None
+            kind, message = workload.question(rng)
+            result = await stream_chat(client, url, message, session_id)
+            result["kind"] = kind
+            result["follow_up"] = session_id is not None
+            session_id = result["session_id"]
+            results.append(result)
+
+    async with new_client() as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(user(client, i) for i in range(concurrency)))
+        return results, time.perf_counter() - start
+
+
+@contextmanager
+def rss_sampler(pid, interval=0.25):
+    """Track peak RSS per worker process while the block runs; yields the peaks dict."""
+    peaks = {}
+    stop = threading.Event()
+
+    def sample():
+        while True:
+            for worker in worker_pids(pid):
+                rss = rss_mb(worker)
+                if rss is not None:
+                    peaks[worker] = max(peaks.get(worker, 0.0), rss)
+            if stop.wait(interval):
+                return
+
+    thread = threading.Thread(target=sample, daemon=True)
+    thread.start()
+    try:
+        yield peaks
+    finally:
+        stop.set()
+        thread.join()
+
+
+def _round(value, digits=4):
+    return None if value is None else round(value, digits)
+
+
+def summarize(results, wall, rss_peaks):
+    ok = [r for r in results if r["ok"] and r["error"] is None]
+    ttfts = [r["ttft"] for r in ok if r["ttft"] is not None]
+    totals = [r["total"] for r in ok]
+    errors = {}
+    for r in results:
+        if r["error"] is not None or not r["ok"]:
+            errors[r["error"] or "incomplete"] = errors.get(r["error"] or "incomplete", 0) + 1
+    by_kind = {}
+    for kind in sorted({r["kind"] for r in results}):
+        kind_ttfts = [r["ttft"] for r in ok if r["kind"] == kind and r["ttft"] is not None]
+        by_kind[kind] = {"requests": sum(1 for r in results if r["kind"] == kind),
+                         "ttft_p50": _round(percentile(kind_ttfts, 50))}
+    return {
+        "requests": len(results),
+        "follow_ups": sum(1 for r in results if r["follow_up"]),
+        "wall_seconds": _round(wall, 2),
+        "requests_per_sec": _round(len(ok) / wall, 2),
+        "frames_per_sec": _round(sum(r["frames"] for r in results) / wall, 1),
+        "ttft_p50": _round(percentile(ttfts, 50)),
+        "ttft_p95": _round(percentile(ttfts, 95)),
+        "ttft_p99": _round(percentile(ttfts, 99)),
+        "total_p50": _round(percentile(totals, 50)),
+        "total_p95": _round(percentile(totals, 95)),
+        "total_p99": _round(percentile(totals, 99)),
+        "error_rate": _round((len(results) - len(ok)) / max(1, len(results))),
+        "errors": errors,
+        "rss_mb_per_worker": [round(v, 1) for _, v in sorted(rss_peaks.items())],
+        "rss_mb_max": _round(max(rss_peaks.values(), default=None), 1),
+        "by_kind": by_kind,
+    }
+
+
+def git_revision():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                               capture_output=True, text=True).stdout.strip()
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+@contextmanager
+def upstream(args):
+    """Yield (base_url, extra app env) for the chosen upstream."""
+    if args.upstream == "local":
+        yield "http://127.0.0.1:9/v1", {
+            "LLM_PROVIDER": "local",
+            "LOCAL_LLM_TTFT_MS": str(args.ttft_ms),
+            "LOCAL_LLM_TOKENS_PER_SEC": str(args.tokens_per_sec),
+            "LOCAL_LLM_TOKENS": str(args.tokens),
+        }
+    else:
+        with stub_upstream(args.ttft_ms, args.tokens_per_sec, args.tokens) as base_url:
+            yield base_url, {"OPENAI_PREWARM": "0"}
+
+
+def print_row(profile, concurrency, summary):
+    print(
+        f"{profile:>6} {concurrency:>5} {summary['requests']:>6} {summary['requests_per_sec']:>7.1f} "
+        f"{summary['frames_per_sec']:>8.0f} {summary['ttft_p50'] or 0:>8.3f} {summary['ttft_p95'] or 0:>8.3f} "
+        f"{summary['total_p95'] or 0:>9.3f} {summary['error_rate']:>6.1%} {summary['rss_mb_max'] or 0:>7.1f}"
+    )
+
+
+def compare(runs, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    previous = {(r["profile"], r["concurrency"]): r["summary"] for r in baseline["runs"]}
+    print(f"\nvs {baseline_path} ({baseline['meta'].get('commit')})")
+    for r in runs:
+        old = previous.get((r["profile"], r["concurrency"]))
+        if old is None:
+            continue
+        changes = []
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            before, after = old.get(metric), r["summary"].get(metric)
+            if not before or after is None:
+                continue
+            delta = (after - before) / before
+            worse = delta < 0 if higher_is_better else delta > 0
+            changes.append(f"{metric} {delta:+.0%}{' !' if worse and abs(delta) > 0.1 else ''}")
+        print(f"{r['profile']:>6} {r['concurrency']:>5}  " + ", ".join(changes))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--profiles", nargs="+", default=["sync", "asgi"])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[8, 32])
+    parser.add_argument("--requests", type=int, default=400, help="requests per concurrency level")
+    parser.add_argument("--reuse", type=float, default=0.3, help="probability a request continues its session")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX))
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--upstream", choices=["stub", "local"], default="stub")
+    parser.add_argument("--ttft-ms", type=float, default=300)
+    parser.add_argument("--tokens-per-sec", type=float, default=80)
+    parser.add_argument("--tokens", type=int, default=120)
+    parser.add_argument("--caches", action="store_true", help="keep the response/semantic caches on")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="write results as JSON")
+    parser.add_argument("--compare", help="JSON from an earlier run to diff against")
+    args = parser.parse_args()
+
+    workload = Workload(args.mix)
+    cache_env = {"RAG_CACHE_SIZE": "512", "RAG_SEMANTIC_CACHE_SIZE": "2048"} if args.caches else {}
+    runs = []
+
+    print(f"{'server':>6} {'conc':>5} {'reqs':>6} {'req/s':>7} {'frames/s':>8} "
+          f"{'ttft p50':>8} {'ttft p95':>8} {'total p95':>9} {'errors':>6} {'rss MiB':>7}")
+    with upstream(args) as (base_url, upstream_env):
+        for profile in args.profiles:
+            # A fresh server per level, so sessions and caches do not carry over
+            for concurrency in args.concurrency:
+                with app_server(profile, base_url, args.workers, {**upstream_env, **cache_env}) as (url, proc):
+                    run(drive(url, workload, 2, 4, 0.0, args.seed))  # warm up
+                    with rss_sampler(proc.pid) as rss_peaks:
+                        results, wall = run(drive(url, workload, concurrency, args.requests, args.reuse, args.seed))
+                summary = summarize(results, wall, rss_peaks)
+                runs.append({"profile": profile, "concurrency": concurrency, "summary": summary})
+                print_row(profile, concurrency, summary)
+
+    report = {
+        "meta": {
+            "commit": git_revision(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "args": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+        },
+        "runs": runs,
+    }
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nwrote {args.out}")
+    if args.compare:
+        compare(runs, args.compare)
+
+
+if __name__ == "__main__":
+    main()
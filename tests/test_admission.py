@@ -0,0 +1,68 @@
+import pytest
+
+from app.rag.admission import AdmissionController, Rejected, TokenBuckets, client_ip
+
+
+def test_client_ip_ignores_forwarded_for_without_trusted_proxies():
+    assert client_ip("10.0.0.1", "203.0.113.7") == "10.0.0.1"
+
+
+def test_client_ip_takes_the_hop_added_by_the_outermost_trusted_proxy():
+    # The client can prepend anything; only the entries proxies appended count
+    forwarded = "198.51.100.9, 203.0.113.7, 10.0.0.2"
+    assert client_ip("10.0.0.1", forwarded, trusted_proxies=1) == "10.0.0.2"
+    assert client_ip("10.0.0.1", forwarded, trusted_proxies=2) == "203.0.113.7"
+
+
+def test_client_ip_falls_back_to_the_peer_when_the_header_is_short():
+    assert client_ip("10.0.0.1", "203.0.113.7", trusted_proxies=2) == "10.0.0.1"
+    assert client_ip("10.0.0.1", " , ", trusted_proxies=1) == "10.0.0.1"
+    assert client_ip(None) == "unknown"
+
+
+def test_bucket_allows_a_burst_then_reports_the_wait():
+    buckets = TokenBuckets(rate=2, burst=3)
+    assert [buckets.take("a", now=0.0) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert buckets.take("a", now=0.0) == pytest.approx(0.5)
+
+
+def test_bucket_refills_at_rate_and_caps_at_burst():
+    buckets = TokenBuckets(rate=2, burst=3)
+    for _ in range(3):
+        buckets.take("a", now=0.0)
+    # 0.25 s at 2 tokens/s is half a token: still short by half a token
+    assert buckets.take("a", now=0.25) == pytest.approx(0.25)
+    assert buckets.take("a", now=0.5) == 0.0
+    # A long idle period refills to the burst, not beyond it
+    assert [buckets.take("a", now=100.0) for _ in range(4)][-1] == pytest.approx(0.5)
+
+
+def test_buckets_are_per_key_and_evict_the_least_recently_used():
+    buckets = TokenBuckets(rate=1, burst=1, max_keys=2)
+    buckets.take("a", now=0.0)
+    buckets.take("b", now=0.0)
+    buckets.take("c", now=0.0)
+    assert len(buckets) == 2
+    # "a" was evicted, so it starts again with a full bucket
+    assert buckets.take("a", now=0.0) == 0.0
+    assert buckets.take("c", now=0.0) == pytest.approx(1.0)
+
+
+def test_per_ip_limit_is_off_by_default(monkeypatch):
+    for name in ("ADMISSION_IP_RATE", "ADMISSION_IP_BURST"):
+        monkeypatch.delenv(name, raising=False)
+    admission = AdmissionController.from_env()
+    assert admission.per_ip is None
+    for _ in range(100):
+        admission.check_rate("10.0.0.1")
+
+
+def test_rate_limit_rejects_with_retry_after(monkeypatch):
+    monkeypatch.setenv("ADMISSION_IP_RATE", "0.5")
+    monkeypatch.setenv("ADMISSION_IP_BURST", "1")
+    admission = AdmissionController.from_env()
+    admission.check_rate("10.0.0.1")
+    with pytest.raises(Rejected) as rejected:
+        admission.check_rate("10.0.0.1")
+    assert rejected.value.status == 429
+    assert rejected.value.headers == {"Retry-After": "2"}
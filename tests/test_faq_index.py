@@ -0,0 +1,47 @@
+from app.rag.faq_index import FaqIndex, parse_faq
+
+KNOWLEDGE = """
+## FREQUENTLY ASKED QUESTIONS
+
+### What are his research interests?
+- Reducing hallucinations in LLMs
+- Hybrid RAG architectures
+
+---
+
+### What is his favourite programming language?
+Python, for its ecosystem.
+
+---
+
+## NEXT SECTION
+"""
+
+
+def test_parse_keeps_bullet_markers_and_drops_the_rule():
+    pairs = dict(parse_faq(KNOWLEDGE))
+    assert pairs["What are his research interests?"] == (
+        "- Reducing hallucinations in LLMs\n- Hybrid RAG architectures"
+    )
+    assert pairs["What is his favourite programming language?"] == "Python, for its ecosystem."
+
+
+def test_matches_a_paraphrase():
+    index = FaqIndex(KNOWLEDGE)
+    assert index.match("what is his favourite programming language") == "Python, for its ecosystem."
+    assert index.stats()["hits"] == 1
+
+
+def test_negated_or_qualified_questions_do_not_match():
+    index = FaqIndex(KNOWLEDGE)
+    assert index.match("What is NOT his favourite programming language?") is None
+    assert index.match("What is his least favourite programming language?") is None
+    assert index.match("Which programming language isn't his favourite?") is None
+    assert index.stats()["misses"] == 3
+
+
+def test_refresh_only_rebuilds_on_change():
+    index = FaqIndex(KNOWLEDGE)
+    assert not index.refresh(KNOWLEDGE)
+    assert index.refresh(KNOWLEDGE.replace("Python", "Rust"))
+    assert index.match("What is his favourite programming language?") == "Rust, for its ecosystem."
@@ -0,0 +1,80 @@
+import threading
+import time
+
+from app.rag.hedging import HedgingProvider
+from app.rag.providers import LLMProvider, LocalProvider
+
+MESSAGES = [{"role": "user", "content": "What has he built?"}]
+
+
+class ScriptedProvider(LLMProvider):
+    """Primary waits for its first chunk until aborted; the hedge answers at once."""
+
+    name = "scripted"
+
+    def __init__(self):
+        super().__init__("scripted")
+        self.calls = 0
+        self.aborted = []
+        self.chunks_after_abort = []
+
+    def stream(self, messages, model=None, max_tokens=None):
+        return self.abortable_stream(messages, model, max_tokens)[0]
+
+    def abortable_stream(self, messages, model=None, max_tokens=None):
+        index = self.calls
+        self.calls += 1
+        aborted = threading.Event()
+        self.aborted.append(aborted)
+
+        def chunks():
+            if index == 0:
+                # Blocks like a read waiting on a slow upstream
+                aborted.wait(5)
+                if aborted.is_set():
+                    return
+                self.chunks_after_abort.append(index)
+                yield "late"
+            else:
+                yield "fast"
+                aborted.wait(5)
+                yield " answer"
+
+        return chunks(), aborted.set
+
+    async def astream(self, messages, model=None, max_tokens=None):
+        raise NotImplementedError
+        yield
+
+
+def test_losing_attempt_is_aborted_without_another_chunk():
+    inner = ScriptedProvider()
+    hedged = HedgingProvider(inner, ttft_budget=0.01)
+    stream = hedged.stream(MESSAGES)
+    assert next(stream) == "fast"
+
+    # The primary lost the race: its upstream is torn down while it waits
+    assert inner.aborted[0].is_set()
+    assert not inner.aborted[1].is_set()
+    assert hedged.stats()["hedging"]["hedge_won"] == 1
+
+    # The client goes away while the winner waits for its next chunk
+    stream.close()
+    assert inner.aborted[1].is_set()
+    assert inner.chunks_after_abort == []
+
+
+def test_local_provider_abort_stops_a_waiting_stream():
+    provider = LocalProvider(ttft_ms=5000)
+    chunks, abort = provider.abortable_stream(MESSAGES)
+    done = threading.Event()
+
+    def read():
+        list(chunks)
+        done.set()
+
+    threading.Thread(target=read, daemon=True).start()
+    time.sleep(0.05)
+    abort()
+    assert done.wait(1)
+    assert provider.stats()["cancelled"] == 1
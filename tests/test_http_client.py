@@ -0,0 +1,101 @@
+import asyncio
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+from app.rag.http_client import UpstreamTransport, abort_response
+
+
+def hanging_server():
+    """A server that sends headers and one body chunk, then goes quiet."""
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(1)
+    closed = threading.Event()
+
+    def serve():
+        conn, _ = listener.accept()
+        conn.recv(65536)
+        conn.sendall(b"HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n5\r\nhello\r\n")
+        # recv returns b"" once the client tears the connection down
+        conn.settimeout(5)
+        try:
+            conn.recv(1)
+            closed.set()
+        except OSError:
+            pass
+        conn.close()
+        listener.close()
+
+    threading.Thread(target=serve, daemon=True).start()
+    return f"http://127.0.0.1:{listener.getsockname()[1]}/", closed
+
+
+def test_abort_response_wakes_a_blocked_reader_and_closes_the_connection():
+    url, closed = hanging_server()
+    with httpx.Client(timeout=30) as client:
+        with client.stream("GET", url) as response:
+            received = []
+            finished = threading.Event()
+
+            def read():
+                try:
+                    for chunk in response.iter_bytes():
+                        received.append(chunk)
+                except httpx.HTTPError:
+                    pass
+                finished.set()
+
+            threading.Thread(target=read, daemon=True).start()
+            time.sleep(0.1)
+            assert received == [b"hello"] and not finished.is_set()
+
+            abort_response(response)
+            assert finished.wait(1)
+            assert closed.wait(1)
+
+
+class KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def keep_alive_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), KeepAliveHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/"
+    server.shutdown()
+    server.server_close()
+
+
+def test_pool_stats_see_pooled_connections(keep_alive_url):
+    # Reads httpcore internals; this fails first if an upgrade moves them
+    transport = UpstreamTransport()
+    assert transport.stats()["pool"] == {"open": 0, "idle": 0, "active": 0}
+    transport.client.head(keep_alive_url)
+    assert transport.stats()["pool"] == {"open": 1, "idle": 1, "active": 0}
+
+
+def test_aprewarm_fills_the_async_pool(keep_alive_url):
+    transport = UpstreamTransport()
+
+    async def warm():
+        await transport.aprewarm(keep_alive_url, connections=2)
+        return transport.stats()
+
+    stats = asyncio.run(warm())
+    assert stats["async_pool"] == {"open": 2, "idle": 2, "active": 0}
+    assert stats["pool"]["open"] == 0
+    assert stats["prewarmed"] == 2
@@ -0,0 +1,29 @@
+import threading
+
+from app.rag.metrics import Counter, Histogram
+
+
+def run_threads(count, target):
+    for _ in range(count):
+        thread = threading.Thread(target=target)
+        thread.start()
+        thread.join()
+
+
+def test_cells_of_exited_threads_are_retired_without_a_scrape():
+    counter = Counter("test_total", "Test counter", ("outcome",))
+    run_threads(300, lambda: counter.inc(labels=("ok",)))
+    # Each new thread retires the ones that exited before it
+    assert len(counter.cells.cells) <= 2
+    assert counter.value(("ok",)) == 300
+    assert counter.cells.cells == []
+
+
+def test_histogram_totals_survive_retired_threads():
+    histogram = Histogram("test_seconds", "Test histogram", buckets=(0.1, 1.0))
+    run_threads(50, lambda: histogram.observe(0.5))
+    histogram.observe(2.0)
+    assert len(histogram.cells.cells) <= 2
+    cumulative, total, count = histogram.series()[()]
+    assert cumulative == [0, 50, 51]
+    assert total == 27.0 and count == 51
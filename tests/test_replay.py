@@ -0,0 +1,61 @@
+from types import SimpleNamespace
+
+from app.rag.replay import ReplayBuffer, parse_event_id
+
+
+def turn(session_id="s"):
+    return SimpleNamespace(session_id=session_id, answer_source="llm")
+
+
+def test_parse_event_id():
+    assert parse_event_id("abc:12") == ("abc", 12)
+    assert parse_event_id("a:b:3") == ("a:b", 3)
+    assert parse_event_id("abc") is None
+    assert parse_event_id("abc:x") is None
+
+
+def test_linger_is_off_by_default(monkeypatch):
+    for name in ("REPLAY_MAX_ENTRIES", "REPLAY_TTL_SECONDS", "REPLAY_LINGER_SECONDS"):
+        monkeypatch.delenv(name, raising=False)
+    buffer = ReplayBuffer.from_env()
+    assert buffer.enabled
+    assert buffer.linger == 0
+
+
+def test_fast_path_answer_replays_from_the_offset():
+    buffer = ReplayBuffer()
+    entry = buffer.open(turn(), chunks=("Hello ", "world"))
+    resumption = buffer.resume("s", f"{entry.turn_id}:8")
+    assert resumption.prefix == ["Hello ", "wo"]
+    assert list(resumption.stream()) == ["rld"]
+    assert not resumption.owner
+
+
+def test_model_answer_without_flight_replays_only_once_recorded():
+    buffer = ReplayBuffer()
+    entry = buffer.open(turn())
+    assert buffer.resume("s", f"{entry.turn_id}:0") is None
+
+    entry.settle(["Hello ", "world"])
+    resumption = buffer.resume("s", f"{entry.turn_id}:6")
+    assert list(resumption.stream()) == ["world"]
+    assert buffer.stats()["gone"] == 1 and buffer.stats()["replayed"] == 1
+
+
+def test_aborted_model_answer_is_gone():
+    buffer = ReplayBuffer()
+    entry = buffer.open(turn())
+    assert not entry.detach()
+    entry.settle()
+    assert buffer.resume("s", f"{entry.turn_id}:0") is None
+
+
+def test_resume_checks_the_session_and_the_offset():
+    buffer = ReplayBuffer()
+    entry = buffer.open(turn(), chunks=("abc",))
+    assert buffer.resume("other", f"{entry.turn_id}:0") is None
+    assert buffer.resume("s", f"{entry.turn_id}:4") is None
+
+
+def test_disabled_buffer_opens_nothing():
+    assert ReplayBuffer(ttl_seconds=0).open(turn()) is None
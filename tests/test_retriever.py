@@ -0,0 +1,27 @@
+from app.rag.knowledge_base import PORTFOLIO_KNOWLEDGE
+from app.rag.retriever import KnowledgeRetriever, split_sections
+
+
+def test_sections_keep_their_first_bullet_and_drop_the_rule():
+    sections = split_sections("## SKILLS\n- Python\n- SQL\n\n---\n\n## NEXT\nText\n")
+    assert [(s.title, s.body) for s in sections] == [("SKILLS", "- Python\n- SQL"), ("NEXT", "Text")]
+
+
+def test_skills_question_selects_technical_skills():
+    retriever = KnowledgeRetriever(PORTFOLIO_KNOWLEDGE)
+    hits = retriever.search("What programming languages and frameworks does he know?")
+    assert "TECHNICAL SKILLS" in {section.parent for section, _ in hits}
+
+
+def test_core_sections_are_always_included():
+    retriever = KnowledgeRetriever(PORTFOLIO_KNOWLEDGE)
+    context = retriever.build_context("What programming languages does he know?")
+    for heading in KnowledgeRetriever.CORE_SECTIONS:
+        assert f"## {heading}" in context
+    assert "### When answering questions:" in context
+
+
+def test_unmatched_question_falls_back_to_the_identity_section():
+    retriever = KnowledgeRetriever(PORTFOLIO_KNOWLEDGE)
+    context = retriever.build_context("zzzz qqqq")
+    assert "## PROFESSIONAL IDENTITY & EXPERTISE" in context
@@ -0,0 +1,110 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from app.rag import semantic_cache
+from app.rag.semantic_cache import HashingVectorizer, SemanticCache, context_key
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(semantic_cache, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+def test_embeddings_are_unit_vectors_and_empty_text_has_none():
+    vectorizer = HashingVectorizer(dim=64)
+    vector = vectorizer.embed("What projects has he built?")
+    assert vector.shape == (64,) and vector.dtype == np.float32
+    assert np.linalg.norm(vector) == pytest.approx(1.0)
+    assert vectorizer.embed("what is the") is None
+
+
+def test_paraphrase_hits_and_unrelated_question_misses():
+    cache = SemanticCache(max_entries=8, threshold=0.85)
+    cache.set("What projects has he built?", ["NewsBot", " and more"])
+    assert cache.get("what projects has he built") == ("NewsBot", " and more")
+    assert cache.get("Where did he study?") is None
+    assert cache.stats() == {"size": 1, "hits": 1, "misses": 1, "evictions": 0}
+
+
+def test_threshold_decides_how_close_a_match_must_be():
+    question, paraphrase = "What projects has he built?", "Which AI projects has he built recently?"
+    vectorizer = HashingVectorizer()
+    similarity = float(vectorizer.embed(question) @ vectorizer.embed(paraphrase))
+    assert 0 < similarity < 1
+
+    loose = SemanticCache(max_entries=8, threshold=similarity - 0.01)
+    strict = SemanticCache(max_entries=8, threshold=similarity + 0.01)
+    for cache in (loose, strict):
+        cache.set(question, ["answer"])
+    assert loose.get(paraphrase) == ("answer",)
+    assert strict.get(paraphrase) is None
+
+
+def test_entries_only_match_within_their_context():
+    cache = SemanticCache(max_entries=8)
+    main, lookup = context_key("prompt"), context_key("prompt", "lookup")
+    assert main != lookup and context_key("prompt") == main
+    cache.set("What projects has he built?", ["main answer"], main)
+    assert cache.get("What projects has he built?", lookup) is None
+    assert cache.get("What projects has he built?", main) == ("main answer",)
+
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = SemanticCache(max_entries=8, ttl_seconds=60)
+    cache.set("What projects has he built?", ["answer"])
+    clock[0] += 59
+    assert cache.get("What projects has he built?") == ("answer",)
+    clock[0] += 2
+    assert cache.get("What projects has he built?") is None
+
+
+def test_setting_a_near_duplicate_replaces_it():
+    cache = SemanticCache(max_entries=8)
+    cache.set("What projects has he built?", ["old"])
+    cache.set("what projects has he built", ["new"])
+    assert cache.stats()["size"] == 1
+    assert cache.get("What projects has he built?") == ("new",)
+
+
+def test_full_cache_evicts_the_least_recently_used(clock):
+    cache = SemanticCache(max_entries=2)
+    cache.set("What projects has he built?", ["projects"])
+    cache.set("Where did he study?", ["education"])
+    # Reading the first entry makes the second the least recently used
+    assert cache.get("What projects has he built?") == ("projects",)
+    cache.set("Which certifications does he hold?", ["certifications"])
+    assert cache.stats()["size"] == 2 and cache.stats()["evictions"] == 1
+    assert cache.get("Where did he study?") is None
+    assert cache.get("What projects has he built?") == ("projects",)
+    assert cache.get("Which certifications does he hold?") == ("certifications",)
+
+
+def test_full_cache_reuses_expired_slots_before_evicting(clock):
+    cache = SemanticCache(max_entries=2, ttl_seconds=60)
+    cache.set("What projects has he built?", ["projects"])
+    clock[0] += 30
+    cache.set("Where did he study?", ["education"])
+    clock[0] += 40
+    # The first entry has expired; it makes room without an eviction
+    cache.set("Which certifications does he hold?", ["certifications"])
+    assert cache.stats()["evictions"] == 0
+    assert cache.get("Where did he study?") == ("education",)
+
+
+def test_zero_capacity_disables_the_cache():
+    cache = SemanticCache(max_entries=0)
+    cache.set("What projects has he built?", ["answer"])
+    assert cache.get("What projects has he built?") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_invalidate_drops_everything():
+    cache = SemanticCache(max_entries=8)
+    cache.set("What projects has he built?", ["answer"])
+    cache.invalidate()
+    assert cache.get("What projects has he built?") is None
+    assert cache.stats()["size"] == 0
@@ -0,0 +1,199 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.rag.single_flight import Flight, SingleFlight, Subscription, start_flight
+
+
+class Upstream:
+    """A model stream the test releases one chunk at a time."""
+
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+        self.ready = threading.Semaphore(0)
+        self.closed = threading.Event()
+
+    def send(self, count=1):
+        for _ in range(count):
+            self.ready.release()
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            self.ready.acquire()
+            yield chunk
+
+    def stream(self):
+        source = iter(self)
+
+        def generate():
+            try:
+                yield from source
+            finally:
+                self.closed.set()
+
+        return generate()
+
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def test_followers_join_a_running_flight_and_read_the_prefix():
+    flights = SingleFlight()
+    upstream = Upstream(["a", "b", "c"])
+    leader = flights.subscribe("q", upstream.stream)
+    upstream.send()
+    assert next(leader) == "a"
+
+    # A late joiner gets what was already generated first
+    follower = flights.join("q")
+    assert follower is not None and not follower.leader
+    upstream.send(2)
+    assert list(follower) == ["a", "b", "c"]
+    assert list(leader) == ["b", "c"]
+    assert flights.stats() == {"in_flight": 0, "started": 1, "joined": 1, "cancelled": 0}
+
+
+def test_join_after_the_flight_finished_starts_nothing():
+    flights = SingleFlight()
+    upstream = Upstream(["a"])
+    leader = flights.subscribe("q", upstream.stream)
+    upstream.send()
+    assert list(leader) == ["a"]
+    assert flights.join("q") is None
+    assert not leader.flight.join()
+
+
+def test_last_subscriber_leaving_cancels_without_linger():
+    flights = SingleFlight()
+    upstream = Upstream(["a", "b", "c"])
+    leader = flights.subscribe("q", upstream.stream)
+    follower = flights.join("q")
+    upstream.send()
+    assert next(leader) == "a"
+
+    leader.close()
+    assert not leader.flight.cancelled
+    follower.close()
+    flight = leader.flight
+    assert flight.cancelled
+    assert not flight.attach()
+
+    # The producer stops at its next chunk and closes the upstream stream
+    upstream.send()
+    assert upstream.closed.wait(2)
+    wait_until(lambda: flight.done)
+    assert flight.chunks == ["a"]
+    assert flights.stats()["cancelled"] == 1
+
+
+def test_closing_twice_leaves_once():
+    flight = Flight("q", lambda flight: None)
+    flight.subscribers = 2
+    subscription = Subscription(flight, leader=True)
+    subscription.close()
+    subscription.close()
+    assert flight.subscribers == 1 and not flight.cancelled
+
+
+def test_a_lingering_flight_keeps_streaming_for_a_reconnect():
+    upstream = Upstream(["a", "b", "c"])
+    leader = start_flight(upstream.stream, linger=60)
+    flight = leader.flight
+    upstream.send()
+    assert next(leader) == "a"
+    leader.close()
+
+    upstream.send()
+    wait_until(lambda: len(flight.chunks) == 2)
+    assert not flight.cancelled
+
+    # A reconnect attaches and reads from the start of the buffer
+    assert flight.attach()
+    reconnect = Subscription(flight, leader=False)
+    upstream.send()
+    assert list(reconnect) == ["a", "b", "c"]
+    reconnect.close()
+    assert flight.done and not flight.cancelled
+    # The finished buffer can still be attached to
+    assert flight.attach()
+
+
+def test_a_lingering_flight_is_cancelled_once_the_linger_runs_out():
+    upstream = Upstream(["a", "b", "c"])
+    leader = start_flight(upstream.stream, linger=0.05)
+    flight = leader.flight
+    upstream.send()
+    assert next(leader) == "a"
+    leader.close()
+    assert not flight.cancelled
+
+    time.sleep(0.1)
+    assert not flight.attach()
+    upstream.send()
+    assert upstream.closed.wait(2)
+    wait_until(lambda: flight.done)
+    assert flight.cancelled and flight.chunks == ["a"]
+
+
+def test_done_callbacks_run_once_the_flight_stops():
+    upstream = Upstream(["a"])
+    leader = start_flight(upstream.stream)
+    flight = leader.flight
+    finished = []
+    flight.add_done_callback(finished.append)
+    assert finished == []
+    upstream.send()
+    assert list(leader) == ["a"]
+    wait_until(lambda: finished == [flight])
+
+    # Registered after the end: called straight away
+    flight.add_done_callback(finished.append)
+    assert finished == [flight, flight]
+
+
+def test_upstream_errors_reach_every_subscriber():
+    def failing():
+        yield "a"
+        raise RuntimeError("upstream failed")
+
+    flights = SingleFlight()
+    leader = flights.subscribe("q", failing)
+    assert next(leader) == "a"
+    with pytest.raises(RuntimeError):
+        next(leader)
+    assert isinstance(leader.flight.error, RuntimeError)
+
+
+def test_async_flight_is_cancelled_as_soon_as_its_subscriber_leaves():
+    closed = []
+
+    async def never_ending():
+        try:
+            yield "a"
+            await asyncio.Event().wait()
+        finally:
+            closed.append(True)
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        flights = SingleFlight()
+        leader = flights.subscribe("q", open_astream=never_ending, loop=loop)
+        assert await leader.__anext__() == "a"
+        leader.close()
+        # No further chunk is needed to stop the upstream stream
+        for _ in range(100):
+            if leader.flight.done:
+                break
+            await asyncio.sleep(0.01)
+        return leader.flight, flights.stats()
+
+    flight, stats = asyncio.run(run())
+    assert flight.done and flight.cancelled
+    assert closed == [True]
+    assert stats["cancelled"] == 1